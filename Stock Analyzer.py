@@ -1,19 +1,93 @@
-import cmu_graphics as c
+import time
+# Measured from the very first line, the imports are part of the startup
+startupStart = time.perf_counter()
+
+import cmu_graphics
 import math
 import os
-import csv
-import functools
-from PIL import Image
-from datetime import datetime, timedelta
+import threading
+import traceback
+from datetime import datetime
 from pprint import pprint
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import nullcontext
+
+from stockmodel import DateMapper, tradingDays
+from stockanalytics import (AlignedSeries, SlidingCorrelation, companyStats,
+                            evaluateCompanies, midpoint, statNames,
+                            CorrelationScreen)
+from stockcache import loadCachedDirectory
+from stocklazy import LazyCompanies
+from stockraster import RasterRenderer, rasterAvailable
+from stockprofile import profiler
+from stockupdate import UpdateWatcher
+from stockderived import derivedCache
+from stockmatrix import SymmetricMatrix
+from stockpattern import PatternSearch
+
+# Passes everything on to cmu_graphics, counting the shapes drawn
+# While recording is a list, every draw call is also stored in it
+class ShapeCounter:
+    def __init__(self, graphics):
+        self.graphics = graphics
+        self.count = 0
+        self.recording = None
+
+    def __getattr__(self, name):
+        value = getattr(self.graphics, name)
+        if not name.startswith("draw"):
+            return value
+
+        def countedDraw(*args, **kwargs):
+            self.count += 1
+            if self.recording is not None:
+                self.recording.append((value, args, kwargs))
+            return value(*args, **kwargs)
+
+        # Found directly next time
+        setattr(self, name, countedDraw)
+        return countedDraw
+
+    # Draws recorded calls again
+    def replay(self, commands):
+        self.count += len(commands)
+        for draw, args, kwargs in commands:
+            draw(*args, **kwargs)
+
+c = ShapeCounter(cmu_graphics)
+
+# The draw calls of one part of the screen
+# They are replayed as long as the state they were drawn from (the key)
+# stays the same, so an idle window does not compute anything
+class FrameCache:
+    # name: used for the hit / miss counters of the profiler
+    def __init__(self, name):
+        self.name = name
+        self.key = None
+        self.commands = []
+
+    # Draws with render() if key changed since the last call, else replays
+    def draw(self, key, render):
+        hit = key == self.key
+        profiler.countCache(self.name + " cache", hit)
+        if hit:
+            c.replay(self.commands)
+            return
+
+        c.recording = []
+        try:
+            render()
+        finally:
+            self.commands, c.recording = c.recording, None
+        self.key = key
 
 # --- Citations ---
 
 # Credit to 15-112 for teaching me basic PIL methods
 # Image downloaded from: https://unsplash.com/s/photos/candlestick-chart
 # Also used Pixlr Editor to blur the image
-image = Image.open("images/candlestick4.jpg")
-image = c.CMUImage(image)
+# (loaded in the background, see loadTitleImage)
 
 # strptime function: https://www.programiz.com/python-programming/datetime/strptime
 # yield generator function: https://www.simplilearn.com/tutorials/python-tutorial/yield-in-python#:~:text=let's%20get%20started.-,What%20Is%20Yield%20In%20Python%3F,of%20simply%20returning%20a%20value.
@@ -30,14 +104,65 @@ image = c.CMUImage(image)
 
 
 # --- Initialize variables ---
-app = c.app
 rgb = c.rgb
 tick = 0
+# Shapes drawn by the last complete frame
+frameShapes = 0
 debug = False
 title = False if debug else True
 companySelection = set()
 accurateRenderMode = False
 totalData = {}
+# Load companies only when they are selected (for very large universes)
+lazyLoading = False
+# Skip holidays too, using the days found in the data (not with lazyLoading)
+useTradingCalendar = False
+# Paint the bars into an image on another thread (needs PIL, see stockraster)
+rasterRendering = False
+# Frame profile written while tracing (t key), one json line per frame
+traceFileName = "frametrace.jsonl"
+tracing = False
+# New rows of the data files and of stockdata/updates are appended while
+# the app runs, checked every updateInterval seconds (see checkForUpdates)
+updateInterval = 1
+lastUpdateCheck = 0.0
+updateWatcher = None
+# Indicators the o key cycles through, (kind, parameters) (see
+# stockindicators), a parameter of None is the moving average width
+overlays = [None, ("ema", None), ("wma", None), ("bollinger", None, 2),
+            ("rsi", 14), ("macd", 12, 26, 9)]
+# Colors of an overlay's lines, in the order of its lineNames
+overlayColors = ("blue", "orange", "purple")
+# Part of the graph at the bottom used by indicators that are not prices
+indicatorBandHeight = 0.2
+# The s and f keys search every company in steps, for at most
+# searchStepSeconds of each frame
+searchStepSeconds = 0.02
+# The s key screens every company for the screenCount companies that moved
+# most like the selected one over the selection, screenBlockSize companies
+# per step (see CorrelationScreen)
+screenCount = 5
+screenBlockSize = 32
+correlationScreen = None
+# The f key searches every company's history for the patternCount windows
+# shaped most like the selection of the selected company,
+# patternBlockCount FFT blocks per step (see PatternSearch)
+patternCount = 5
+patternBlockCount = 8
+patternSearch = None
+
+# Startup, see main()
+# Seconds spent in each step, in the order they finished
+startupTimes = {}
+# Set by the background loader once the image and the data are read
+loadingDone = threading.Event()
+loadedImage = None
+loadedData = None
+# Widgets, created by buildWidgets / buildDataWidgets
+buttonStart = None
+stockGraph = None
+titleImage = None
+panelCache = FrameCache("panel")
 
 # 1080p resolution
 screenWidth = 1920
@@ -63,173 +188,6 @@ colorButtonZoom = rgb(191, 46, 58)
 
 
 
-# Class was created because there has to be a way to store
-# the relational data between two companies without duplicates
-class DoubleKeyDict:
-    def __init__(self):
-        self.dict = {}
-
-    def get(self, k1, k2):
-        if k1 > k2:
-            k1, k2 = k2, k1
-        # Return the value for the pair (k1, k2) in the dictionary
-        return self.dict.get((k1, k2))
-
-    def set(self, k1, k2, value):
-        if k1 > k2:
-            k1, k2 = k2, k1
-        # Sets the value for the pair (k1, k2) in the dictionary
-        self.dict[(k1, k2)] = value
-
-    def __repr__(self):
-        return repr(self.dict)
-
-class Stock:
-    def __init__(self, date, open, high, low, close, adjustedClose, volume):
-        # Returns a datetime object that represents the date in year/month/day
-        self.date = datetime.strptime(date, "%Y-%m-%d")
-        self.open = float(open)
-        self.high = float(high)
-        self.low = float(low)
-        self.close = float(close)
-        self.adjustedClose = float(adjustedClose)
-        self.volume = float(volume)
-
-    # Create a read-only attribute to return POSIX timestamp
-    @property
-    def posixTime(self):
-        # Returns the posix time of the stock
-        return self.date.timestamp()
-
-    def __repr__(self):
-        return f"Stock(date={self.date}, open={self.open})"
-
-class Company:
-    # Stocks are sorted by date
-    def __init__(self, name, ticker, stocks):
-        self.name = name
-        self.ticker = ticker
-        self.stocks = stocks
-        self.verify()
-
-    # Verifies that the data is valid and sorted
-    def verify(self):
-        # Determine order stocks should be sorted
-        self.stocks.sort(key=lambda s: s.date)
-        # Checks
-        for stock in self.stocks:
-            if stock.high < stock.low:
-                raise ValueError("High is less than low")
-            if min(stock.open, stock.close) < stock.low:
-                raise ValueError("Open or close is less than low")
-            if max(stock.open, stock.close) > stock.high:
-                raise ValueError("Open or close is greater than high")
-
-    # Return company name and stock entries
-    def __repr__(self):
-        return f"Company({repr(self.name)}, stocks=[...{len(self.stocks)} entries])"
-
-    # Calculates moving average of company's stock prices over given time frame
-    def movingAverage(self, width):
-        # Resolution is arbitrarily decreased in order to save memory
-        if width < 2:
-            return [s.close for s in self.stocks]
-        return self.calculateMovingAverage(math.floor(width))
-
-    # Memoization - speed up repeated calls with the same time frame
-    @functools.lru_cache(maxsize=128)
-    def calculateMovingAverage(self, width):
-        # Returns the moving average of the stock prices
-        prevTotalSum = self.stocks[0].close * width
-
-        movingAverageList = []
-        for i in range(0, len(self.stocks)):
-            prevTotalSum += (self.stocks[i].close -
-                             (self.stocks[i - width].close
-                              if i >= width else self.stocks[0].close))
-            movingAverageList.append(prevTotalSum / width)
-
-        return movingAverageList
-
-# Maps dates to integers and integers to dates
-# Used to remove weekends from the graph
-class DateMapper:
-    def __init__(self, originDate):
-        # Skip all weekends
-        self.originDate = originDate
-        self.datemap = {originDate: 0}
-        self.reverseMap = {0: originDate}
-        self.oldestDate = originDate
-        self.newestDate = originDate
-
-    def getDateIndex(self, targetDate):
-        # If a weekend is provided, then return the closest future non-weekend
-        # Saturday -> Monday
-        if targetDate > self.newestDate:
-            # Expand newest date
-            prev = self.datemap[self.newestDate]
-            while self.newestDate < targetDate:
-                self.newestDate += timedelta(1)
-                # 5 is saturday, 6 is sunday
-                while self.newestDate.weekday() >= 5:
-                    self.newestDate += timedelta(1)
-
-                prev += 1
-                self.datemap[self.newestDate] = prev
-                self.reverseMap[prev] = self.newestDate
-
-            return prev
-
-        if targetDate < self.oldestDate:
-            # Expand oldest date
-            prev = self.datemap[self.oldestDate]
-            while self.oldestDate > targetDate:
-                self.oldestDate -= timedelta(1)
-                while self.oldestDate.weekday() >= 5:
-                    self.oldestDate -= timedelta(1)
-
-                prev -= 1
-                self.datemap[self.oldestDate] = prev
-                self.reverseMap[prev] = self.oldestDate
-
-            return prev
-
-        while targetDate not in self.datemap:
-            targetDate += timedelta(1)
-
-        return self.datemap[targetDate]
-
-    def getDateFromIndex(self, targetDate):
-        if targetDate > self.datemap[self.newestDate]:
-            # Expand newest date
-            prev = self.datemap[self.newestDate]
-            while self.datemap[self.newestDate] < targetDate:
-                self.newestDate += timedelta(1)
-                while self.newestDate.weekday() >= 5:
-                    self.newestDate += timedelta(1)
-
-                prev += 1
-                self.datemap[self.newestDate] = prev
-                self.reverseMap[prev] = self.newestDate
-
-            return self.newestDate
-
-        if targetDate < self.datemap[self.oldestDate]:
-            # Expand oldest date
-            prev = self.datemap[self.oldestDate]
-            while self.datemap[self.oldestDate] > targetDate:
-                self.oldestDate -= timedelta(1)
-                while self.oldestDate.weekday() >= 5:
-                    self.oldestDate -= timedelta(1)
-
-                prev -= 1
-                self.datemap[self.oldestDate] = prev
-                self.reverseMap[prev] = self.oldestDate
-
-            return self.oldestDate
-
-        return self.reverseMap[targetDate]
-
 # Button class that can draw a rectangle and a label at the same time
 class Button:
     def __init__(self, text, x, y, w, h, rect={}, label={}, meta=None):
@@ -284,6 +242,41 @@ class MagnifyingGlass:
         return (x > self.x and x < self.x + self.side 
                 and y > self.y and y < self.y + self.side)
 
+# Where a StockGraph looks, a snapshot so that its bars can be computed
+# somewhere else (e.g. on the raster thread)
+class ChartView:
+    # overlay: (kind, parameters) of an indicator drawn next to the moving
+    # average (see overlays), None for none
+    def __init__(self, x, y, w, h, zoomX, zoomY, userFocus,
+                 movingAverageWidth, accurate, overlay=None):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.zoomX = zoomX
+        self.zoomY = zoomY
+        self.userFocus = userFocus
+        self.movingAverageWidth = movingAverageWidth
+        self.accurate = accurate
+        self.overlay = overlay
+
+    def key(self):
+        return (self.x, self.y, self.w, self.h, self.zoomX, self.zoomY,
+                self.userFocus, self.movingAverageWidth, self.accurate,
+                self.overlay)
+
+    # Same as StockGraph.transform
+    def transform(self, lx, ly):
+        screenX = (lx - self.userFocus[0]) * self.zoomX + self.w / 2
+        screenY = (ly - self.userFocus[1]) * self.zoomY + self.h / 2
+        return screenX + self.x, screenY + self.y
+
+    # Same as StockGraph.reverseTransform
+    def reverseTransform(self, sx, sy):
+        lx = (sx - self.x - self.w / 2) / self.zoomX + self.userFocus[0]
+        ly = (sy - self.y - self.h / 2) / self.zoomY + self.userFocus[1]
+        return lx, ly
+
 class StockGraph:
     def __init__(self, data, x, y, w, h, backgroundBorder=None,
                  background=None, border=None):
@@ -318,21 +311,65 @@ class StockGraph:
                                                       text="-")
 
         self.movingAverageWidth = 1
+        # Index into overlays, changed with the o key
+        self.overlayIdx = 0
 
         self.rightMostDate = datetime(1984, 1, 1)
         self.leftMostDate = datetime(2077, 1, 1)
         self.dm = DateMapper(datetime(2010, 1, 1))
 
         self.highestPrice = self.lowestPrice = 0
+        # Fit the price axis to the visible bars on every frame
+        self.autoFit = False
 
         # When selection is updated, it is set to true
         self.evaluationStatus = True
-        self.evaluationData = DoubleKeyDict()
+        # Windows found by the f key, highlighted in the graph:
+        # (name, first ordinal, last ordinal, distance), the closest first
+        self.patternMatches = ()
+        # Correlation of every pair of the evaluated companies
+        self.evaluationData = SymmetricMatrix([])
         
         # company name:
         # [average price change, average volume, price fluctuation, gap average]
         self.evaluationStats = {}
 
+        # Evaluate continuously while a selection is dragged
+        self.liveEvaluation = False
+        self.liveSelection = None
+        self.liveCorrelation = None
+
+        # Increased whenever the evaluation changes
+        self.evaluationVersion = 0
+        self.frameCache = FrameCache("graph")
+
+        # Raster rendering, (PIL image, the same as CMUImage) last shown
+        self.raster = RasterRenderer(paintChart) if rasterAvailable else None
+        self.rasterImage = (None, None)
+
+    # Returns (key, company) for every selected company, in data order
+    # Only selected companies are accessed, so lazy data is not loaded
+    def selectedCompanies(self):
+        return [(key, self.data[key]) for key in self.data
+                if key in companySelection]
+
+    # Returns a snapshot of the view, at (x, y) on screen if given
+    def view(self, x=None, y=None):
+        return ChartView(self.x if x is None else x,
+                         self.y if y is None else y, self.w, self.h,
+                         self.zoomX, self.zoomY, self.userFocus,
+                         self.movingAverageWidth, accurateRenderMode,
+                         self.overlay())
+
+    # Returns (kind, parameters) of the selected overlay, or None
+    def overlay(self):
+        overlay = overlays[self.overlayIdx]
+        if overlay is None:
+            return None
+        width = max(2, math.floor(self.movingAverageWidth))
+        return (overlay[0],) + tuple(width if parameter is None else parameter
+                                     for parameter in overlay[1:])
+
     # Transforms virtual x, y coordinate to screen x, y coordinate
     def transform(self, lx, ly):
         screenX = (lx - self.userFocus[0]) * self.zoomX + self.w / 2
@@ -345,8 +382,35 @@ class StockGraph:
         ly = (sy - self.y - self.h / 2) / self.zoomY + self.userFocus[1]
         return lx, ly
 
+    # Everything the graph is drawn from, see FrameCache
+    # The selection is sorted, equal selections built in another order
+    # have the same key
+    def drawKey(self):
+        selection = tuple(sorted(companySelection))
+        return (self.x, self.y, self.w, self.h, self.zoomX, self.zoomY,
+                self.userFocus, self.selectLeft, self.selectRight, selection,
+                self.movingAverageWidth, accurateRenderMode, self.overlayIdx,
+                self.patternMatches,
+                self.background, self.backgroundBorder, self.border,
+                self.magnifyingGlassZoomIn.selected,
+                self.magnifyingGlassZoomOut.selected, self.dm.version,
+                tuple(len(self.data[key]) for key in selection),
+                # A finished raster frame has to be shown
+                rasterRendering and rasterAvailable and self.raster.version)
+
     # Draws the stock graph to the screen
+    # Only drawn again when something it depends on changed
     def draw(self):
+        if self.autoFit and companySelection:
+            with profiler.stage("auto fit"):
+                self.calculateHighestAndLowest()
+            # Nothing visible, keep the current zoom
+            if math.isfinite(self.highestPrice):
+                self.autoZoomY()
+
+        self.frameCache.draw(self.drawKey(), self.render)
+
+    def render(self):
         if self.background:
             c.drawRect(self.x, self.y, self.w, self.h, fill=self.background, 
                        border=None)
@@ -356,23 +420,19 @@ class StockGraph:
                 c.drawLabel("No companies selected", self.x + self.w / 2, 
                             self.y + self.h / 2, size=fontSize, fill="black")
 
-        scaledOffsetX, scaledOffsetY = self.transform(0, 0)
-
-        step = max(1, math.floor(4 / self.zoomX)) if not accurateRenderMode else 1
-
-        #left, right, top, bottom
-        lrtb = (self.x, self.x + self.w, self.y, self.y + self.h)
-
         leftDate = self.dm.getDateFromIndex(modularMult(0,
                    self.reverseTransform(self.x - 30, 0)[0], 1))
-        rightDate = self.dm.getDateFromIndex(modularMult(0,
-                    self.reverseTransform(self.x + self.w + 30, 0)[0], 1))
+
+        view = self.view()
+        # The bars come from an image painted on another thread
+        raster = rasterRendering and rasterAvailable
+        if raster:
+            with profiler.stage("raster"):
+                self.drawRaster()
 
         needsDateUpdate = True
 
-        for key, company in self.data.items():
-            if key not in companySelection:
-                continue
+        for key, company in self.selectedCompanies():
 
             if needsDateUpdate:
                 self.leftMostDate = company.stocks[0].date
@@ -382,66 +442,20 @@ class StockGraph:
             self.leftMostDate = min(self.leftMostDate, company.stocks[0].date)
             self.rightMostDate = max(self.rightMostDate, company.stocks[-1].date)
 
-            # Moving average absolute data
-            ma = company.movingAverage(self.movingAverageWidth)
-
-            # Moving average data that will be drawn
-            maData = []
-            prevPointDrawn = False
-            prevSX = None
-            for stockIdx, stock in (enumerate(company.stocks) if step <= 1
-                                    else enumerateIterList(company.stocks, step)):
-                # Fail fast - don't crash
-                if stock.date < leftDate or stock.date > rightDate:
-                    prevPointDrawn = False
-                    continue
-
-                visible, maVisible, sx, diff, barHeight = calculateStockGraphics(
-                    stock, scaledOffsetX, scaledOffsetY, self.zoomX, 
-                    self.zoomY, self.dm, self.zoomX * step, lrtb, 
-                    movingAveragePoint=ma[stockIdx])
-
-                # This is the first iteration,
-                # set previous stock x to current stock x
-                if prevSX is None:
-                    prevSX = sx
-
-                # If the moving average is visible, draw it
-                if maVisible:
-                    # If the previous point was not drawn,
-                    # draw it, as it is the start of the line
-                    if not prevPointDrawn and stockIdx != 0:
-                        maData.append((prevSX, ma[stockIdx - 1], False))
-
-                    maData.append((sx, ma[stockIdx], True))
-                    prevPointDrawn = True
-                else:
-                    if prevPointDrawn:
-                        maData.append((sx, ma[stockIdx], True))
-                    prevPointDrawn = False
-
-                # Set previous stock x to current stock x
-                prevSX = sx
-
-                # If the stock is not visible, skip it
-                if not visible:
-                    continue
+            if raster:
+                continue
 
-                # Main stock bar
-                c.drawRect(sx - self.zoomX / 2, 
-                           scaledOffsetY - stock.close * self.zoomY if diff > 0 
-                           else scaledOffsetY - stock.open * self.zoomY, 
-                           self.zoomX, barHeight * self.zoomY, 
-                           fill="green" if diff > 0 else "red")
+            with profiler.stage("geometry"):
+                risingRects, fallingRects, lines = companyGeometry(
+                    company, self.dm, view)
 
-                if accurateRenderMode or self.zoomX > 5:
-                    # Draw high and low
-                    c.drawLine(sx, scaledOffsetY - stock.high * self.zoomY, sx, 
-                               scaledOffsetY - stock.low * self.zoomY, 
-                               fill="green" if diff > 0 else "red")
+            with profiler.stage("shapes"):
+                drawRects(risingRects, "green")
+                drawRects(fallingRects, "red")
 
-            # Draw moving average
-            drawLine([(x, scaledOffsetY - v * self.zoomY, b) for x, v, b in maData])
+                # Draw moving average and the overlay
+                for points, fill in lines:
+                    drawLine(points, fill)
 
         # Draw selection area
         if self.selectLeft and self.selectRight:
@@ -451,41 +465,61 @@ class StockGraph:
                 c.drawRect(l, self.y, r - l, self.h, fill="yellow", opacity=20, 
                            border=None)
 
-        # Horizontal ticks (time)
-        xInterval = 1
-        for t in rangeStep(
+        # Draw the windows found by the pattern search
+        for rank, (name, first, last, _) in enumerate(self.patternMatches):
+            # Bars are centered on their day
+            l = max(self.x,
+                    self.transform(self.dm.ordinalIndex(first) - 0.5, 0)[0])
+            r = min(self.x + self.w,
+                    self.transform(self.dm.ordinalIndex(last) + 0.5, 0)[0])
+            if l < r:
+                c.drawRect(l, self.y, r - l, self.h, fill="cyan", opacity=20,
+                           border=None)
+                c.drawLabel(f"{rank + 1} {name}", l + 2, self.y + 2,
+                            size=fontSize / 2.5, fill="black",
+                            align="left-top")
+
+        with profiler.stage("ticks"):
+            # Horizontal ticks (time)
+            xInterval = 1
             # 30 is the width of the text label for date
-            modularMult(0, self.reverseTransform(self.x - 30, 0)[0], xInterval)
-            + xInterval,
-            modularMult(0, self.reverseTransform(self.x + self.w, 0)[0], xInterval)
-            + xInterval,
-            xInterval):
-
-            d: datetime = self.dm.getDateFromIndex(t)
-            rx = self.transform(t, 0)[0]
-            if self.zoomX > 6:
-                c.drawLine(rx, self.y + self.h, rx, self.y + self.h - 10)
-                # Add label for date
-
-            # Draw date label every 100 pixels
-            if t % math.ceil(100 / self.zoomX) == 0:
-                # Draw year if zoome out
-                c.drawLabel(d.strftime("%m-%d")
-                            if self.zoomX > 0.4 else d.strftime("%Y"), 
-                            rx, self.y + self.h - 10, size=10,
-                            align="left-bottom", rotateAngle=-45)
-
-        # Vertical ticks (price)
-        # Calculate the appropriate y interval (in power of 10) for stock prices
-        # This allows the label to not be cluttered
-        yInterval = 1 / 10 / 10 ** math.floor(math.log(2 * self.zoomY / self.h, 10))
-        for t in rangeStep(-modularMult(0, -self.reverseTransform(0, self.y)[1], yInterval), 
-                           -modularMult(0, -self.reverseTransform(0, self.y + self.h)[1], yInterval), 
-                           yInterval):
-            ry = self.transform(0, t)[1]
-            c.drawLine(self.x, ry, self.x + 10, ry)
-            # Add label for price
-            c.drawLabel(f"{-round(t, 2):.2f}", self.x + 10, ry, size=10, align="left")
+            firstTick = (modularMult(0, self.reverseTransform(self.x - 30, 0)[0],
+                                     xInterval) + xInterval)
+            lastTick = (modularMult(0, self.reverseTransform(self.x + self.w, 0)[0],
+                                    xInterval) + xInterval)
+            labelInterval = math.ceil(100 / self.zoomX)
+            tickInterval = xInterval
+            if self.zoomX <= 6:
+                # No tick marks, only the labelled days are visited
+                firstTick = math.ceil(firstTick / labelInterval) * labelInterval
+                tickInterval = labelInterval
+
+            for t in rangeStep(firstTick, lastTick, tickInterval):
+                rx = self.transform(t, 0)[0]
+                if self.zoomX > 6:
+                    c.drawLine(rx, self.y + self.h, rx, self.y + self.h - 10)
+                    # Add label for date
+
+                # Draw date label every 100 pixels
+                if t % labelInterval == 0:
+                    d: datetime = self.dm.getDateFromIndex(t)
+                    # Draw year if zoome out
+                    c.drawLabel(d.strftime("%m-%d")
+                                if self.zoomX > 0.4 else d.strftime("%Y"), 
+                                rx, self.y + self.h - 10, size=10,
+                                align="left-bottom", rotateAngle=-45)
+
+            # Vertical ticks (price)
+            # Calculate the appropriate y interval (in power of 10) for stock prices
+            # This allows the label to not be cluttered
+            yInterval = 1 / 10 / 10 ** math.floor(math.log(2 * self.zoomY / self.h, 10))
+            for t in rangeStep(-modularMult(0, -self.reverseTransform(0, self.y)[1], yInterval), 
+                               -modularMult(0, -self.reverseTransform(0, self.y + self.h)[1], yInterval), 
+                               yInterval):
+                ry = self.transform(0, t)[1]
+                c.drawLine(self.x, ry, self.x + 10, ry)
+                # Add label for price
+                c.drawLabel(f"{-round(t, 2):.2f}", self.x + 10, ry, size=10, align="left")
 
         # Draw the magnifying glass
         self.magnifyingGlassZoomIn.draw()
@@ -514,12 +548,42 @@ class StockGraph:
         # Additional data / statistics
         # Draw year label
         ma = math.floor(self.movingAverageWidth)
+        overlay = view.overlay
         c.drawLabel(leftDate.strftime("%Y") + " - " 
                     + f"Moving average: {ma} day"
-                    + ("" if ma == 1 else "s"), self.x + 5,
+                    + ("" if ma == 1 else "s")
+                    + (f" - {overlay[0].upper()} "
+                       + ", ".join(map(str, overlay[1:])) if overlay else ""),
+                    self.x + 5,
                     self.y + self.h + 5, align="left-top",
                     size=15, fill=colorFG)
 
+    # Asks the raster thread for the current view and shows its last frame
+    # The frame is stretched to the current view until the next one is done
+    def drawRaster(self):
+        companies = [company for _, company in self.selectedCompanies()]
+        # Painted with the image's top left corner as origin
+        view = self.view(0, 0)
+        key = (view.key(), tuple(sorted(companySelection)), self.dm.version,
+               tuple(len(company) for company in companies))
+        self.raster.request(key, (max(1, round(self.w)), max(1, round(self.h))),
+                            (view, companies, self.dm))
+
+        result = self.raster.result
+        if result is None:
+            return
+        _, (shownView, _, _), image = result
+        if self.rasterImage[0] is not image:
+            self.rasterImage = (image, c.CMUImage(image))
+
+        # Corners of the image in the current view
+        left, top = self.transform(*shownView.reverseTransform(0, 0))
+        right, bottom = self.transform(*shownView.reverseTransform(
+            shownView.w, shownView.h))
+        if left < right and top < bottom:
+            c.drawImage(self.rasterImage[1], left, top, width=right - left,
+                        height=bottom - top)
+
     # assigns self.highestPrice and self.lowestPrice
     def calculateHighestAndLowest(self):
         if not companySelection:
@@ -533,19 +597,18 @@ class StockGraph:
         rightDate = self.dm.getDateFromIndex(modularMult(0,
                     self.reverseTransform(self.x + self.w + 30, 0)[0], 1))
         
-        for key, company in self.data.items():
-            if key not in companySelection:
-                continue
-            for stock in company.stocks:
-                # Fail fast - don't crash
-                if stock.date < leftDate or stock.date > rightDate:
-                    continue
+        leftOrdinal = leftDate.toordinal()
+        rightOrdinal = rightDate.toordinal()
 
-                if stock.high > self.highestPrice:
-                    self.highestPrice = stock.high
+        for key, company in self.selectedCompanies():
+            # Only look at the visible rows
+            first, last = company.dateRange(leftOrdinal, rightOrdinal)
+            if first >= last:
+                continue
 
-                if stock.low < self.lowestPrice:
-                    self.lowestPrice = stock.low
+            highest, lowest = company.pyramid().rangeHighLow(first, last)
+            self.highestPrice = max(self.highestPrice, highest)
+            self.lowestPrice = min(self.lowestPrice, lowest)
 
     def autoZoomY(self):
         # Make sure to call calculateHighestAndLowest before calling this
@@ -565,90 +628,85 @@ class StockGraph:
 
         self.autoZoomY()
 
-    # Sets status to False
-    def evaluateSelection(self):
-        self.evaluationData = DoubleKeyDict()
-        self.evaluationStats.clear()
-
+    # Returns the day ordinals of the selection edges, None if there is none
+    def selectionOrdinals(self):
         if (not self.selectLeft or not self.selectRight 
             or self.selectRight <= self.selectLeft):
-            return
+            return None
 
         leftDate = self.dm.getDateFromIndex(math.floor(self.selectLeft))
         rightDate = self.dm.getDateFromIndex(math.ceil(self.selectRight))
+        return leftDate.toordinal(), rightDate.toordinal()
 
-        companyOpenCloseAvgData = {c: {s.date: (s.open + s.close) / 2
-                                       for s in self.data[c].stocks
-                                       if leftDate < s.date < rightDate}
-                                       for c in companySelection}
-
-        for c1 in companySelection:
-            for c2 in companySelection:
-                if c1 == c2:
-                    self.evaluationData.set(c1, c2, 1)
-                    continue
-
-                # Entry already exists
-                if self.evaluationData.get(c1, c2) is not None:
-                    continue
-
-                # Calculate correlation
-                xs = []
-                ys = []
-                for date, openClose in companyOpenCloseAvgData[c1].items():
-                    if date in companyOpenCloseAvgData[c2]:
-                        xs.append(openClose)
-                        ys.append(companyOpenCloseAvgData[c2][date])
-
-                r = correlation(xs, ys)
-                self.evaluationData.set(c1, c2, r)
-
-        # Calculate stats
-        for c in companySelection:
-            # find first match
-            first = None
-            firstIdx = None
-            data = None
-            for firstIdx, first in enumerate(self.data[c].stocks):
-                if first.date >= leftDate:
-                    break
-
-            # If first match is not suitable (more than 4 days old), None
-            if not first or first.date - leftDate > timedelta(days=4):
-                self.evaluationStats[c] = data
-                continue
+    # Stores the correlation matrix and the stats of every selected company
+    # stats defaults to calculating them, O(log n) per company (see PrefixStats)
+    def storeEvaluation(self, selection, matrix, leftOrdinal, rightOrdinal,
+                        stats=None):
+        self.evaluationData = SymmetricMatrix.fromMatrix(selection, matrix)
 
-            # Find last match
-            last = None
-            lastIdx = None
-            for idx, last in enumerate(self.data[c].stocks):
-                if last.date > rightDate:
-                    lastIdx = idx
-                    break
-
-            # If last match is not suitable (more than 4 days old), None
-            if not last or rightDate - last.date > timedelta(days=4):
-                self.evaluationStats[c] = data
-                continue
+        if stats is None:
+            stats = [companyStats(self.data[c], leftOrdinal, rightOrdinal)
+                     for c in selection]
+        self.evaluationStats.clear()
+        self.evaluationStats.update(zip(selection, stats))
+        self.evaluationVersion += 1
 
-            if firstIdx is None or lastIdx is None:
-                self.evaluationStats[c] = data
-                continue
+    # Sets status to False
+    def evaluateSelection(self):
+        self.evaluationData = SymmetricMatrix([])
+        self.evaluationStats.clear()
+        self.evaluationVersion += 1
 
-            data = [0.0, 0.0, 0.0, 0.0]
-            # Calculate statistics
-            data[0] = ((self.data[c].stocks[lastIdx].open -
-                        self.data[c].stocks[firstIdx].open) /
-                        ((lastIdx - firstIdx) * 7 / 5))
-            data[1] = average([s.volume for s in self.data[c].stocks[firstIdx:lastIdx]])
-            gaps = [s.close - s.open for s in self.data[c].stocks[firstIdx:lastIdx]]
-            data[2] = stdDev(gaps)
-            data[3] = average([abs(g) for g in gaps])
+        ordinals = self.selectionOrdinals()
+        if ordinals is None:
+            return
+        leftOrdinal, rightOrdinal = ordinals
 
-            self.evaluationStats[c] = data
+        # Shared with the headless batch analysis (stockbatch.py)
+        selection = list(companySelection)
+        with profiler.stage("evaluate"):
+            matrix, stats = evaluateCompanies(self.data, selection,
+                                              leftOrdinal, rightOrdinal)
+        self.storeEvaluation(selection, matrix, leftOrdinal, rightOrdinal,
+                             stats)
 
         self.evaluationStatus = False
 
+    # Updates the evaluation while the selection is dragged
+    # The correlations come from running sums over the whole history of
+    # the selected companies, only the days that entered or left the
+    # selection since the last call are added / removed
+    def evaluateLiveSelection(self):
+        ordinals = self.selectionOrdinals()
+        if ordinals is None:
+            return
+        leftOrdinal, rightOrdinal = ordinals
+
+        selection = list(companySelection)
+        if self.liveSelection != selection:
+            companies = [self.data[c] for c in selection]
+            # Whole histories, the same selection aligns only once
+            key = ("aligned",) + tuple((company.cacheId, len(company))
+                                       for company in companies)
+            aligned = derivedCache.get(key, lambda: AlignedSeries.align(
+                [(company.dates, array("d", map(midpoint, company.opens,
+                                                company.closes)))
+                 for company in companies]),
+                *[company.cacheId for company in companies])
+            self.liveCorrelation = SlidingCorrelation(aligned)
+            self.liveSelection = selection
+
+        # Days strictly inside the selection
+        calendar = self.liveCorrelation.aligned.calendar
+        first = bisect_right(calendar, leftOrdinal)
+        last = max(first, bisect_left(calendar, rightOrdinal))
+        with profiler.stage("live evaluate"):
+            self.liveCorrelation.setWindow(first, last)
+
+            self.storeEvaluation(selection,
+                                 self.liveCorrelation.correlationMatrix(),
+                                 leftOrdinal, rightOrdinal)
+
     # Handle mouse presses
     def onMousePress(self, x, y):
         # Check if mouse is in graph
@@ -709,6 +767,9 @@ class StockGraph:
                 # Going left, update selection left
                 self.selectLeft = self.reverseTransform(x, y)[0]
 
+            if self.liveEvaluation:
+                self.evaluateLiveSelection()
+
     # Handle mouse release
     def onMouseRelease(self, x, y):
         # If dragging, stop dragging
@@ -736,24 +797,6 @@ class StockGraph:
 
 
 
-# Splits the input list L into sublists of size n
-# Returns them one at a time
-def splitList(L, n):
-    # Split the list into sublists of equal size
-    # If n not given
-    if n == -1:
-        n = len(L)
-
-    # Returns the sublists one at a time
-    for i in range(0, len(L), n):
-        yield L[i : i + n]
-
-# Returns a new lowercase string 
-# All spaces are replaced with underscores
-def formatName(name):
-    name = name.lower()
-    return name.replace(" ", "_")
-
 # Returns the number with the sign preserved
 def strWithSign(num):
     # e.g.
@@ -762,142 +805,89 @@ def strWithSign(num):
         return f"+{num}"
     return str(num)
 
-# Returns a list of tuples
-# tuple contains two adjacent elements from L
-def zipPair(L):
-    # zipPair([1, 2, 3, 4]) -> [(1, 2), (2, 3), (3, 4)]
-    return list(zip(L, L[1:]))
-
-# Returns the average of a list
-def average(L):
-    return sum(L) / len(L)
-
-# Returns the standard deviation of a list
-def stdDev(L):
-    # Calculate the average of the list
-    mean = sum(L) / len(L)
-
-    # Calculate sum of squared differences between each element and the average
-    variance = sum((i - mean) ** 2 for i in L) / len(L)
-
-    # Return square root of the variance (aka standard deviation)
-    return math.sqrt(variance)
-
-# Returns the correlation between two lists
-def correlation(L1, L2):
-    #check lists have the same number of elements
-    if len(L1) != len(L2):
-        raise ValueError("Lists are not the same length")
-
-    # no linear relationship exists exists
-    # if correlation coefficient is 0
-    if len(L1) == 0:
-        return 0
-
-    mean1 = sum(L1) / len(L1)
-    mean2 = sum(L2) / len(L2)
-
-    numerator = sum((x - mean1) * (y - mean2) for x, y in zip(L1, L2))
-    denominator = (math.sqrt(sum((x - mean1) ** 2 for x in L1)
-                             * sum((y - mean2) ** 2 for y in L2)))
-
-    if denominator == 0:
-        return 0
-
-    #return the correlation coefficient
-    return numerator / denominator
-
-# Returns a list of file names in a directory with a certain extension
-def fileNamesInDir(dirName, extension=".csv"):
-    # Used to get all the csv files in the data directory and load them
-    return [fileName for fileName in os.listdir(dirName)
-            if fileName.endswith(extension)]
-
-def readCSVrows(filename, categoryLength=-1):
-    # Create a csv reader
-    datareader = csv.reader(filename, delimiter=",")
-
-    # Skip the first row
-    companies = [company for company in next(datareader) if company != ""]
-
-    # Skip the second row
-    categories = next(datareader)
-
-    # Normalize the category names for better reading and storing as JSON
-    categories = [formatName(s) for s in categories[:categoryLength]]
-
-    # Create a dictionary of companies
-    stockData = {copmanyName: Company(copmanyName, copmanyName, []) 
-                 for copmanyName in companies}
-
-    # Read the rows
-    for row in datareader:
-        # Split the row into parts using the category length
-        parts = splitList(row, categoryLength)
-        for company, part in zip(companies, parts):
-            # If the first part is empty, assume that the rest of the parts are empty
-            if part[0] == "":
-                continue
-
-            # Add the stock to the company
-            stockData[company].stocks.append(Stock(*part[: categoryLength - 1]))
-
-    # Verify that the data is valid
-    for company in stockData.values():
-        company.verify()
-
-    return stockData
-
-for file in fileNamesInDir("stockdata"):
-    data = readCSVrows(open(f"stockdata/{file}"), 8)
-    print("Reading", file, "with", len(data), "companies")
-    totalData.update(data)
-
-# Warn the user if there is no data
-if len(totalData) == 0:
-    print()
-    print("=" * 80)
-
-    # os.getcwd() returns the string for the current dictionary
-    print(f"""No data found. Please make sure that stockdata at the directory
-        {os.getcwd()} is not empty and has valid .csv files""")
-    print("=" * 80)
-    print()
+# --- Startup ---
+# Importing this file only defines things, main() does the work:
+# the window opens with the title screen right away while a background
+# thread reads the image and the data, the widgets that depend on the
+# data are created once it is there (see finishStartup)
+# Worker processes of the loader re-import this file when they are spawned
+# (Windows / macOS), which is cheap for the same reason
+
+# Stores the seconds since start under name
+def recordStartup(name, start):
+    startupTimes[name] = time.perf_counter() - start
+
+# Returns the decoded (PIL) title image, None if it cannot be read
+def loadTitleImage():
+    try:
+        # PIL is only needed for the title image
+        from PIL import Image
+        image = Image.open("images/candlestick4.jpg")
+        image.load()
+        return image
+    except (ImportError, OSError) as e:
+        print("Title image not loaded:", e)
+        return None
+
+# Returns the data of the stockdata directory, see lazyLoading
+def loadData():
+    if lazyLoading:
+        # Only the headers are read, companies load when they are selected
+        data = LazyCompanies("stockdata", 8, pinned=companySelection)
+        print("Found", len(data), "companies (lazy loading)")
+    else:
+        loadStats = {}
+        data = loadCachedDirectory("stockdata", 8, stats=loadStats)
+        print("Reading", loadStats["files"], "files with", len(data),
+              "companies", f"({loadStats['cachedFiles']} cached,",
+              f"{loadStats['parsedFiles']} parsed, {loadStats['rows']} rows",
+              f"in {loadStats['seconds']:.2f}s)")
+
+    # Warn the user if there is no data
+    if len(data) == 0:
+        print()
+        print("=" * 80)
+
+        # os.getcwd() returns the string for the current dictionary
+        print(f"""No data found. Please make sure that stockdata at the directory
+            {os.getcwd()} is not empty and has valid .csv files""")
+        print("=" * 80)
+        print()
+
+    return data
+
+# Runs in a thread started by main()
+def loadInBackground():
+    global loadedImage, loadedData, updateWatcher
+    try:
+        start = time.perf_counter()
+        loadedImage = loadTitleImage()
+        recordStartup("title image", start)
+
+        # Rows added to the files from now on are new, rows added while
+        # loading are read twice and skipped by appendColumns
+        updateWatcher = UpdateWatcher("stockdata", 8)
+
+        start = time.perf_counter()
+        loadedData = loadData()
+        recordStartup("data", start)
+    except Exception:
+        traceback.print_exc()
+        loadedData = loadedData or {}
+    finally:
+        loadingDone.set()
 
 width = stockGraphBL[0] - indent * 2
 buttonHeight = ((screenHeight - stockGraphBL[1]) - indent * 4) // 4
 
-buttonClearAllSelection = Button("Clear All Selections", indent, 
-                                 stockGraphBL[1] + indent * 1, width, 
-                                 buttonHeight, rect={"fill": colorButtonBIG})
-
-buttonRenderMode = Button("PLACEHOLDER", indent, 
-                          stockGraphBL[1] + indent * 2 + buttonHeight, 
-                          width, buttonHeight, rect={"fill": colorButtonBIG})
-
-buttonEvaluate = Button("Evaluate", indent, 
-                        stockGraphBL[1] + indent * 3 + buttonHeight * 2, 
-                        width, buttonHeight * 2, rect={"fill": colorButtonBIG})
-
 companyHeight = indent / 2 + fontSize
 
-buttonsCompanies = [Button(company.name, indent, 
-                           stockGraphTR[1] + idx * (companyHeight + indent / 2), 
-                           width, companyHeight, 
-                           rect={"fill": colorButtonCompany}, meta=key) 
-                           for idx, (key, company) in enumerate(totalData.items())]
-
 # Bottom up
 diffs = (-5, -1, 1, 5)
 
 # *moving average button
 mabHeight = 2 * indent + fontSize
 mabWidth = (screenWidth - stockGraphTR[0]) - indent * 2
-buttonsMovingAverage = [Button(strWithSign(diff), stockGraphTR[0] + indent, 
-                               stockGraphBL[1] - idx * (mabHeight + indent)
-                               - mabHeight, mabWidth, mabHeight, meta=diff, 
-                               rect={"fill": colorButtonSmall}) 
-                               for idx, diff in enumerate(diffs)]
 
 # Equal partition for intervals
 timespans = [("all time", float("inf")), 
@@ -912,37 +902,106 @@ stockWidth = stockGraphTR[0] - stockGraphBL[0]
 timespanWidth = (stockWidth - indent * (len(timespans) - 1)) / len(timespans)
 timespanHeight = stockGraphTR[1] - 2 * indent
 
-buttonsTimespan = [Button(duration, 
-                          stockGraphBL[0] + idx * (timespanWidth + indent), 
-                          indent, timespanWidth, timespanHeight, meta=days) 
-                          for idx, (duration, days) in enumerate(timespans)]
-
 yZoomHeight = timespanHeight
 yZoomLabels = ["+", "auto", "-", "sel"]
 
-buttonsYZoom = [Button(label, stockGraphTR[0] + indent, 
-                       indent + idx * (yZoomHeight + indent), mabWidth, 
-                       yZoomHeight, meta=label, rect={"fill": colorButtonZoom}) 
-                       for idx, label in enumerate(yZoomLabels)]
-
-buttonsYZoom[-1].rect["fill"] = colorButtonSmall
-
-buttonStart = Button("Start", screenWidth / 2 - 250, screenHeight / 2,
-                     450, 200, rect={"fill": colorButtonStart},
-                     label={"size": 100})
-
-def calculateStockGraphics(stock, x, y, xScale, yScale, datemap, 
-                           barWidth=None, lrtb=(0, 0, 0, screenHeight), 
+# Creates the buttons that do not depend on the data
+def buildWidgets():
+    global buttonClearAllSelection, buttonRenderMode, buttonEvaluate
+    global buttonsMovingAverage, buttonsTimespan, buttonsYZoom, buttonStart
+
+    buttonClearAllSelection = Button("Clear All Selections", indent, 
+                                     stockGraphBL[1] + indent * 1, width, 
+                                     buttonHeight, rect={"fill": colorButtonBIG})
+
+    buttonRenderMode = Button("PLACEHOLDER", indent, 
+                              stockGraphBL[1] + indent * 2 + buttonHeight, 
+                              width, buttonHeight, rect={"fill": colorButtonBIG})
+
+    buttonEvaluate = Button("Evaluate", indent, 
+                            stockGraphBL[1] + indent * 3 + buttonHeight * 2, 
+                            width, buttonHeight * 2, rect={"fill": colorButtonBIG})
+
+    buttonsMovingAverage = [Button(strWithSign(diff), stockGraphTR[0] + indent, 
+                                   stockGraphBL[1] - idx * (mabHeight + indent)
+                                   - mabHeight, mabWidth, mabHeight, meta=diff, 
+                                   rect={"fill": colorButtonSmall}) 
+                                   for idx, diff in enumerate(diffs)]
+
+    buttonsTimespan = [Button(duration, 
+                              stockGraphBL[0] + idx * (timespanWidth + indent), 
+                              indent, timespanWidth, timespanHeight, meta=days) 
+                              for idx, (duration, days) in enumerate(timespans)]
+
+    buttonsYZoom = [Button(label, stockGraphTR[0] + indent, 
+                           indent + idx * (yZoomHeight + indent), mabWidth, 
+                           yZoomHeight, meta=label, rect={"fill": colorButtonZoom}) 
+                           for idx, label in enumerate(yZoomLabels)]
+
+    buttonsYZoom[-1].rect["fill"] = colorButtonSmall
+
+    buttonStart = Button("Start", screenWidth / 2 - 250, screenHeight / 2,
+                         450, 200, rect={"fill": colorButtonStart},
+                         label={"size": 100})
+
+# Returns a StockGraph of data at the graph's place on screen
+def createStockGraph(data):
+    return StockGraph(data, stockGraphBL[0], stockGraphTR[1], 
+                      stockGraphTR[0] - stockGraphBL[0], 
+                      stockGraphBL[1] - stockGraphTR[1], 
+                      backgroundBorder=colorBG, 
+                      background=colorFG, border="black")
+
+# Button of the company key, the idx-th in the list
+def companyButton(idx, key):
+    return Button(key, indent, 
+                  stockGraphTR[1] + idx * (companyHeight + indent / 2), 
+                  width, companyHeight, 
+                  rect={"fill": colorButtonCompany}, meta=key)
+
+# Creates the company buttons and the graph of data
+def buildDataWidgets(data):
+    global totalData, buttonsCompanies, stockGraph
+    totalData = data
+
+    buttonsCompanies = [companyButton(idx, key)
+                        for idx, key in enumerate(totalData)]
+
+    stockGraph = createStockGraph(totalData)
+    stockGraph.backgroundBorder = colorBG if not debug else None
+
+    if useTradingCalendar and not lazyLoading:
+        stockGraph.dm.setCalendar(tradingDays(totalData.values()))
+
+# Called every step until it returns True
+# Finishes the startup on the main thread once the background loading is done
+def finishStartup():
+    if stockGraph is not None:
+        return True
+    if not loadingDone.is_set():
+        return False
+
+    start = time.perf_counter()
+    buildDataWidgets(loadedData)
+    recordStartup("graph", start)
+    recordStartup("ready", startupStart)
+
+    print("Startup:", ", ".join(f"{name} {seconds:.2f}s"
+                                for name, seconds in startupTimes.items()))
+    return True
+
+def calculateStockGraphics(dateIdx, open, high, low, close, x, y, xScale, 
+                           yScale, barWidth=None, lrtb=(0, 0, 0, screenHeight), 
                            movingAveragePoint=None):
+    # dateIdx: index of the stock's date (see DateMapper)
     # x, y: origin (x is date)
     # xScale: how many pixels per day
     # yScale: how many pixels per unit currency
 
     # Get height of stock bar
-    diff = stock.close - stock.open
+    diff = close - open
     h = max(0.00001, abs(diff))
 
-    dateIdx = datemap.getDateIndex(stock.date)
     sx = dateIdx * xScale + x
 
     barWidth = barWidth or xScale
@@ -950,8 +1009,8 @@ def calculateStockGraphics(stock, x, y, xScale, yScale, datemap,
     # Check if the stock bar is visible
     visible = not isOutside(sx, y, -barWidth / 2 + lrtb[0], 
                             barWidth / 2 + lrtb[1], 
-                            stock.low * yScale + lrtb[2], 
-                            stock.high * yScale + lrtb[3])
+                            low * yScale + lrtb[2], 
+                            high * yScale + lrtb[3])
 
     # Check if the moving average is visible
     maVisible = (movingAveragePoint is not None
@@ -962,6 +1021,165 @@ def calculateStockGraphics(stock, x, y, xScale, yScale, datemap,
 
     return visible, maVisible, sx, diff, h
 
+# Screen geometry of the bars of a company that are inside view
+# Returns (rising rectangles, falling rectangles, [(line points, color)]),
+# see drawRects and drawLine, the moving average is the first line
+def companyGeometry(company, dm, view):
+    scaledOffsetX, scaledOffsetY = view.transform(0, 0)
+
+    # Zoomed out, neighbouring bars are merged (see OHLCPyramid)
+    # Accurate mode keeps about one bar per pixel, fast mode 4 pixels
+    factor = lodFactor(view.zoomX, 1 if view.accurate else 4)
+
+    #left, right, top, bottom
+    lrtb = (view.x, view.x + view.w, view.y, view.y + view.h)
+
+    leftOrdinal = dm.indexOrdinal(modularMult(0,
+                  view.reverseTransform(view.x - 30, 0)[0], 1))
+    rightOrdinal = dm.indexOrdinal(modularMult(0,
+                   view.reverseTransform(view.x + view.w + 30, 0)[0], 1))
+
+    # Moving average absolute data
+    with profiler.stage("moving average"):
+        ma = company.movingAverage(view.movingAverageWidth)
+
+    # Read the columns directly instead of building row objects
+    # Bar i of the level covers rows [i * factor, (i + 1) * factor)
+    with profiler.stage("date mapping"):
+        dayIndices = company.dayIndices(dm)
+    level = company.pyramid().level(factor)
+    factor = level.factor
+    opens, highs = level.opens, level.highs
+    lows, closes = level.lows, level.closes
+
+    # Only the bars between leftOrdinal and rightOrdinal are visited
+    first, last = company.dateRange(leftOrdinal, rightOrdinal)
+
+    # Bars and wicks of each color are drawn as a single shape
+    risingRects = []
+    fallingRects = []
+
+    # (x, row index) of the visited bars, the lines go through them
+    samples = []
+    bars = range(first // factor, -(-last // factor))
+    profiler.count("bars scanned", len(bars))
+    for barIdx in bars:
+        stockIdx = barIdx * factor
+        close = closes[barIdx]
+        open = opens[barIdx]
+        high = highs[barIdx]
+        low = lows[barIdx]
+
+        visible, _, sx, diff, barHeight = calculateStockGraphics(
+            dayIndices[stockIdx],
+            open, high, low, close, scaledOffsetX, scaledOffsetY,
+            view.zoomX, view.zoomY, view.zoomX * factor, lrtb)
+        samples.append((sx, stockIdx))
+
+        # If the stock is not visible, skip it
+        if not visible:
+            continue
+
+        rects = risingRects if diff > 0 else fallingRects
+
+        # Main stock bar, merged bars span all of their days
+        rects.append((sx - view.zoomX / 2, 
+                      scaledOffsetY - close * view.zoomY if diff > 0 
+                      else scaledOffsetY - open * view.zoomY, 
+                      view.zoomX * factor, barHeight * view.zoomY))
+
+        if view.accurate or view.zoomX > 5:
+            # High and low, a rectangle one pixel wide
+            wickX = sx + view.zoomX * (factor - 1) / 2
+            rects.append((wickX - 0.5, scaledOffsetY - high * view.zoomY,
+                          1, (high - low) * view.zoomY))
+
+    # Bars come with a wick rectangle when those are drawn
+    wicks = view.accurate or view.zoomX > 5
+    profiler.count("bars drawn",
+                   (len(risingRects) + len(fallingRects)) // (2 if wicks else 1))
+
+    toY = lambda value: scaledOffsetY - value * view.zoomY
+    lines = [(linePoints(ma, samples, toY, lrtb[2], lrtb[3]), "black")]
+    if view.overlay is not None:
+        with profiler.stage("indicator"):
+            indicator = company.indicator(*view.overlay)
+        lines += overlayLines(indicator, samples, view, toY)
+    return risingRects, fallingRects, lines
+
+# Points of a line through series at the (x, row index) samples, in the
+# (x, y, drawn) form of lineRuns
+# Only visible points and their neighbours are kept, nan values (before an
+# indicator has enough data) are left out
+def linePoints(series, samples, toY, top, bottom):
+    points = []
+    previous = None
+    previousVisible = False
+    for sx, stockIdx in samples:
+        value = series[stockIdx]
+        if math.isnan(value):
+            previous = None
+            continue
+        y = toY(value)
+        visible = top <= y <= bottom
+        if visible and not previousVisible:
+            # Start of a line, from the point before it
+            if previous is not None:
+                points.append((*previous, False))
+                points.append((sx, y, True))
+            else:
+                points.append((sx, y, False))
+        elif visible or previousVisible:
+            points.append((sx, y, True))
+        previous = (sx, y)
+        previousVisible = visible
+    return points
+
+# [(line points, color)] of the lines of an indicator
+# Indicators that are not prices (e.g. RSI) get a band at the bottom of the
+# graph, scaled to their bounds or else to their visible values
+def overlayLines(indicator, samples, view, toY):
+    lines = list(indicator.lines.values())
+    top, bottom = view.y, view.y + view.h
+    if not indicator.onPrice:
+        top = bottom - view.h * indicatorBandHeight
+        low, high = indicator.bounds or seriesRange(lines, samples)
+        scale = (bottom - top) / max(1e-9, high - low)
+        toY = lambda value: bottom - (value - low) * scale
+    return [(linePoints(line, samples, toY, top, bottom), fill)
+            for line, fill in zip(lines, overlayColors)]
+
+# (lowest, highest) value of the lines at the samples, nans are skipped
+def seriesRange(lines, samples):
+    values = [line[stockIdx] for line in lines for _, stockIdx in samples]
+    values = [value for value in values if not math.isnan(value)]
+    if not values:
+        return 0, 1
+    return min(values), max(values)
+
+# Raster thread: paints the bars of companies into an image (PIL ImageDraw)
+# job: (view at (0, 0), companies, DateMapper)
+def paintChart(job, draw):
+    view, companies, dm = job
+    for company in companies:
+        risingRects, fallingRects, lines = companyGeometry(company, dm, view)
+        for rects, fill in ((risingRects, "green"), (fallingRects, "red")):
+            for x, y, w, h in rects:
+                # Both corners are part of the rectangle in PIL
+                draw.rectangle((x, y, x + max(0, w - 1), y + max(0, h - 1)),
+                               fill=fill)
+        for points, fill in lines:
+            for run in lineRuns(points):
+                if len(run) > 1:
+                    draw.line(run, fill=fill, width=2)
+
+# Returns how many bars to merge (a power of two) so that each bar is
+# at least barPixels wide
+def lodFactor(zoomX, barPixels):
+    if zoomX >= barPixels:
+        return 1
+    return 2 ** math.floor(math.log2(barPixels / zoomX))
+
 # Checks if a point is outside a rectangle
 def isOutside(x, y, left, right, top, bottom):
     # Note that top is higher on the screen
@@ -974,11 +1192,6 @@ def rangeStep(start, end, step: float = 1):
         yield start
         start += step
 
-# Iterates through a list with a step
-def enumerateIterList(L, step):
-    for i in range(0, len(L), step):
-        yield i, L[i]
-
 # Modular Multiplication
 def modularMult(n, lim, d):
     # Adds the remainder of n divided by d to the highest multiple of d
@@ -986,22 +1199,53 @@ def modularMult(n, lim, d):
     # modularMult(11, 8, 3) -> (11 % 3) + (3 * (8 // 3)) -> 2 + 3 * 2 = 8
     return (n % d) + (d * (lim // d))
 
-# Draws a line with multiple points
+# Splits (x, y, whether the segment ending at this point is drawn) points
+# into unbroken runs of (x, y) points
+def lineRuns(points):
+    run = []
+    for x, y, drawn in points:
+        if not drawn:
+            yield run
+            run = []
+        run.append((x, y))
+    yield run
+
+# Draws a line with multiple points, see lineRuns
+# Every unbroken run of segments is a single shape
 def drawLine(points, fill="black", lineWidth=2):
-    for p1, p2 in zipPair(points):
-        if not p2[2]:
-            continue
-        c.drawLine(p1[0], p1[1], p2[0], p2[1], fill=fill, lineWidth=lineWidth)
-
-stockGraph = StockGraph(totalData, stockGraphBL[0], stockGraphTR[1], 
-                        stockGraphTR[0] - stockGraphBL[0], 
-                        stockGraphBL[1] - stockGraphTR[1], 
-                        backgroundBorder=colorBG, 
-                        background=colorFG, border="black")
+    for run in lineRuns(points):
+        drawPolyline(run, fill, lineWidth)
+
+# Draws a line through (x, y) points as one shape
+# The points are walked forward and back again, so the polygon encloses
+# no area and only its border shows
+def drawPolyline(points, fill="black", lineWidth=2):
+    if len(points) < 2:
+        return
+    if len(points) == 2:
+        (x1, y1), (x2, y2) = points
+        c.drawLine(x1, y1, x2, y2, fill=fill, lineWidth=lineWidth)
+        return
+    path = [value for point in points + points[-2:0:-1] for value in point]
+    c.drawPolygon(*path, fill=None, border=fill, borderWidth=lineWidth)
+
+# Draws (x, y, w, h) rectangles as one polygon
+# Each rectangle is a loop starting at its top left corner, the loops are
+# joined corner to corner and walked back at the end, those joins enclose
+# no area so only the rectangles are filled
+def drawRects(rects, fill):
+    if not rects:
+        return
+    path = []
+    for x, y, w, h in rects:
+        path += (x, y, x + w, y, x + w, y + h, x, y + h, x, y)
+    for x, y, _, _ in reversed(rects[:-1]):
+        path += (x, y)
+    c.drawPolygon(*path, fill=fill)
 
 # Handles mouse drag
 def onMouseDrag(app, x, y):
-    if title:
+    if title or stockGraph is None:
         return
     stockGraph.onMouseDrag(x, y)
 
@@ -1009,9 +1253,12 @@ def onMouseDrag(app, x, y):
 def onMousePress(app, x, y):
     global title
     if title:
-        if buttonStart.contains(x, y):
+        # Start waits for the data
+        if buttonStart.contains(x, y) and finishStartup():
             title = False
         return
+    if stockGraph is None:
+        return
 
     stockGraph.onMousePress(x, y)
 
@@ -1025,6 +1272,7 @@ def onMousePress(app, x, y):
     # check if user clikced Clear All Selection button
     if buttonClearAllSelection.contains(x, y):
         companySelection.clear()
+        stockGraph.patternMatches = ()
         return
 
     # check if user clicked on Evaluate
@@ -1085,13 +1333,13 @@ def onMousePress(app, x, y):
 
 # Handles mouse release
 def onMouseRelease(app, x, y):
-    if title:
+    if title or stockGraph is None:
         return
     stockGraph.onMouseRelease(x, y)
 
 # Handle keyholds
 def onKeyHold(app, keys):
-    if title:
+    if title or stockGraph is None:
         return
     stockGraph.onKeyHold(keys)
 
@@ -1099,33 +1347,175 @@ def onKeyHold(app, keys):
 def onKeyPress(app, key):
     # was used for debugging
     # helped to remove excess graphs of stocks from showing
-    global debug
+    global debug, rasterRendering, tracing
     if key == "d":
         debug = not debug
-        stockGraph.backgroundBorder = colorBG if not debug else None
-
-    if title:
+        profiler.setEnabled(debug or tracing)
+        if stockGraph is not None:
+            stockGraph.backgroundBorder = colorBG if not debug else None
+
+    # Toggle writing the frame profile to traceFileName
+    if key == "t":
+        tracing = not tracing
+        profiler.setTrace(traceFileName if tracing else None)
+        profiler.setEnabled(debug or tracing)
+        print(("Writing" if tracing else "Stopped writing"), traceFileName)
+
+    if title or stockGraph is None:
         return
 
+    # Toggle continuous auto zoom of the price axis
+    if key == "a":
+        stockGraph.autoFit = not stockGraph.autoFit
+
+    # Cycle through the indicator overlays
+    if key == "o":
+        stockGraph.overlayIdx = (stockGraph.overlayIdx + 1) % len(overlays)
+
+    # Toggle evaluation while dragging a selection
+    if key == "l":
+        stockGraph.liveEvaluation = not stockGraph.liveEvaluation
+
+    # Screen every company against the selected one
+    if key == "s":
+        startScreen()
+
+    # Search every company for windows shaped like the selection
+    if key == "f":
+        startPatternSearch()
+
+    # Toggle painting the bars on another thread
+    if key == "r":
+        if rasterAvailable:
+            rasterRendering = not rasterRendering
+        else:
+            print("Raster rendering needs PIL")
+
+# Shortcut help next to the graph, bottom line first
+instructionLines = list(reversed(
+    [line.lstrip() for line in """
+    Key shortcuts:
+    - = and - to zoom in and out on both axis
+    - [ and ] to zoom in and out on time axis
+    - a to keep the price axis fitted while panning
+    - l to evaluate while dragging a selection
+    - r to draw the bars on another thread
+    - o to cycle the indicator overlays
+    - s to find the companies most like the selected one
+    - f to find windows shaped like the selection
+    - d shows the frame profile, t writes it to a file
+
+    Buttons:
+    - +, auto, -: zoom price axis
+    - sel: zoom to selection
+    - +5, +1, -1, -5: change moving average width
+
+    Magnify:
+    - Click the magnify icon to select function
+    - Click on the graph to zoom
+    - Deselect magnify icon to de-select function
+    
+    Select:
+    - Make sure a selection exists
+    before clicking evaluate
+
+    - When selecting new companies,
+    click evaluate to update the chart
+
+    - To create a selection,
+    drag on the bottom part of the graph
+    """.splitlines()]))
+
 def drawTitle():
+    global titleImage
+    # Converted for drawing once the background thread has read it
+    if titleImage is None and loadedImage is not None:
+        titleImage = c.CMUImage(loadedImage)
+
     # Draw background and change image size to fit high res
-    c.drawImage(image,0,0,width=1920,height=1080)
+    if titleImage is not None:
+        c.drawImage(titleImage,0,0,width=1920,height=1080)
 
     #Draw stock analyzer title
     c.drawLabel("Stock Analyzer", screenWidth / 2, screenHeight / 4, 
                 fill=colorFG, italic=True, bold=True, size=200)
 
+    buttonStart.text = "Start" if stockGraph is not None else "Loading"
     buttonStart.draw()
 
 def redrawAll(app):
-    global tick
+    global tick, frameShapes
 
-    if title:
-        drawTitle()
+    # Everything counted since the last call belongs to the previous frame
+    frameShapes = c.count
+    c.count = 0
+
+    if "window" not in startupTimes:
+        recordStartup("window", startupStart)
+
+    with profiler.stage("redrawAll"):
+        drawFrame()
+    profiler.count("shapes", c.count)
+
+    if debug:
+        drawProfile()
+    profiler.endFrame()
+
+# Draws the title screen or the graph and the panels
+def drawFrame():
+    # The graph is shown once the data is there
+    if not finishStartup() or title:
+        with profiler.stage("title"):
+            drawTitle()
         return
 
-    stockGraph.draw()
+    with profiler.stage("graph"):
+        stockGraph.draw()
+
+    # Stays about the same however many bars are visible (see drawRects)
+    c.drawLabel(f"{frameShapes} shapes per frame", stockGraphTR[0],
+                stockGraphBL[1] + 5, align="right-top", size=15, fill=colorFG)
+
+    # Draw time at top left
+    c.drawLabel(f"{datetime.now().strftime('%Y-%m-%d | %H:%M:%S')}", 
+                stockGraphBL[0] // 2, stockGraphTR[1] // 2, 
+                size=fontSize, fill=colorFG)
 
+    with profiler.stage("panels"):
+        panelCache.draw(panelKey(), drawPanels)
+
+# Draws the stage times and counters of the last frame over the graph
+def drawProfile():
+    interval, stages, counters = profiler.lastFrame
+    lines = [f"frame {interval * 1000:.1f} ms "
+             f"({1 / interval if interval else 0:.0f} fps)"]
+    # Sorted by name, nested stages follow their parent
+    for name in sorted(stages):
+        depth = name.count("/")
+        lines.append("  " * depth + f"{name.rsplit('/', 1)[-1]} "
+                     f"{stages[name] * 1000:.2f} ms")
+    for name in sorted(counters):
+        lines.append(f"{name}: {counters[name]}")
+    cache = derivedCache.stats()
+    lines.append(f"derived cache: {cache['bytes'] / 2 ** 20:.1f} of "
+                 f"{cache['budget'] / 2 ** 20:.0f} MB, {cache['entries']} "
+                 f"entries, {cache['evictions']} evicted")
+
+    lineHeight = 16
+    x, y = stockGraphBL[0] + 10, stockGraphTR[1] + 10
+    c.drawRect(x, y, 300, lineHeight * len(lines) + 10, fill="black",
+               opacity=60)
+    for idx, line in enumerate(lines):
+        c.drawLabel(line, x + 5, y + 5 + idx * lineHeight, align="left-top",
+                    size=13, fill="white")
+
+# Everything the buttons and the evaluation are drawn from
+def panelKey():
+    return (tuple(sorted(companySelection)), accurateRenderMode,
+            stockGraph.evaluationVersion, len(buttonsCompanies))
+
+# Draws the buttons, the instructions and the evaluation
+def drawPanels():
     # Draw operating buttons
     buttonRenderMode.text = "Render mode: " + ("accurate" if accurateRenderMode
                                                else "fast")
@@ -1150,40 +1540,8 @@ def redrawAll(app):
     for button in buttonsYZoom:
         button.draw()
 
-    # Draw time at top left
-    c.drawLabel(f"{datetime.now().strftime('%Y-%m-%d | %H:%M:%S')}", 
-                stockGraphBL[0] // 2, stockGraphTR[1] // 2, 
-                size=fontSize, fill=colorFG)
-
-    instructions = reversed(
-        [line.lstrip() for line in """
-    Key shortcuts:
-    - = and - to zoom in and out on both axis
-    - [ and ] to zoom in and out on time axis
-
-    Buttons:
-    - +, auto, -: zoom price axis
-    - sel: zoom to selection
-    - +5, +1, -1, -5: change moving average width
-
-    Magnify:
-    - Click the magnify icon to select function
-    - Click on the graph to zoom
-    - Deselect magnify icon to de-select function
-    
-    Select:
-    - Make sure a selection exists
-    before clicking evaluate
-
-    - When selecting new companies,
-    click evaluate to update the chart
-
-    - To create a selection,
-    drag on the bottom part of the graph
-    """.splitlines()])
-
     # Draw instructions from bottom up
-    for idx, instruction in enumerate(instructions):
+    for idx, instruction in enumerate(instructionLines):
         c.drawLabel(instruction, indent,
                     stockGraphBL[1] - idx * fontSize / 2.5, 
                     size=fontSize / 2.5, fill=colorFG, 
@@ -1201,9 +1559,13 @@ def redrawAll(app):
                totalHeight, fill=colorEvalBG)
 
     csl = list(companySelection)
+    # Companies selected after the evaluation have no cells yet
+    evaluation = stockGraph.evaluationData
+    positions = [evaluation.index.get(c) for c in csl]
 
     # Draw evaluation
     for i, c1 in enumerate(csl):
+        row = evaluation.row(c1) if positions[i] is not None else None
         for j, c2 in enumerate(csl):
             # Gray if same company
             # Green if correlation is positive
@@ -1212,8 +1574,10 @@ def redrawAll(app):
             if i == j:
                 fill = "gray"
             else:
-                correlationR = stockGraph.evaluationData.get(c1, c2)
-                if correlationR is None:
+                correlationR = None
+                if row is not None and positions[j] is not None:
+                    correlationR = row[positions[j]]
+                if correlationR is None or math.isnan(correlationR):
                     fill = None
                 else:
                     correlationR = max(0, min(2, 1 + correlationR))
@@ -1257,8 +1621,7 @@ def redrawAll(app):
     # Draw chart
     chartStartX = stockGraphBL[0] + totalWidth + indent
     chartTotalWidth = screenWidth - chartStartX - indent
-    headers = ["Avg Price Change", "Avg Volume", "Price Fluctuation", 
-               "Open Close Gap Average"]
+    headers = statNames
     chartColumnWidth = (chartTotalWidth - firstColumnWidth) / 4
 
     # Draw background
@@ -1304,10 +1667,138 @@ def redrawAll(app):
 def onStep(app):
     global tick
     tick += 1
+    if finishStartup():
+        checkForUpdates()
+        stepScreen()
+        stepPatternSearch()
+
+# Starts screening every company against the only selected company over
+# the selection
+def startScreen():
+    global correlationScreen
+    ordinals = stockGraph.selectionOrdinals()
+    if len(companySelection) != 1 or ordinals is None:
+        print("Screening needs one selected company and a selection")
+        return
+    target = next(iter(companySelection))
+    correlationScreen = CorrelationScreen(totalData, target, *ordinals)
+    print(f"Screening {len(correlationScreen.names)} companies against",
+          target)
+
+# Returns True once search.step(size) returned True, steps until
+# searchStepSeconds passed otherwise
+def stepFor(search, size):
+    deadline = time.perf_counter() + searchStepSeconds
+    while not search.step(size):
+        if time.perf_counter() >= deadline:
+            return False
+    return True
+
+# Screens the next blocks of companies, once all are done the most
+# correlated ones are selected next to the target and evaluated
+def stepScreen():
+    global correlationScreen
+    if (correlationScreen is None
+        or not stepFor(correlationScreen, screenBlockSize)):
+        return
+    screen, correlationScreen = correlationScreen, None
+
+    top = screen.top(screenCount)
+    if not top:
+        print("No company traded on enough days of the selection with",
+              screen.target)
+        return
+    print(f"Most correlated with {screen.target}:")
+    for name, r, days in top:
+        print(f"  {name:<8} {r:+.3f} over {days} days")
+    companySelection.update(name for name, _, _ in top)
+    stockGraph.evaluateSelection()
+
+# Appends the new rows of the data and update files (see stockupdate)
+def checkForUpdates():
+    global lastUpdateCheck
+    now = time.perf_counter()
+    if updateWatcher is None or now - lastUpdateCheck < updateInterval:
+        return
+    lastUpdateCheck = now
+
+    # The raster thread reads the columns that grow
+    paused = stockGraph.raster.paused() if stockGraph.raster else nullcontext()
+    try:
+        with paused:
+            appended = updateWatcher.apply(totalData)
+    except OSError:
+        traceback.print_exc()
+        return
+    if not appended:
+        return
+
+    if useTradingCalendar and not lazyLoading:
+        stockGraph.dm.extendCalendar(
+            ordinal for name, rows in appended.items()
+            for ordinal in totalData[name].dates[-rows:])
+    # The live evaluation aligns the selection again
+    stockGraph.liveSelection = None
+    print("New rows:", ", ".join(f"{name} +{rows}"
+                                 for name, rows in appended.items()))
+
+    # Companies seen for the first time get a button
+    known = {button.meta for button in buttonsCompanies}
+    for name in appended:
+        if name not in known:
+            buttonsCompanies.append(companyButton(len(buttonsCompanies), name))
+            print("New company:", name)
+
+# Starts searching every company for windows shaped like the selection of
+# the only selected company
+def startPatternSearch():
+    global patternSearch
+    ordinals = stockGraph.selectionOrdinals()
+    if len(companySelection) != 1 or ordinals is None:
+        print("Pattern search needs one selected company and a selection")
+        return
+    target = next(iter(companySelection))
+    stockGraph.patternMatches = ()
+    patternSearch = PatternSearch(totalData, target, *ordinals, patternCount)
+    print(f"Searching {len(patternSearch.names)} companies for "
+          f"{patternSearch.length} days of {target}")
+
+# Searches the next blocks of companies, once all are done the matches are
+# highlighted and their companies selected
+def stepPatternSearch():
+    global patternSearch
+    if (patternSearch is None
+        or not stepFor(patternSearch, patternBlockCount)):
+        return
+    search, patternSearch = patternSearch, None
+
+    matches = search.top()
+    if not matches:
+        print("No window like the selection of", search.target)
+        return
+    print(f"Windows shaped like {search.target}:")
+    for name, first, last, distance in matches:
+        print(f"  {name:<8} {datetime.fromordinal(first).date()} to "
+              f"{datetime.fromordinal(last).date()} distance {distance:.2f}")
+    stockGraph.patternMatches = tuple(matches)
+    companySelection.update(name for name, _, _, _ in matches)
+
+def main():
+    recordStartup("imports", startupStart)
+
+    start = time.perf_counter()
+    buildWidgets()
+    recordStartup("widgets", start)
+
+    # The image and the data are read while the title screen is shown
+    threading.Thread(target=loadInBackground, daemon=True).start()
+
+    c.app.background = colorBG
 
-app.background = colorBG
+    # don't crash
+    c.app.setMaxShapeCount(50000)
 
-# don't crash
-app.setMaxShapeCount(50000)
+    c.runApp(screenWidth, screenHeight)
 
-c.runApp(screenWidth, screenHeight)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+# Frame time of StockGraph.draw for 1, 10 and 100 selected companies
+# uncached: every frame is drawn from scratch, as after a pan or zoom
+# cached: unchanged frames replayed by the FrameCache
+# Usage: python benchmarks/frametime.py [--years 40] [--frames 20]
+import argparse
+
+from harness import loadApp, makeGraph, timeCall, bestTime
+from synthetic import syntheticCompanies
+import stubgraphics
+
+# Zooms graph so that days trading days before the newest date are visible
+# days=None shows the whole history
+def setView(graph, data, days=None):
+    lastIndex = max(company.dayIndices(graph.dm)[-1] for company in data.values())
+    firstIndex = min(company.dayIndices(graph.dm)[0] for company in data.values())
+    if days is None:
+        days = lastIndex - firstIndex
+    graph.zoomX = graph.w / days
+    graph.userFocus = (lastIndex - days / 2, graph.userFocus[1])
+    graph.calculateHighestAndLowest()
+    graph.autoZoomY()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=40)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    app = loadApp()
+    views = [("1 week", 5), ("1 year", 261), ("all time", None)]
+
+    print(f"{'companies':>9} {'view':>9} {'mode':>9} {'uncached':>9} "
+          f"{'cached':>9} {'shapes':>7}")
+    for count in args.counts:
+        data = syntheticCompanies(count, args.years)
+        graph = makeGraph(app, data)
+        app["companySelection"].clear()
+        app["companySelection"].update(data)
+
+        def drawnFromScratch():
+            graph.frameCache.key = None
+
+        for viewName, days in views:
+            setView(graph, data, days)
+            for accurate in (False, True):
+                app["accurateRenderMode"] = accurate
+                # First frame fills the moving average and day index caches
+                graph.draw()
+                stubgraphics.resetShapes()
+                uncached = bestTime(graph.draw, repeat=1, number=args.frames,
+                                    setup=drawnFromScratch)
+                shapes = stubgraphics.totalShapes() / args.frames
+                cached = timeCall(graph.draw, args.frames)
+                print(f"{count:>9} {viewName:>9} "
+                      f"{'accurate' if accurate else 'fast':>9} "
+                      f"{uncached * 1000:>9.2f} {cached * 1000:>9.2f} "
+                      f"{shapes:>7.0f}")
+
+    app["companySelection"].clear()
+    app["accurateRenderMode"] = False
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Helpers shared by the benchmarks
+import os
+import sys
+import time
+import runpy
+
+repoRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repoRoot)
+
+import stubgraphics
+
+# Runs "Stock Analyzer.py" against the stub drawing backend
+# Importing the app only defines things (see main() there), the widgets
+# that do not depend on the data are created here
+# Returns the module globals of the app
+def loadApp():
+    sys.modules["cmu_graphics"] = stubgraphics
+    cwd = os.getcwd()
+    os.chdir(repoRoot)
+    try:
+        namespace = runpy.run_path(os.path.join(repoRoot, "Stock Analyzer.py"),
+                                   run_name="benchmark")
+    finally:
+        os.chdir(cwd)
+    # run_path returns a copy, the functions see the real globals
+    app = namespace["redrawAll"].__globals__
+    app["buildWidgets"]()
+    return app
+
+# Creates a StockGraph with the same geometry as the app's one
+def makeGraph(app, data):
+    return app["createStockGraph"](data)
+
+# Calls function repeat times, returns the average seconds per call
+def timeCall(function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+# Best of repeat averages of number calls, less noisy than a single average
+# setup() runs before every call without being timed
+def bestTime(function, repeat=5, number=1, setup=None):
+    best = float("inf")
+    for _ in range(repeat):
+        total = 0.0
+        for _ in range(number):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            function()
+            total += time.perf_counter() - start
+        best = min(best, total / number)
+    return best
@@ -0,0 +1,255 @@
+# Timed benchmarks of loading, the data model, the analytics and drawing
+# A synthetic universe is written as csv first (see synthetic.py), draw
+# runs against the stub drawing backend (see stubgraphics.py)
+# Results are stored as json in benchmarks/results and compared with the
+# latest earlier run of the same size
+#
+# Usage: python benchmarks/suite.py [--tickers 20] [--years 20]
+#        [--repeat 5] [--filter draw] [--compare PATH] [--no-save]
+import os
+import json
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from array import array
+from datetime import datetime
+
+from harness import repoRoot, loadApp, makeGraph, bestTime
+from synthetic import syntheticUniverse, writeSyntheticCSV
+from stockloader import readCSVrows, readCSVBulk
+from stockmodel import Company
+from stockderived import derivedCache
+from stockanalytics import screenCorrelations
+from stockpattern import findSimilarPatterns
+
+resultsDir = os.path.join(repoRoot, "benchmarks", "results")
+
+# Returns the short hash of the checked out commit, None outside of git
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=repoRoot, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Returns the newest stored result of a run with the same parameters
+# Runs of another size are not comparable, None if there is none
+def latestResult(parameters):
+    if not os.path.isdir(resultsDir):
+        return None
+    for name in sorted(os.listdir(resultsDir), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(resultsDir, name)) as f:
+            result = json.load(f)
+        if result.get("parameters") == parameters:
+            return result
+    return None
+
+# Returns a copy of company with its rows in random order
+def shuffledCompany(company, seed=0):
+    order = list(range(len(company)))
+    random.Random(seed).shuffle(order)
+    columns = [array(column.typecode, [column[i] for i in order])
+               for column in company.columns]
+    return Company.fromColumns(company.name, company.ticker, *columns,
+                               verify=False)
+
+# Returns [(name, function, setup)] of every benchmark
+def buildBenchmarks(csvPath, app):
+    with open(csvPath) as f:
+        data = readCSVBulk(f)
+    companies = list(data.values())
+    graph = makeGraph(app, data)
+    selection = app["companySelection"]
+    dm = graph.dm
+
+    ordinals = [ordinal for company in companies for ordinal in company.dates]
+    indices = [dm.ordinalIndex(ordinal) for ordinal in ordinals]
+
+    # Whole history visible, a third of it selected
+    lastIndex = max(company.dayIndices(dm)[-1] for company in companies)
+    firstIndex = min(company.dayIndices(dm)[0] for company in companies)
+    graph.zoomX = graph.w / (lastIndex - firstIndex)
+    graph.userFocus = ((firstIndex + lastIndex) / 2, graph.userFocus[1])
+    graph.movingAverageWidth = 20
+    graph.selectLeft = firstIndex + (lastIndex - firstIndex) / 3
+    graph.selectRight = firstIndex + (lastIndex - firstIndex) * 2 / 3
+
+    # Every company against the first one over the selection
+    screenTarget = next(iter(data))
+    screenWindow = graph.selectionOrdinals()
+    # Three months in the middle of its history as the pattern
+    middle = len(data[screenTarget]) // 2
+    patternWindow = (data[screenTarget].dates[middle],
+                     data[screenTarget].dates[middle + 59])
+
+    def selectAll():
+        selection.clear()
+        selection.update(data)
+
+    def readRows():
+        with open(csvPath) as f:
+            readCSVrows(f, 8)
+
+    def readBulk():
+        with open(csvPath) as f:
+            readCSVBulk(f, 8)
+
+    def verifySorted():
+        for company in companies:
+            company.verify()
+
+    shuffled = []
+
+    def shuffle():
+        shuffled[:] = [shuffledCompany(company) for company in companies]
+
+    def verifyShuffled():
+        for company in shuffled:
+            company.verify()
+
+    def clearIndicators():
+        derivedCache.clear()
+
+    def movingAverages():
+        for company in companies:
+            company.movingAverage(20)
+
+    def indicators():
+        for company in companies:
+            for kind, *parameters in (("ema", 20), ("wma", 20),
+                                      ("bollinger", 20, 2), ("rsi", 14),
+                                      ("macd", 12, 26, 9)):
+                company.indicator(kind, *parameters)
+
+    # Every history without its last day, with everything derived built
+    growing = []
+
+    def truncate():
+        growing[:] = [Company.fromColumns(
+            company.name, company.ticker,
+            *[array(column.typecode, column[:-1]) for column in company.columns],
+            verify=False) for company in companies]
+        for company in growing:
+            company.pyramid()
+            company.prefixStats()
+            company.movingAverage(20)
+
+    def appendDay():
+        for company, full in zip(growing, companies):
+            company.appendColumns(*[column[-1:] for column in full.columns])
+
+    def clearHighLow():
+        selectAll()
+        graph.highestPrice = graph.lowestPrice = 0
+
+    def render():
+        selectAll()
+        # Drawn from scratch, not replayed (see FrameCache)
+        graph.frameCache.key = None
+
+    return [
+        ("readCSVrows", readRows, None),
+        ("readCSVBulk", readBulk, None),
+        ("Company.verify sorted", verifySorted, None),
+        ("Company.verify shuffled", verifyShuffled, shuffle),
+        ("movingAverage", movingAverages, clearIndicators),
+        ("indicators", indicators, clearIndicators),
+        ("Company.appendColumns 1 day", appendDay, truncate),
+        ("DateMapper.ordinalIndex",
+         lambda: [dm.ordinalIndex(ordinal) for ordinal in ordinals], None),
+        ("DateMapper.indexOrdinal",
+         lambda: [dm.indexOrdinal(index) for index in indices], None),
+        ("DateMapper.getDateFromIndex",
+         lambda: [dm.getDateFromIndex(index) for index in indices], None),
+        ("calculateHighestAndLowest", graph.calculateHighestAndLowest,
+         clearHighLow),
+        ("evaluateSelection", graph.evaluateSelection, selectAll),
+        ("screenCorrelations",
+         lambda: screenCorrelations(data, screenTarget, *screenWindow), None),
+        ("findSimilarPatterns",
+         lambda: findSimilarPatterns(data, screenTarget, *patternWindow), None),
+        ("StockGraph.draw", graph.draw, render),
+        ("StockGraph.draw cached", graph.draw, selectAll),
+    ]
+
+# Prints results next to the ones of an earlier run
+def printResults(results, previous=None):
+    previousResults = previous["results"] if previous else {}
+    if previous:
+        print(f"Compared with {previous['date']} "
+              f"(commit {previous.get('commit')})")
+    print(f"{'benchmark':<30} {'ms':>10} {'before':>10} {'change':>8}")
+    for name, seconds in results.items():
+        line = f"{name:<30} {seconds * 1000:>10.3f}"
+        before = previousResults.get(name)
+        if before:
+            line += f" {before * 1000:>10.3f} {seconds / before:>7.2f}x"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--years", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks whose name contains this")
+    parser.add_argument("--compare", default=None,
+                        help="result file to compare with (default: the "
+                             "latest run with the same parameters)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    parameters = {"tickers": args.tickers, "years": args.years,
+                  "seed": args.seed, "repeat": args.repeat}
+    app = loadApp()
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        csvPath = os.path.join(tempDir, "synthetic.csv")
+        universe = syntheticUniverse(args.tickers, args.years, args.seed)
+        writeSyntheticCSV(csvPath, universe)
+        parameters["rows"] = sum(len(columns[0])
+                                 for columns in universe.values())
+        print(f"{parameters['rows']} rows of {args.tickers} companies")
+
+        results = {}
+        for name, function, setup in buildBenchmarks(csvPath, app):
+            if args.filter.lower() not in name.lower():
+                continue
+            # The first call fills caches that every later one would use
+            if setup is not None:
+                setup()
+            function()
+            results[name] = bestTime(function, args.repeat, setup=setup)
+
+    app["companySelection"].clear()
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous.get("parameters") != parameters:
+            print("Warning: compared run used", previous.get("parameters"))
+    else:
+        previous = latestResult(parameters)
+    printResults(results, previous)
+
+    if not args.no_save:
+        os.makedirs(resultsDir, exist_ok=True)
+        now = datetime.now()
+        path = os.path.join(resultsDir, now.strftime("%Y%m%d-%H%M%S") + ".json")
+        with open(path, "w") as f:
+            json.dump({"date": now.isoformat(timespec="seconds"),
+                       "commit": gitCommit(),
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "parameters": parameters,
+                       "results": results}, f, indent=1)
+        print("Saved", path)
+
+if __name__ == "__main__":
+    main()
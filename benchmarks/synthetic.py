@@ -0,0 +1,138 @@
+# Synthetic market data for benchmarks
+# Prices follow a geometric random walk, every weekday is a trading day
+# Companies of one universe share a market factor, so their correlations
+# look like real ones, and start trading on different days
+#
+# Writes a csv file in the same layout as the Yahoo Finance exports:
+# python benchmarks/synthetic.py stockdata/synthetic.csv --tickers 50 --years 30
+import os
+import sys
+import csv
+import math
+import random
+import argparse
+from array import array
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stockmodel import Company, businessDayIndex, businessDayOrdinal
+
+# Returns daily log returns of the market, shared by a universe of companies
+def marketReturns(days, seed=0, volatility=0.01):
+    rng = random.Random(seed)
+    return array("d", (rng.gauss(0.0002, volatility) for _ in range(days)))
+
+# Returns the seven Company columns of a random OHLCV history
+# market: daily log returns every close follows with the weight beta
+def syntheticColumns(days, seed=0, startDate=date(1983, 1, 3),
+                     startPrice=20.0, volatility=0.02, market=None, beta=1.0):
+    rng = random.Random(seed)
+    dates = array("q")
+    opens, highs, lows = array("d"), array("d"), array("d")
+    closes, adjustedCloses, volumes = array("d"), array("d"), array("d")
+
+    ordinal = startDate.toordinal()
+    price = startPrice
+    # Volume follows the company's size and jumps on large moves
+    volumeLevel = rng.uniform(12, 18)
+    while len(dates) < days:
+        # Skip weekends
+        if (ordinal + 6) % 7 < 5:
+            change = rng.gauss(0, volatility)
+            if market is not None:
+                change = beta * market[len(dates)] + change / 2
+            open = price * math.exp(rng.gauss(0, volatility / 4))
+            close = open * math.exp(change)
+            high = max(open, close) * (1 + abs(rng.gauss(0, volatility / 2)))
+            low = min(open, close) * (1 - abs(rng.gauss(0, volatility / 2)))
+
+            dates.append(ordinal)
+            opens.append(open)
+            highs.append(high)
+            lows.append(low)
+            closes.append(close)
+            adjustedCloses.append(close)
+            volumes.append(float(int(rng.lognormvariate(
+                volumeLevel + abs(change) / volatility / 4, 0.5))))
+            price = close
+        ordinal += 1
+
+    return [dates, opens, highs, lows, closes, adjustedCloses, volumes]
+
+# Returns {ticker: Company} with count companies of the given length
+def syntheticCompanies(count, years=40, seed=0):
+    days = int(years * 261)
+    companies = {}
+    for idx in range(count):
+        ticker = f"T{idx:04d}"
+        companies[ticker] = Company.fromColumns(
+            ticker, ticker, *syntheticColumns(days, seed=seed * 100003 + idx))
+    return companies
+
+# Returns {ticker: columns} of a universe trading until endDate
+# Histories are between a quarter of years and years long, like companies
+# that went public at different times
+def syntheticUniverse(count, years=40, seed=0, endDate=date(2023, 4, 6)):
+    rng = random.Random(seed)
+    totalDays = int(years * 261)
+    market = marketReturns(totalDays, seed)
+    lastIndex = businessDayIndex(endDate.toordinal())
+
+    universe = {}
+    for idx in range(count):
+        days = rng.randint(max(1, totalDays // 4), totalDays)
+        startDate = date.fromordinal(businessDayOrdinal(lastIndex - days + 1))
+        universe[f"T{idx:04d}"] = syntheticColumns(
+            days, seed=seed * 100003 + idx, startDate=startDate,
+            startPrice=rng.uniform(5, 200),
+            volatility=rng.uniform(0.01, 0.04),
+            market=market[totalDays - days:], beta=rng.uniform(0.3, 1.5))
+    return universe
+
+# Writes a universe in the Yahoo Finance export layout: a row of company
+# names, a row of categories, then one block of categoryLength columns per
+# company side by side, shorter histories leave empty cells at the bottom
+def writeSyntheticCSV(path, universe, categoryLength=8):
+    categories = ["Date", "Open", "High", "Low", "Close", "Adj Close", "Volume"]
+    padding = [""] * (categoryLength - len(categories))
+    empty = [""] * categoryLength
+    tickers = list(universe)
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([cell for ticker in tickers
+                         for cell in ["", "", "", ticker] + empty[4:]])
+        writer.writerow((categories + padding) * len(tickers))
+
+        rowCount = max((len(columns[0]) for columns in universe.values()),
+                       default=0)
+        for rowIdx in range(rowCount):
+            row = []
+            for ticker in tickers:
+                dates, *values, volumes = universe[ticker]
+                if rowIdx >= len(dates):
+                    row += empty
+                    continue
+                row.append(date.fromordinal(dates[rowIdx]).isoformat())
+                row += [f"{column[rowIdx]:.6f}" for column in values]
+                row.append(str(int(volumes[rowIdx])))
+                row += padding
+            writer.writerow(row)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Writes a csv file of synthetic stock histories")
+    parser.add_argument("path")
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--years", type=float, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    universe = syntheticUniverse(args.tickers, args.years, args.seed)
+    writeSyntheticCSV(args.path, universe)
+    print(f"Wrote {sum(len(columns[0]) for columns in universe.values())} "
+          f"rows of {len(universe)} companies to {args.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# Analytics behind the evaluation of a selection
+# Series of several companies are aligned on a shared calendar, missing
+# days are masked out
+import math
+import heapq
+import operator
+import itertools
+from array import array
+
+from stockprofile import profiler
+
+# Dot product of two sequences, done in C
+try:
+    from math import sumprod
+except ImportError:
+    # Python < 3.12
+    def sumprod(p, q):
+        return sum(map(operator.mul, p, q))
+
+# Returns the average of a list
+def average(L):
+    return sum(L) / len(L)
+
+# Returns the average of two numbers
+def midpoint(a, b):
+    return (a + b) / 2
+
+# Returns the standard deviation of a list
+def stdDev(L):
+    # Calculate the average of the list
+    mean = sum(L) / len(L)
+
+    # Calculate sum of squared differences between each element and the average
+    variance = sum((i - mean) ** 2 for i in L) / len(L)
+
+    # Return square root of the variance (aka standard deviation)
+    return math.sqrt(variance)
+
+# Returns the correlation between two lists
+def correlation(L1, L2):
+    #check lists have the same number of elements
+    if len(L1) != len(L2):
+        raise ValueError("Lists are not the same length")
+
+    # no linear relationship exists exists
+    # if correlation coefficient is 0
+    if len(L1) == 0:
+        return 0
+
+    mean1 = sum(L1) / len(L1)
+    mean2 = sum(L2) / len(L2)
+
+    numerator = sum((x - mean1) * (y - mean2) for x, y in zip(L1, L2))
+    denominator = (math.sqrt(sum((x - mean1) ** 2 for x in L1)
+                             * sum((y - mean2) ** 2 for y in L2)))
+
+    if denominator == 0:
+        return 0
+
+    #return the correlation coefficient
+    return numerator / denominator
+
+# A set of series aligned on the same sorted calendar (day ordinals)
+# rows[i][t] is the value of series i on calendar[t], 0.0 when missing
+# masks[i][t] is 1.0 when the value is present, 0.0 otherwise
+class AlignedSeries:
+    def __init__(self, calendar, rows, masks):
+        self.calendar = calendar
+        self.rows = rows
+        self.masks = masks
+
+    # Aligns (dates, values) pairs, dates must be sorted
+    @classmethod
+    def align(cls, series):
+        days = set()
+        for dates, _ in series:
+            days.update(dates)
+        calendar = array("q", sorted(days))
+        position = {day: idx for idx, day in enumerate(calendar)}
+
+        rows = []
+        masks = []
+        for dates, values in series:
+            if len(dates) == len(calendar):
+                # Present on every day, nothing to place
+                rows.append(array("d", values))
+                masks.append(array("d", [1.0]) * len(calendar))
+                continue
+
+            row = array("d", bytes(8 * len(calendar)))
+            mask = array("d", bytes(8 * len(calendar)))
+            for day, value in zip(dates, values):
+                row[position[day]] = value
+                mask[position[day]] = 1.0
+            rows.append(row)
+            masks.append(mask)
+
+        return cls(calendar, rows, masks)
+
+    def byteSize(self):
+        return 8 * len(self.calendar) * (1 + len(self.rows) + len(self.masks))
+
+    # Pearson correlation of every pair of rows (list of lists)
+    # Each pair only uses the days on which both series are present, an
+    # empty overlap or a constant series gives 0 like correlation()
+    def correlationMatrix(self):
+        count = len(self.rows)
+        full = len(self.calendar)
+
+        # Center every row on its own mean, correlation does not change
+        # but the sums below lose far less precision
+        rows = []
+        for row, mask in zip(self.rows, self.masks):
+            present = sum(mask)
+            mean = sum(row) / present if present else 0.0
+            rows.append(array("d", map(operator.mul, mask,
+                                       (value - mean for value in row))))
+        squares = [array("d", map(operator.mul, row, row)) for row in rows]
+        complete = [sum(mask) == full for mask in self.masks]
+        totals = [sum(row) for row in rows]
+        squareTotals = [sum(square) for square in squares]
+
+        matrix = [[1.0] * count for _ in range(count)]
+        for i in range(count):
+            for j in range(i + 1, count):
+                if complete[i] and complete[j]:
+                    n = full
+                    sumX, sumY = totals[i], totals[j]
+                    sumXX, sumYY = squareTotals[i], squareTotals[j]
+                else:
+                    maskX, maskY = self.masks[i], self.masks[j]
+                    n = sumprod(maskX, maskY)
+                    sumX = sumprod(rows[i], maskY)
+                    sumY = sumprod(rows[j], maskX)
+                    sumXX = sumprod(squares[i], maskY)
+                    sumYY = sumprod(squares[j], maskX)
+
+                r = 0.0
+                if n > 0:
+                    # Missing values are 0, so they drop out of the product
+                    covariance = sumprod(rows[i], rows[j]) - sumX * sumY / n
+                    varianceX = sumXX - sumX * sumX / n
+                    varianceY = sumYY - sumY * sumY / n
+                    if varianceX > 0 and varianceY > 0:
+                        r = covariance / math.sqrt(varianceX * varianceY)
+                matrix[i][j] = matrix[j][i] = r
+
+        return matrix
+
+# Pairwise co-moments of aligned series over a window of the calendar
+# Moving the window edges only adds / removes the days that entered or left,
+# so dragging a selection by a few days costs a few updates per pair
+class SlidingCorrelation:
+    def __init__(self, aligned):
+        self.aligned = aligned
+        # Shift every row by its mean, correlation does not change but the
+        # running sums keep their precision
+        self.rows = []
+        for row, mask in zip(aligned.rows, aligned.masks):
+            present = sum(mask)
+            mean = sum(row) / present if present else 0.0
+            self.rows.append(array("d", map(operator.mul, mask,
+                                            (value - mean for value in row))))
+        self.squares = [array("d", map(operator.mul, row, row))
+                        for row in self.rows]
+
+        count = len(self.rows)
+        self.pairs = [(i, j) for i in range(count) for j in range(i + 1, count)]
+        # Window [first, last) of calendar positions
+        self.first = self.last = 0
+        # pair: [n, sum x, sum y, sum xx, sum yy, sum xy]
+        self.sums = {pair: [0.0] * 6 for pair in self.pairs}
+
+    # Moves the window to [first, last), incrementally when that is cheaper
+    def setWindow(self, first, last):
+        # One day updated in Python costs about as much as 32 days of the
+        # C level sums in rebuild
+        changed = abs(first - self.first) + abs(last - self.last)
+        if changed * 32 > last - first:
+            self.rebuild(first, last)
+            return
+
+        oldFirst, oldLast = self.first, self.last
+        for position in range(first, min(oldFirst, last)):
+            self.update(position, 1)
+        for position in range(max(oldLast, first), last):
+            self.update(position, 1)
+        for position in range(oldFirst, min(first, oldLast)):
+            self.update(position, -1)
+        for position in range(max(last, oldFirst), oldLast):
+            self.update(position, -1)
+        self.first, self.last = first, last
+
+    # Adds (sign 1) or removes (sign -1) one calendar day from the sums
+    def update(self, position, sign):
+        present = [idx for idx, mask in enumerate(self.aligned.masks)
+                   if mask[position]]
+        for a, i in enumerate(present):
+            x = self.rows[i][position]
+            for j in present[a + 1:]:
+                y = self.rows[j][position]
+                sums = self.sums[(i, j)]
+                sums[0] += sign
+                sums[1] += sign * x
+                sums[2] += sign * y
+                sums[3] += sign * x * x
+                sums[4] += sign * y * y
+                sums[5] += sign * x * y
+
+    # Recomputes every sum of the window [first, last) from scratch
+    def rebuild(self, first, last):
+        rows = [row[first:last] for row in self.rows]
+        squares = [square[first:last] for square in self.squares]
+        masks = [mask[first:last] for mask in self.aligned.masks]
+        for i, j in self.pairs:
+            self.sums[(i, j)] = [sumprod(masks[i], masks[j]),
+                                 sumprod(rows[i], masks[j]),
+                                 sumprod(rows[j], masks[i]),
+                                 sumprod(squares[i], masks[j]),
+                                 sumprod(squares[j], masks[i]),
+                                 sumprod(rows[i], rows[j])]
+        self.first, self.last = first, last
+
+    # Pearson correlation of every pair over the window (list of lists)
+    def correlationMatrix(self):
+        count = len(self.rows)
+        matrix = [[1.0] * count for _ in range(count)]
+        for (i, j), (n, sumX, sumY, sumXX, sumYY, sumXY) in self.sums.items():
+            r = 0.0
+            if n > 0.5:
+                covariance = sumXY - sumX * sumY / n
+                varianceX = sumXX - sumX * sumX / n
+                varianceY = sumYY - sumY * sumY / n
+                if varianceX > 1e-12 and varianceY > 1e-12:
+                    r = covariance / math.sqrt(varianceX * varianceY)
+                    r = max(-1.0, min(1.0, r))
+            matrix[i][j] = matrix[j][i] = r
+        return matrix
+
+# Running totals of a company's volume and open/close gaps
+# Sums over any row range [first, last) are the difference of two entries
+class PrefixStats:
+    def __init__(self, company):
+        gaps = array("d", map(operator.sub, company.closes, company.opens))
+        self.volumes = array("d", itertools.accumulate(company.volumes,
+                                                       initial=0.0))
+        self.gaps = array("d", itertools.accumulate(gaps, initial=0.0))
+        self.squaredGaps = array("d", itertools.accumulate(
+            map(operator.mul, gaps, gaps), initial=0.0))
+        self.absoluteGaps = array("d", itertools.accumulate(map(abs, gaps),
+                                                            initial=0.0))
+
+    def __len__(self):
+        return len(self.volumes) - 1
+
+    def byteSize(self):
+        return 4 * 8 * len(self.volumes)
+
+    # Adds the totals of rows appended to company since the last call
+    def extend(self, company):
+        start = len(self)
+        gaps = array("d", map(operator.sub, company.closes[start:],
+                              company.opens[start:]))
+        for totals, values in ((self.volumes, company.volumes[start:]),
+                               (self.gaps, gaps),
+                               (self.squaredGaps,
+                                map(operator.mul, gaps, gaps)),
+                               (self.absoluteGaps, map(abs, gaps))):
+            # accumulate starts with the initial total, which is there
+            totals.extend(itertools.islice(
+                itertools.accumulate(values, initial=totals[-1]), 1, None))
+
+    # Returns [average volume, gap standard deviation, average absolute gap]
+    def rangeStats(self, first, last):
+        count = last - first
+        gapMean = (self.gaps[last] - self.gaps[first]) / count
+        gapVariance = ((self.squaredGaps[last] - self.squaredGaps[first])
+                       / count - gapMean * gapMean)
+        return [(self.volumes[last] - self.volumes[first]) / count,
+                math.sqrt(max(0.0, gapVariance)),
+                (self.absoluteGaps[last] - self.absoluteGaps[first]) / count]
+
+# The four per company statistics of a selection:
+# [average price change, average volume, price fluctuation, gap average]
+# None when the company has no data close to both ends of the selection
+def companyStats(company, leftOrdinal, rightOrdinal):
+    first, last = company.dateRange(leftOrdinal, rightOrdinal)
+    # The first row must be at most 4 days after the selection starts and
+    # a row after the selection has to exist
+    if (first >= len(company) or last >= len(company) or first >= last
+        or company.dates[first] - leftOrdinal > 4):
+        return None
+
+    opens = company.opens
+    return ([(opens[last] - opens[first]) / ((last - first) * 7 / 5)]
+            + company.prefixStats().rangeStats(first, last))
+
+# Column names of the companyStats values
+statNames = ["Avg Price Change", "Avg Volume", "Price Fluctuation",
+             "Open Close Gap Average"]
+
+# Average of open and close on every day strictly inside the selection
+# Returns (dates, values)
+def selectionSeries(company, leftOrdinal, rightOrdinal):
+    first, last = company.dateRange(leftOrdinal + 1, rightOrdinal - 1)
+    return (company.dates[first:last],
+            array("d", map(midpoint, company.opens[first:last],
+                           company.closes[first:last])))
+
+# Evaluates a selection of companies ({name: Company}, list of names)
+# between two day ordinals, the same way the graph does
+# Returns (correlation matrix in names order, [companyStats per name])
+def evaluateCompanies(companies, names, leftOrdinal, rightOrdinal):
+    with profiler.stage("align"):
+        series = [selectionSeries(companies[name], leftOrdinal, rightOrdinal)
+                  for name in names]
+        aligned = AlignedSeries.align(series)
+    # All pairs at once, each pair uses the days both companies traded
+    with profiler.stage("correlation"):
+        matrix = aligned.correlationMatrix()
+    with profiler.stage("stats"):
+        stats = [companyStats(companies[name], leftOrdinal, rightOrdinal)
+                 for name in names]
+    return matrix, stats
+
+# Daily returns (close / previous close) of a close column
+def dailyReturns(closes):
+    return array("d", map(operator.truediv, closes[1:], closes[:-1]))
+
+# Correlation of the daily returns of one company (target) with every
+# other company of a universe over a window, e.g. which of all the
+# companies moved most like TSLA in 2020
+# Companies that traded on the same days as the target (the usual case)
+# cost three C level sums each, others are aligned on the shared days
+# The universe is screened in blocks (see step) so the graph stays
+# responsive while thousands of companies are read
+class CorrelationScreen:
+    # names: companies to screen, defaults to every company
+    # Companies sharing fewer than minShare of the target's days (or
+    # minDays) are skipped
+    def __init__(self, companies, target, leftOrdinal, rightOrdinal,
+                 names=None, minShare=0.5, minDays=20):
+        self.companies = companies
+        self.target = target
+        self.leftOrdinal = leftOrdinal
+        self.rightOrdinal = rightOrdinal
+        self.names = [name for name in (companies if names is None else names)
+                      if name != target]
+        # Next name to screen
+        self.position = 0
+        # [(correlation, name, shared days)]
+        self.results = []
+
+        company = companies[target]
+        first, last = company.dateRange(leftOrdinal, rightOrdinal)
+        self.dates = company.dates[first:last]
+        self.closes = company.closes[first:last]
+        self.dayIndex = {day: idx for idx, day in enumerate(self.dates)}
+
+        try:
+            returns = dailyReturns(self.closes)
+        except ZeroDivisionError:
+            returns = array("d")
+        self.minDays = max(minDays, int(len(returns) * minShare))
+        mean = sum(returns) / len(returns) if returns else 0.0
+        # Centered, so the mean of the other company drops out of sum(x * y)
+        self.centered = array("d", map(operator.sub, returns,
+                                       itertools.repeat(mean)))
+        self.sumXX = sumprod(self.centered, self.centered)
+        if len(returns) < self.minDays or self.sumXX <= 0:
+            # Too short or constant, nothing correlates with it
+            self.names = []
+
+    def done(self):
+        return self.position >= len(self.names)
+
+    # Screens the next blockSize companies, returns True when all are done
+    def step(self, blockSize=256):
+        block = self.names[self.position : self.position + blockSize]
+        self.position += len(block)
+        with profiler.stage("screen"):
+            for name in block:
+                result = self.correlate(self.companies[name])
+                if result is not None:
+                    self.results.append((result[0], name, result[1]))
+        return self.done()
+
+    # Returns (correlation, shared days) of a company with the target, None
+    # if they share too few days
+    def correlate(self, company):
+        first, last = company.dateRange(self.leftOrdinal, self.rightOrdinal)
+        dates = company.dates[first:last]
+        closes = company.closes[first:last]
+        try:
+            if dates == self.dates:
+                x, sumXX = self.centered, self.sumXX
+                y = dailyReturns(closes)
+            else:
+                positions = list(map(self.dayIndex.get, dates))
+                shared = [position is not None for position in positions]
+                if sum(shared) <= self.minDays:
+                    return None
+                x = dailyReturns([self.closes[position] for position in
+                                  itertools.compress(positions, shared)])
+                x = array("d", map(operator.sub, x,
+                                   itertools.repeat(sum(x) / len(x))))
+                sumXX = sumprod(x, x)
+                y = dailyReturns(list(itertools.compress(closes, shared)))
+        except ZeroDivisionError:
+            return None
+
+        n = len(y)
+        if n < self.minDays:
+            return None
+        sumY = sum(y)
+        varianceY = sumprod(y, y) - sumY * sumY / n
+        if sumXX <= 0 or varianceY <= 1e-12 * n:
+            return None
+        r = sumprod(x, y) / math.sqrt(sumXX * varianceY)
+        return max(-1.0, min(1.0, r)), n
+
+    # [(name, correlation, shared days)] of the count most correlated
+    # companies so far, key orders them (e.g. abs for the strongest either way)
+    def top(self, count=10, key=None):
+        best = heapq.nlargest(count, self.results, key=lambda result: (
+            key(result[0]) if key else result[0]))
+        return [(name, r, days) for r, name, days in best]
+
+# Screens every company (or names) against target over a window
+# Returns [(name, correlation, shared days)] of the count most correlated
+def screenCorrelations(companies, target, leftOrdinal, rightOrdinal,
+                       count=10, names=None, key=None):
+    screen = CorrelationScreen(companies, target, leftOrdinal, rightOrdinal,
+                               names)
+    while not screen.step():
+        pass
+    return screen.top(count, key)
@@ -0,0 +1,327 @@
+# Headless batch evaluation of the stock data, cmu_graphics is not needed
+# Every (ticker group, date window) job is evaluated like a selection in
+# the graph: correlation matrix of the daily open/close averages and the
+# four per company stats
+#
+# e.g.
+# python stockbatch.py --tickers AAPL MSFT TSLA --window 2015-01-01:2016-01-01
+# python stockbatch.py --all --rolling 365 --step 30 --format json
+# python stockbatch.py --all --window 2020-01-01:2021-01-01 --pairs 50
+# python stockbatch.py --screen TSLA --window 2020-01-01:2021-01-01 --top 20
+import os
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from stockcache import loadCachedDirectory
+from stockloader import formatName
+from stockanalytics import evaluateCompanies, statNames, screenCorrelations
+from stockmatrix import SymmetricMatrix
+
+# Companies, ticker groups and screen (target, count) of a worker process,
+# set by initWorker
+workerData = {}
+workerGroups = []
+workerScreen = []
+
+# Worker initializer, every worker maps the (already written) binary cache
+# so only the group index and the window are sent with each job
+# screen: (target, count) of --screen, every company is kept then
+def initWorker(dirName, categoryLength, groups, screen=None):
+    data = loadCachedDirectory(dirName, categoryLength, workers=1)
+    workerGroups[:] = groups
+    workerScreen[:] = screen or ()
+    workerData.clear()
+    if screen:
+        workerData.update(data)
+    else:
+        workerData.update({name: data[name] for group in groups
+                           for name in group})
+
+# Worker: evaluates one job
+# Returns (correlation SymmetricMatrix, [companyStats per ticker of the
+# group]), the packed matrix is half the size to send back
+def evaluateJob(groupIdx, leftOrdinal, rightOrdinal):
+    tickers = workerGroups[groupIdx]
+    matrix, stats = evaluateCompanies(workerData, tickers, leftOrdinal,
+                                      rightOrdinal)
+    return SymmetricMatrix.fromMatrix(tickers, matrix), stats
+
+# Worker: screens every company against the target over one window
+# Returns [(name, correlation, days)], the best first
+def screenJob(groupIdx, leftOrdinal, rightOrdinal):
+    target, count = workerScreen
+    return screenCorrelations(workerData, target, leftOrdinal, rightOrdinal,
+                              count)
+
+# Converts "YYYY-MM-DD" to a day ordinal
+def parseDate(text):
+    try:
+        return date.fromisoformat(text.strip()).toordinal()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {text!r}")
+
+# Converts "YYYY-MM-DD:YYYY-MM-DD" to (left ordinal, right ordinal)
+def parseWindow(text):
+    left, sep, right = text.partition(":")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"invalid window: {text!r}")
+    leftOrdinal, rightOrdinal = parseDate(left), parseDate(right)
+    if rightOrdinal <= leftOrdinal:
+        raise argparse.ArgumentTypeError(f"empty window: {text!r}")
+    return leftOrdinal, rightOrdinal
+
+# Returns the non empty, non comment lines of a text file
+def readLines(path):
+    with open(path) as f:
+        return [line.strip() for line in f
+                if line.strip() and not line.startswith("#")]
+
+# Returns windows of length days, every step days between two ordinals
+def rollingWindows(start, end, length, step):
+    return [(left, left + length) for left in range(start, end - length + 1,
+                                                    step)]
+
+def windowName(window):
+    left, right = window
+    return (f"{date.fromordinal(left).isoformat()}_"
+            f"{date.fromordinal(right).isoformat()}")
+
+# Writes the results of one job as two csv files, and the most correlated
+# pairs as a third one if pairs is given
+def writeCSVResult(outDir, prefix, tickers, matrix, stats, pairs=None):
+    with open(os.path.join(outDir, prefix + "correlation.csv"), "w",
+              newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([""] + tickers)
+        for ticker, row in zip(tickers, matrix.toLists()):
+            writer.writerow([ticker] + row)
+
+    if pairs is not None:
+        with open(os.path.join(outDir, prefix + "pairs.csv"), "w",
+                  newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ticker1", "ticker2", "correlation"])
+            writer.writerows(pairs)
+
+    with open(os.path.join(outDir, prefix + "stats.csv"), "w",
+              newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ticker"] + [formatName(name) for name in statNames])
+        for ticker, values in zip(tickers, stats):
+            # Companies without data around the window get empty cells
+            writer.writerow([ticker] + (values or [""] * len(statNames)))
+
+# Writes the screens of target (screenJob results in windows order), one
+# csv file per window or one json file
+def writeScreens(target, windows, screens, outDir, format):
+    results = []
+    for window, top in zip(windows, screens):
+        if format == "json":
+            results.append({"start": date.fromordinal(window[0]).isoformat(),
+                            "end": date.fromordinal(window[1]).isoformat(),
+                            "target": target,
+                            "top": [{"ticker": name, "correlation": r,
+                                     "days": days}
+                                    for name, r, days in top]})
+            continue
+        with open(os.path.join(outDir, f"screen_{target}_"
+                               f"{windowName(window)}.csv"), "w",
+                  newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ticker", "correlation", "days"])
+            writer.writerows(top)
+
+    if format == "json":
+        with open(os.path.join(outDir, "screen.json"), "w") as f:
+            json.dump(results, f, indent=1)
+
+# Returns one job's results as a JSON compatible dict
+def jsonResult(window, tickers, matrix, stats, pairs=None):
+    result = {"start": date.fromordinal(window[0]).isoformat(),
+              "end": date.fromordinal(window[1]).isoformat(),
+              "tickers": tickers,
+              "correlation": matrix.toLists(),
+              "stats": {ticker: (dict(zip(map(formatName, statNames), values))
+                                 if values is not None else None)
+                        for ticker, values in zip(tickers, stats)}}
+    if pairs is not None:
+        result["pairs"] = [{"tickers": [name1, name2], "correlation": r}
+                           for name1, name2, r in pairs]
+    return result
+
+# Returns the count pairs of a job with the largest absolute correlation,
+# [(ticker1, ticker2, correlation)], None without --pairs
+def topPairs(matrix, count):
+    if count is None:
+        return None
+    return matrix.topPairs(count, key=abs)
+
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluates ticker groups over date windows without the "
+                    "graphical interface")
+    parser.add_argument("--data", default="stockdata",
+                        help="directory of the csv files (default: stockdata)")
+    parser.add_argument("--category-length", type=int, default=8,
+                        help="columns per company in the csv files")
+
+    tickers = parser.add_mutually_exclusive_group(required=True)
+    tickers.add_argument("--tickers", nargs="+", metavar="TICKER",
+                         help="one group of tickers")
+    tickers.add_argument("--tickers-file", metavar="PATH",
+                         help="one group of tickers per line, separated by "
+                              "spaces or commas")
+    tickers.add_argument("--all", action="store_true",
+                         help="every company as one group")
+    tickers.add_argument("--screen", metavar="TICKER",
+                         help="rank every company by correlation with TICKER "
+                              "instead")
+    parser.add_argument("--top", type=int, default=20, metavar="N",
+                        help="companies listed per window by --screen "
+                             "(default: 20)")
+    parser.add_argument("--pairs", type=int, metavar="N",
+                        help="also list the N most correlated pairs (by "
+                             "absolute correlation) of every job")
+
+    parser.add_argument("--window", type=parseWindow, action="append",
+                        default=[], metavar="START:END",
+                        help="date window, may be repeated")
+    parser.add_argument("--windows-file", metavar="PATH",
+                        help="one START:END window per line")
+    parser.add_argument("--rolling", type=int, metavar="DAYS",
+                        help="windows of DAYS calendar days between --start "
+                             "and --end")
+    parser.add_argument("--step", type=int, default=None, metavar="DAYS",
+                        help="distance between rolling windows "
+                             "(default: --rolling)")
+    parser.add_argument("--start", type=parseDate,
+                        help="start of the rolling windows "
+                             "(default: first day of data)")
+    parser.add_argument("--end", type=parseDate,
+                        help="end of the rolling windows "
+                             "(default: last day of data)")
+
+    parser.add_argument("--out", default="results",
+                        help="output directory (default: results)")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: cpu count)")
+    return parser, parser.parse_args(argv)
+
+def main(argv=None):
+    parser, args = parseArguments(argv)
+
+    loadStats = {}
+    totalData = loadCachedDirectory(args.data, args.category_length,
+                                    stats=loadStats)
+    print(f"Loaded {loadStats['rows']} rows of {len(totalData)} companies in "
+          f"{loadStats['seconds']:.2f}s ({loadStats['cachedFiles']} cached, "
+          f"{loadStats['parsedFiles']} parsed files)")
+
+    if args.all:
+        groups = [list(totalData)]
+    elif args.screen:
+        groups = [[args.screen]]
+    elif args.tickers_file:
+        groups = [line.replace(",", " ").split()
+                  for line in readLines(args.tickers_file)]
+    else:
+        groups = [args.tickers]
+    unknown = sorted({name for group in groups for name in group
+                      if name not in totalData})
+    if unknown:
+        parser.error("unknown tickers: " + ", ".join(unknown))
+
+    windows = list(args.window)
+    if args.windows_file:
+        try:
+            windows += [parseWindow(line)
+                        for line in readLines(args.windows_file)]
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+    if args.rolling:
+        used = [totalData[name] for group in groups for name in group
+                if len(totalData[name])]
+        start = args.start or min(company.dates[0] for company in used)
+        end = args.end or max(company.dates[-1] for company in used)
+        windows += rollingWindows(start, end, args.rolling,
+                                  args.step or args.rolling)
+    if not windows:
+        parser.error("no windows given (--window, --windows-file or "
+                     "--rolling)")
+
+    jobs = [(groupIdx, left, right) for groupIdx in range(len(groups))
+            for left, right in windows]
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(jobs)))
+    screen = (args.screen, args.top) if args.screen else None
+    jobFunction = screenJob if screen else evaluateJob
+
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                                   initargs=(args.data, args.category_length,
+                                             groups, screen))
+        results = pool.map(jobFunction, *zip(*jobs),
+                           chunksize=max(1, len(jobs) // (workers * 8)))
+    else:
+        pool = None
+        workerGroups[:] = groups
+        workerScreen[:] = screen or ()
+        workerData.update(totalData)
+        results = (jobFunction(*job) for job in jobs)
+
+    if screen:
+        try:
+            writeScreens(args.screen, windows, results, args.out, args.format)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        print(f"Screened {len(totalData)} companies against {args.screen} "
+              f"over {len(windows)} windows with {workers} workers in "
+              f"{time.perf_counter() - start:.2f}s")
+        print("Results written to", args.out)
+        return
+
+    # Results are written as they arrive, in job order
+    pairs = 0
+    jsonFile = None
+    if args.format == "json":
+        jsonFile = open(os.path.join(args.out, "evaluation.json"), "w")
+        jsonFile.write("[\n")
+    try:
+        for jobIdx, ((groupIdx, left, right), (matrix, stats)) in enumerate(
+                zip(jobs, results)):
+            tickers = groups[groupIdx]
+            pairs += len(tickers) * (len(tickers) - 1) // 2
+            if jsonFile is not None:
+                if jobIdx:
+                    jsonFile.write(",\n")
+                json.dump(jsonResult((left, right), tickers, matrix, stats,
+                                     topPairs(matrix, args.pairs)),
+                          jsonFile)
+            else:
+                prefix = windowName((left, right)) + "_"
+                if len(groups) > 1:
+                    prefix = f"group{groupIdx}_" + prefix
+                writeCSVResult(args.out, prefix, tickers, matrix, stats,
+                               topPairs(matrix, args.pairs))
+    finally:
+        if jsonFile is not None:
+            jsonFile.write("\n]\n")
+            jsonFile.close()
+        if pool is not None:
+            pool.shutdown()
+
+    seconds = max(time.perf_counter() - start, 1e-9)
+    print(f"Evaluated {len(jobs)} jobs ({len(groups)} groups x "
+          f"{len(windows)} windows) with {workers} workers in {seconds:.2f}s")
+    print(f"{len(jobs) / seconds:.1f} jobs/s, {pairs / seconds:.0f} pairs/s")
+    print("Results written to", args.out)
+
+if __name__ == "__main__":
+    main()
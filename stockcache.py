@@ -0,0 +1,173 @@
+# On-disk binary cache of parsed stock data
+# Every csv file gets one binary file holding the raw columns of its
+# companies, plus an entry in manifest.json describing where they are
+# Columns are memory mapped on the next start instead of parsing the csv
+import os
+import sys
+import json
+import mmap
+import time
+import hashlib
+
+from stockmodel import Company
+from stockloader import fileNamesInDir, loadStockFiles, fillStats
+
+# Bump when the binary layout changes, old caches are then ignored
+cacheVersion = 1
+
+# Type codes of the Company columns, in Company.columns order
+columnTypes = ("q", "d", "d", "d", "d", "d", "d")
+
+# Returns the hex digest of a file's content
+def fileHash(path, blockSize=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Reads the manifest, an empty one is returned if it is missing or outdated
+def readManifest(cacheDir):
+    try:
+        with open(os.path.join(cacheDir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if (manifest.get("version") != cacheVersion
+        or manifest.get("byteorder") != sys.byteorder):
+        return {}
+
+    return manifest.get("files", {})
+
+# Writes the manifest atomically, so a crash never leaves half a file
+def writeManifest(cacheDir, files):
+    path = os.path.join(cacheDir, "manifest.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"version": cacheVersion, "byteorder": sys.byteorder,
+                   "files": files}, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+# Returns the manifest entry of path if the cache for it is still valid
+# Size and mtime are checked first, the content hash only when they differ
+# (e.g. the file was touched or copied but not changed)
+def validEntry(entry, path, size, mtime):
+    if entry is None or entry["size"] != size:
+        return None
+    if entry["mtime"] != mtime and entry["hash"] != fileHash(path):
+        return None
+    return entry
+
+# Writes the columns of companies (already verified) to one binary file
+# Returns the manifest entry
+def writeCacheFile(cacheDir, path, size, mtime, companies):
+    contentHash = fileHash(path)
+    dataName = contentHash + ".bin"
+    entries = []
+    offset = 0
+    with open(os.path.join(cacheDir, dataName + ".tmp"), "wb") as f:
+        for name, company in companies.items():
+            entries.append({"name": name, "rows": len(company),
+                            "offset": offset})
+            for column in company.columns:
+                f.write(column.tobytes())
+            offset += len(company) * 8 * len(columnTypes)
+    os.replace(os.path.join(cacheDir, dataName + ".tmp"),
+               os.path.join(cacheDir, dataName))
+    return {"size": size, "mtime": mtime, "hash": contentHash,
+            "data": dataName, "companies": entries}
+
+# Maps a binary file and returns {company name: Company}
+# Columns are memoryviews of the mapping, nothing is copied
+# If names is given, only those companies are returned
+def mapCacheFile(cacheDir, entry, names=None):
+    with open(os.path.join(cacheDir, entry["data"]), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            buffer = memoryview(b"")
+        else:
+            buffer = memoryview(mmap.mmap(f.fileno(), 0,
+                                          access=mmap.ACCESS_READ))
+
+    companies = {}
+    for company in entry["companies"]:
+        if names is not None and company["name"] not in names:
+            continue
+        rows = company["rows"]
+        offset = company["offset"]
+        columns = []
+        for typecode in columnTypes:
+            columns.append(buffer[offset : offset + rows * 8].cast(typecode))
+            offset += rows * 8
+        name = company["name"]
+        # The data was verified before it was written
+        companies[name] = Company.fromColumns(name, name, *columns,
+                                              verify=False)
+    return companies
+
+# Deletes binary files that no manifest entry points to
+def removeStaleFiles(cacheDir, files):
+    used = {entry["data"] for entry in files.values()}
+    for fileName in os.listdir(cacheDir):
+        if fileName.endswith(".bin") and fileName not in used:
+            try:
+                os.remove(os.path.join(cacheDir, fileName))
+            except OSError:
+                # Still mapped somewhere (Windows), try again next time
+                pass
+
+# Loads every csv file of a directory, using the cache where possible
+# Only new or changed files are parsed (see loadStockFiles)
+# If stats (dict) is given, it is filled with "files", "cachedFiles",
+# "parsedFiles", "workers", "rows", "seconds" and "rowsPerSecond"
+def loadCachedDirectory(dirName, categoryLength=8, cacheDir=None,
+                        workers=None, stats=None):
+    start = time.perf_counter()
+    cacheDir = cacheDir or os.path.join(dirName, ".cache")
+    os.makedirs(cacheDir, exist_ok=True)
+
+    manifest = readManifest(cacheDir)
+    files = {}
+    fileData = {}
+    changed = []
+    touched = False
+    for fileName in sorted(fileNamesInDir(dirName)):
+        path = os.path.join(dirName, fileName)
+        info = os.stat(path)
+        entry = validEntry(manifest.get(fileName), path, info.st_size,
+                           info.st_mtime_ns)
+        if entry is None:
+            changed.append((fileName, path, info))
+            continue
+        if entry["mtime"] != info.st_mtime_ns:
+            entry["mtime"] = info.st_mtime_ns
+            touched = True
+        files[fileName] = entry
+        fileData[path] = mapCacheFile(cacheDir, entry)
+
+    loadStats = {}
+    parsed = loadStockFiles([path for _, path, _ in changed], categoryLength,
+                            workers, stats=loadStats)
+    for fileName, path, info in changed:
+        files[fileName] = writeCacheFile(cacheDir, path, info.st_size,
+                                         info.st_mtime_ns, parsed[path])
+        fileData[path] = parsed[path]
+
+    # A warm cache is left alone, so several processes can load it at once
+    if changed or touched or files.keys() != manifest.keys():
+        writeManifest(cacheDir, files)
+        removeStaleFiles(cacheDir, files)
+
+    # Later files replace companies of earlier ones, like dict.update
+    totalData = {}
+    for fileName in sorted(files):
+        totalData.update(fileData[os.path.join(dirName, fileName)])
+
+    if stats is not None:
+        stats["files"] = len(files)
+        stats["cachedFiles"] = len(files) - len(changed)
+        stats["parsedFiles"] = len(changed)
+        stats["workers"] = loadStats.get("workers", 0)
+        fillStats(stats, sum(len(company) for company in totalData.values()),
+                  time.perf_counter() - start)
+
+    return totalData
@@ -0,0 +1,137 @@
+# One process wide cache of the series derived from the data: indicators
+# (moving averages), zoomed out bars, running totals and aligned selections
+# It holds at most budget bytes, entries that are cheap to compute again
+# for the memory they use go first, otherwise the least recently used ones
+# (GreedyDual-Size)
+# Entries of a company are keyed by its cacheId and dropped together with
+# it, the cache never keeps a company alive
+# Entries of several companies (e.g. an aligned selection) belong to all
+# of them and are dropped with the first one
+# Values provide byteSize(), values that grow call resize afterwards
+import time
+import threading
+
+from stockprofile import profiler
+
+# Default budget in bytes
+derivedCacheBudget = 256 * 1024 * 1024
+
+class DerivedCache:
+    def __init__(self, budget=derivedCacheBudget):
+        self.budget = budget
+        # key: [value, bytes, seconds to compute, priority, owners]
+        self.entries = {}
+        # owner: set of keys
+        self.owners = {}
+        self.usedBytes = 0
+        # Priority of the last evicted entry, every entry used later starts
+        # above it, so entries nobody uses age
+        self.inflation = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Shared by the drawing, raster and loading threads
+        self.lock = threading.RLock()
+
+    # Returns the value of key, calculated with compute() if it is missing
+    # owners: the entry is dropped with dropOwner(owner) of any of them
+    def get(self, key, compute, *owners):
+        with self.lock:
+            entry = self.entries.get(key)
+            profiler.countCache("derived cache", entry is not None)
+            if entry is not None:
+                self.hits += 1
+                entry[3] = self.priority(entry[1], entry[2])
+                return entry[0]
+            self.misses += 1
+
+        start = time.perf_counter()
+        value = compute()
+        seconds = time.perf_counter() - start
+
+        with self.lock:
+            # Calculated by another thread meanwhile
+            entry = self.entries.get(key)
+            if entry is not None:
+                return entry[0]
+            size = value.byteSize()
+            owners = tuple(dict.fromkeys(owners)) or (None,)
+            self.entries[key] = [value, size, seconds,
+                                 self.priority(size, seconds), owners]
+            for owner in owners:
+                self.owners.setdefault(owner, set()).add(key)
+            self.usedBytes += size
+            self.evict(key)
+        return value
+
+    # Higher priorities are kept longer
+    def priority(self, size, seconds):
+        return self.inflation + seconds / max(1, size)
+
+    # Updates the size of an entry whose value grew
+    def resize(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            size = entry[0].byteSize()
+            self.usedBytes += size - entry[1]
+            entry[1] = size
+            self.evict(key)
+
+    # Evicts entries until the budget is kept, the entry of keep stays
+    def evict(self, keep=None):
+        while self.usedBytes > self.budget and len(self.entries) > 1:
+            victim = min((key for key in self.entries if key != keep),
+                         key=lambda key: self.entries[key][3])
+            self.inflation = self.entries[victim][3]
+            self.remove(victim)
+            self.evictions += 1
+
+    def remove(self, key):
+        value, size, _, _, owners = self.entries.pop(key)
+        self.usedBytes -= size
+        for owner in owners:
+            keys = self.owners[owner]
+            keys.discard(key)
+            if not keys:
+                del self.owners[owner]
+
+    # Drops the entry of key if it is cached
+    def discard(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+    # Returns [(key, value)] of the entries of owner
+    def ownedItems(self, owner):
+        with self.lock:
+            return [(key, self.entries[key][0])
+                    for key in self.owners.get(owner, ())]
+
+    # Drops every entry of owner (e.g. a company that was garbage collected)
+    def dropOwner(self, owner):
+        with self.lock:
+            for key in list(self.owners.get(owner, ())):
+                self.remove(key)
+
+    # Drops every entry and starts the counters again
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.owners.clear()
+            self.usedBytes = 0
+            self.inflation = 0.0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    # Returns the counters and the memory use
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.usedBytes,
+                    "budget": self.budget, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+# Shared by everything in the process
+derivedCache = DerivedCache()
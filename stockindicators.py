@@ -0,0 +1,235 @@
+# Technical indicators of a price column
+# Each one is calculated in a single pass over the column, the loops run
+# inside map and itertools.accumulate wherever the indicator allows it
+# Indicators keep the state of their pass, rows appended later only
+# continue it (see Company.appendColumns)
+# Days before an indicator has enough data are nan and are not drawn
+import math
+import operator
+import itertools
+from array import array
+
+nan = float("nan")
+
+# Returns an array of count nans
+def nans(count):
+    return array("d", [nan]) * max(0, count)
+
+# Returns the sums of the width values ending at each of values[start:],
+# nan while fewer than width values exist
+def windowSums(values, start, width):
+    # Running totals only need to start width values before start
+    base = max(0, start - width + 1)
+    # A list is faster to build and slice than an array here
+    totals = list(itertools.accumulate(values[base:], initial=0.0))
+    warmUp = max(0, min(len(values), width - 1) - start)
+    sums = nans(warmUp)
+    end = start + warmUp + 1 - base
+    sums.extend(map(operator.sub, totals[end:], totals[end - width:]))
+    return sums
+
+# Extends ema with the exponential moving average of values
+# Values before offset are not used (e.g. nans of another indicator), the
+# first average is the mean of the first width values
+def extendEMA(ema, values, width, offset=0):
+    start = len(ema)
+    seedIdx = offset + width - 1
+    if start <= seedIdx:
+        if len(values) <= seedIdx:
+            ema.extend(nans(len(values) - start))
+            return
+        ema.extend(nans(seedIdx - start))
+        ema.append(math.fsum(values[offset : seedIdx + 1]) / width)
+        start = seedIdx + 1
+
+    alpha = 2 / (width + 1)
+    ema.extend(itertools.islice(itertools.accumulate(
+        values[start:], lambda previous, value:
+        previous + alpha * (value - previous), initial=ema[-1]), 1, None))
+
+# Base of the indicators, each one has extend(values), which calculates
+# the values of values[len(self):]
+class Indicator:
+    # Names of the lines, each one an array("d") as long as the column
+    lineNames = ()
+    # Drawn over the prices, otherwise in a band of its own
+    onPrice = True
+    # (lowest, highest) value of the band, None to fit the visible values
+    bounds = None
+
+    def __init__(self):
+        self.lines = {name: array("d") for name in self.lineNames}
+
+    def __len__(self):
+        return len(self.lines[self.lineNames[0]])
+
+    def byteSize(self):
+        return sum(len(line) * line.itemsize for line in self.lines.values())
+
+# Simple moving average of the last width values
+class SMA(Indicator):
+    lineNames = ("sma",)
+
+    def __init__(self, width):
+        super().__init__()
+        self.width = width
+
+    def extend(self, values):
+        self.lines["sma"].extend(map((1 / self.width).__mul__,
+                                     windowSums(values, len(self), self.width)))
+
+# Exponential moving average, weights fall by 2 / (width + 1) per day
+class EMA(Indicator):
+    lineNames = ("ema",)
+
+    def __init__(self, width):
+        super().__init__()
+        self.width = width
+
+    def extend(self, values):
+        extendEMA(self.lines["ema"], values, self.width)
+
+# Weighted moving average, the newest value has weight width, the oldest 1
+class WMA(Indicator):
+    lineNames = ("wma",)
+
+    def __init__(self, width):
+        super().__init__()
+        self.width = width
+
+    def extend(self, values):
+        width = self.width
+        start = len(self)
+        # Row indices count from base, which keeps the weighted sums small
+        base = max(0, start - width + 1)
+        segment = values[base:]
+        sums = windowSums(segment, start - base, width)
+        indexSums = windowSums(array("d", map(operator.mul, segment,
+                                              range(len(segment)))),
+                               start - base, width)
+        # Weight of row k at day i is k - (i - width)
+        shifts = range(start - width - base, len(values) - width - base)
+        self.lines["wma"].extend(map(
+            operator.truediv,
+            map(operator.sub, indexSums, map(operator.mul, sums, shifts)),
+            itertools.repeat(width * (width + 1) / 2)))
+
+# Moving average with bands deviations standard deviations above and below
+class Bollinger(Indicator):
+    lineNames = ("middle", "upper", "lower")
+
+    def __init__(self, width, deviations=2):
+        super().__init__()
+        self.width = width
+        self.deviations = deviations
+
+    def extend(self, values):
+        width = self.width
+        start = len(self)
+        base = max(0, start - width + 1)
+        segment = values[base:]
+        means = array("d", map(operator.truediv,
+                               windowSums(segment, start - base, width),
+                               itertools.repeat(width)))
+        squareMeans = map(operator.truediv,
+                          windowSums(array("d", map(operator.mul, segment,
+                                                    segment)),
+                                     start - base, width),
+                          itertools.repeat(width))
+        # Rounding can make a tiny variance negative
+        spreads = array("d", map(
+            operator.mul, map(math.sqrt, map(max, map(
+                operator.sub, squareMeans, map(operator.mul, means, means)),
+                itertools.repeat(0.0))),
+            itertools.repeat(self.deviations)))
+
+        self.lines["middle"].extend(means)
+        self.lines["upper"].extend(map(operator.add, means, spreads))
+        self.lines["lower"].extend(map(operator.sub, means, spreads))
+
+# Relative strength index with Wilder's smoothing, between 0 and 100
+class RSI(Indicator):
+    lineNames = ("rsi",)
+    onPrice = False
+    bounds = (0, 100)
+
+    def __init__(self, width=14):
+        super().__init__()
+        self.width = width
+        # Smoothed gain and loss of the last day
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def extend(self, values):
+        width = self.width
+        rsi = self.lines["rsi"]
+        start = len(rsi)
+        if len(values) <= width:
+            rsi.extend(nans(len(values) - start))
+            return
+
+        if start <= width:
+            # The first averages are plain means of the first width changes
+            rsi.extend(nans(width - start))
+            changes = list(map(operator.sub, values[1 : width + 1],
+                               values[:width]))
+            self.gain = math.fsum(change for change in changes
+                                  if change > 0) / width
+            self.loss = -math.fsum(change for change in changes
+                                   if change < 0) / width
+            rsi.append(rsiValue(self.gain, self.loss))
+            start = width + 1
+
+        changes = array("d", map(operator.sub, values[start:],
+                                 values[start - 1 : -1]))
+        smooth = lambda previous, value: previous + (value - previous) / width
+        gains = array("d", itertools.accumulate(
+            map(max, changes, itertools.repeat(0.0)), smooth,
+            initial=self.gain))
+        losses = array("d", itertools.accumulate(
+            map(max, map(operator.neg, changes), itertools.repeat(0.0)),
+            smooth, initial=self.loss))
+        rsi.extend(map(rsiValue, gains[1:], losses[1:]))
+        self.gain = gains[-1]
+        self.loss = losses[-1]
+
+def rsiValue(gain, loss):
+    if loss == 0:
+        return 100.0
+    return 100 - 100 / (1 + gain / loss)
+
+# Moving average convergence divergence: fast minus slow EMA, its signal
+# EMA and the difference of the two
+class MACD(Indicator):
+    lineNames = ("macd", "signal", "histogram")
+    onPrice = False
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        super().__init__()
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self.fastEMA = array("d")
+        self.slowEMA = array("d")
+
+    def byteSize(self):
+        return super().byteSize() + 8 * (len(self.fastEMA)
+                                         + len(self.slowEMA))
+
+    def extend(self, values):
+        start = len(self)
+        extendEMA(self.fastEMA, values, self.fast)
+        extendEMA(self.slowEMA, values, self.slow)
+        macd = self.lines["macd"]
+        macd.extend(map(operator.sub, self.fastEMA[start:],
+                        self.slowEMA[start:]))
+        # The macd line starts once the slower average does
+        signal = self.lines["signal"]
+        extendEMA(signal, macd, self.signal,
+                  max(self.fast, self.slow) - 1)
+        self.lines["histogram"].extend(map(operator.sub, macd[start:],
+                                           signal[start:]))
+
+# Indicator classes by the kind used in Company.indicator
+indicatorTypes = {"sma": SMA, "ema": EMA, "wma": WMA, "bollinger": Bollinger,
+                  "rsi": RSI, "macd": MACD}
@@ -0,0 +1,114 @@
+# Lazy, on-demand loading of companies
+# Only the csv headers are read at startup, a company's rows are loaded
+# the first time it is accessed and dropped again under a memory cap
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from stockmodel import Company
+from stockloader import fileNamesInDir, readCSVHeader, readCompanyColumns
+from stockcache import readManifest, validEntry, mapCacheFile
+
+# Returns the number of bytes used by the columns of a company
+def companyBytes(company):
+    return sum(len(column) * column.itemsize for column in company.columns)
+
+# Behaves like the {name: Company} dict returned by the other loaders
+class LazyCompanies(Mapping):
+    # pinned: container of names that must never be evicted
+    # (e.g. the current company selection)
+    def __init__(self, dirName, categoryLength=8, cacheDir=None,
+                 memoryLimit=512 * 1024 * 1024, pinned=()):
+        self.categoryLength = categoryLength
+        self.cacheDir = cacheDir or os.path.join(dirName, ".cache")
+        self.memoryLimit = memoryLimit
+        self.pinned = pinned
+
+        # name: (path, company index inside the file, first data byte)
+        # Later files replace companies of earlier ones, like dict.update
+        self.index = {}
+        # path: manifest entry, for files whose binary cache is still valid
+        self.cacheEntries = {}
+
+        manifest = readManifest(self.cacheDir)
+        for fileName in sorted(fileNamesInDir(dirName)):
+            path = os.path.join(dirName, fileName)
+            companies, dataStart = readCSVHeader(path)
+            for companyIdx, name in enumerate(companies):
+                self.index[name] = (path, companyIdx, dataStart)
+
+            info = os.stat(path)
+            entry = validEntry(manifest.get(fileName), path, info.st_size,
+                               info.st_mtime_ns)
+            if entry is not None:
+                self.cacheEntries[path] = entry
+
+        # Least recently used first
+        self.loaded = OrderedDict()
+        self.loadedBytes = 0
+        # Companies added while running (see add), they have no place in a
+        # file to be read again from, so they are never evicted
+        self.added = {}
+
+    def __getitem__(self, name):
+        if name in self.added:
+            return self.added[name]
+        company = self.loaded.get(name)
+        if company is not None:
+            self.loaded.move_to_end(name)
+            return company
+
+        if name not in self.index:
+            raise KeyError(name)
+
+        company = self.loadCompany(name)
+        self.loaded[name] = company
+        self.loadedBytes += companyBytes(company)
+        self.evict()
+        return company
+
+    # Checking a name must not load the company
+    def __contains__(self, name):
+        return name in self.index or name in self.added
+
+    def __iter__(self):
+        yield from self.index
+        yield from (name for name in self.added if name not in self.index)
+
+    def __len__(self):
+        return len(self.index) + sum(name not in self.index
+                                     for name in self.added)
+
+    def isLoaded(self, name):
+        return name in self.loaded or name in self.added
+
+    # Adds a company that is not in the indexed files (e.g. one that first
+    # showed up in an update, see stockupdate)
+    def add(self, name, company):
+        self.added[name] = company
+
+    # Reads a single company, from the binary cache if possible
+    def loadCompany(self, name):
+        path, companyIdx, dataStart = self.index[name]
+        entry = self.cacheEntries.get(path)
+        if entry is not None:
+            # The file may have grown since the start (see stockupdate)
+            info = os.stat(path)
+            if validEntry(entry, path, info.st_size,
+                          info.st_mtime_ns) is not None:
+                return mapCacheFile(self.cacheDir, entry, names={name})[name]
+            del self.cacheEntries[path]
+
+        columns = readCompanyColumns(path, dataStart, companyIdx,
+                                     self.categoryLength)
+        return Company.fromColumns(name, name, *columns)
+
+    # Drops least recently used companies until the memory cap is respected
+    # Pinned companies and the most recent one are always kept
+    def evict(self):
+        for name in list(self.loaded)[:-1]:
+            if self.loadedBytes <= self.memoryLimit:
+                break
+            if name in self.pinned:
+                continue
+            self.loadedBytes -= companyBytes(self.loaded.pop(name))
@@ -0,0 +1,273 @@
+# Reading the exported Yahoo Finance csv files
+import os
+import csv
+import time
+import itertools
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from stockmodel import Stock, Company
+
+
+# Splits the input list L into sublists of size n
+# Returns them one at a time
+def splitList(L, n):
+    # Split the list into sublists of equal size
+    # If n not given
+    if n == -1:
+        n = len(L)
+
+    # Returns the sublists one at a time
+    for i in range(0, len(L), n):
+        yield L[i : i + n]
+
+# Returns a new lowercase string 
+# All spaces are replaced with underscores
+def formatName(name):
+    name = name.lower()
+    return name.replace(" ", "_")
+
+# Returns a list of file names in a directory with a certain extension
+def fileNamesInDir(dirName, extension=".csv"):
+    # Used to get all the csv files in the data directory and load them
+    return [fileName for fileName in os.listdir(dirName)
+            if fileName.endswith(extension)]
+
+def readCSVrows(filename, categoryLength=-1):
+    # Create a csv reader
+    datareader = csv.reader(filename, delimiter=",")
+
+    # Skip the first row
+    companies = [company for company in next(datareader) if company != ""]
+
+    # Skip the second row
+    categories = next(datareader)
+
+    # Normalize the category names for better reading and storing as JSON
+    categories = [formatName(s) for s in categories[:categoryLength]]
+
+    # Create a dictionary of companies
+    stockData = {copmanyName: Company(copmanyName, copmanyName, []) 
+                 for copmanyName in companies}
+
+    # Read the rows
+    for row in datareader:
+        # Split the row into parts using the category length
+        parts = splitList(row, categoryLength)
+        for company, part in zip(companies, parts):
+            # If the first part is empty, assume that the rest of the parts are empty
+            if part[0] == "":
+                continue
+
+            # Add the stock to the company
+            stockData[company].appendStock(Stock(*part[: categoryLength - 1]))
+
+    # Verify that the data is valid
+    for company in stockData.values():
+        company.verify()
+
+    return stockData
+
+# Converts a "YYYY-MM-DD" string to a day ordinal
+# Yahoo exports always use this fixed width format, so slicing is enough
+# Anything else falls back to strptime
+def parseDateOrdinal(text):
+    if len(text) == 10 and text[4] == "-" and text[7] == "-":
+        try:
+            return date(int(text[:4]), int(text[5:7]),
+                        int(text[8:])).toordinal()
+        except ValueError:
+            pass
+    return datetime.strptime(text, "%Y-%m-%d").toordinal()
+
+# Returns a memoized parseDateOrdinal
+def ordinalCache():
+    cache = {}
+
+    def lookup(text):
+        ordinal = cache.get(text)
+        if ordinal is None:
+            ordinal = cache[text] = parseDateOrdinal(text)
+        return ordinal
+
+    return lookup
+
+# Converts parsed csv rows (side-by-side company blocks) into typed columns
+# Returns {company name: [dates, opens, highs, lows, closes, adjustedCloses, volumes]}
+def convertRows(rows, companies, categoryLength=8):
+    # Transpose once, rows of different length are padded
+    columns = list(itertools.zip_longest(*rows, fillvalue=""))
+
+    # Day ordinals repeat a lot inside one file, so they are memoized
+    toOrdinal = ordinalCache()
+
+    companyColumns = {}
+    for companyIdx, companyName in enumerate(companies):
+        offset = companyIdx * categoryLength
+        block = columns[offset : offset + 7]
+        if len(block) < 7:
+            companyColumns[companyName] = emptyColumns()
+            continue
+
+        # Shorter histories leave empty cells at the bottom of the block
+        # Yahoo also writes "null" rows for days without data
+        present = [cell != "" and cell != "null" for cell in block[1]]
+        if not all(present):
+            block = [list(itertools.compress(column, present))
+                     for column in block]
+
+        companyColumns[companyName] = (
+            [array("q", map(toOrdinal, block[0]))]
+            + [array("d", map(float, column)) for column in block[1:]])
+
+    return companyColumns
+
+# One empty array per Company column
+def emptyColumns():
+    return [array("q")] + [array("d") for _ in range(6)]
+
+# Bulk version of readCSVrows, same side-by-side multi company layout
+# Converts one company's block of columns at a time instead of cell by cell
+# If stats (dict) is given, it is filled with "rows", "seconds" and "rowsPerSecond"
+def readCSVBulk(filename, categoryLength=8, stats=None):
+    start = time.perf_counter()
+    datareader = csv.reader(filename, delimiter=",")
+
+    # Company names and category row, same as readCSVrows
+    companies = [company for company in next(datareader) if company != ""]
+    next(datareader)
+
+    stockData = {name: Company.fromColumns(name, name, *columns)
+                 for name, columns in convertRows(datareader, companies,
+                                                  categoryLength).items()}
+
+    if stats is not None:
+        fillStats(stats, sum(len(company) for company in stockData.values()),
+                  time.perf_counter() - start)
+
+    return stockData
+
+def fillStats(stats, rows, seconds):
+    stats["rows"] = rows
+    stats["seconds"] = seconds
+    stats["rowsPerSecond"] = rows / seconds if seconds > 0 else 0.0
+
+# Reads the company names of a csv file
+# Returns (companies, byte offset of the first data row)
+def readCSVHeader(path):
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8-sig")
+        f.readline()
+        companies = [company for company in next(csv.reader([header]))
+                     if company != ""]
+        return companies, f.tell()
+
+# Reads the block of a single company out of a csv file
+# Only that company's cells are converted, the rest of each row is skipped
+def readCompanyColumns(path, dataStart, companyIdx, categoryLength=8):
+    offset = companyIdx * categoryLength
+    cells = [[] for _ in range(7)]
+    with open(path, "rb") as f:
+        f.seek(dataStart)
+        for row in csv.reader(line.decode("utf-8") for line in f):
+            part = row[offset : offset + 7]
+            # Missing, empty or "null" rows are skipped, like convertRows
+            if len(part) < 7 or part[1] == "" or part[1] == "null":
+                continue
+            for column, cell in zip(cells, part):
+                column.append(cell)
+
+    return ([array("q", map(ordinalCache(), cells[0]))]
+            + [array("d", map(float, column)) for column in cells[1:]])
+
+# Splits the data rows of a file into line aligned byte ranges
+def chunkRanges(path, dataStart, chunkBytes):
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = dataStart
+        while start < size:
+            f.seek(min(size, start + chunkBytes))
+            # Move the boundary to the start of the next line
+            f.readline()
+            end = min(size, max(f.tell(), start + 1))
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+# Worker: parses the rows inside [start, end) of a file
+# Returns raw column buffers, which are much cheaper to send back than objects
+def readCSVChunk(path, start, end, companies, categoryLength=8):
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+
+    companyColumns = convertRows(csv.reader(text.splitlines()), companies,
+                                 categoryLength)
+    return {name: [column.tobytes() for column in columns]
+            for name, columns in companyColumns.items()}
+
+# Parses the given csv files using a pool of worker processes
+# Large files are split by rows, so the company blocks inside one wide
+# file are parsed in parallel as well
+# Returns {path: {company name: Company}}, in the order of paths
+def loadStockFiles(paths, categoryLength=8, workers=None,
+                   chunkBytes=4 * 1024 * 1024, stats=None):
+    workers = workers or os.cpu_count() or 1
+
+    # (path, company names, byte ranges) for each file
+    files = []
+    for path in paths:
+        companies, dataStart = readCSVHeader(path)
+        files.append((path, companies,
+                      chunkRanges(path, dataStart, chunkBytes)))
+
+    tasks = [(path, chunkStart, chunkEnd, companies, categoryLength)
+             for path, companies, ranges in files
+             for chunkStart, chunkEnd in ranges]
+
+    workers = max(1, min(workers, len(tasks)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(readCSVChunk, *zip(*tasks)))
+    else:
+        results = [readCSVChunk(*task) for task in tasks]
+
+    # Stitch the chunks of each file back together
+    merged = {path: {name: emptyColumns() for name in companies}
+              for path, companies, _ in files}
+    for (path, _, _, companies, _), result in zip(tasks, results):
+        for name in companies:
+            for column, buffer in zip(merged[path][name], result[name]):
+                column.frombytes(buffer)
+
+    if stats is not None:
+        stats["workers"] = workers
+
+    return {path: {name: Company.fromColumns(name, name, *columns)
+                   for name, columns in fileColumns.items()}
+            for path, fileColumns in merged.items()}
+
+# Loads every csv file of a directory, see loadStockFiles
+# If stats (dict) is given, it is filled with "files", "workers", "rows",
+# "seconds" and "rowsPerSecond"
+def loadStockDirectory(dirName, categoryLength=8, workers=None,
+                       chunkBytes=4 * 1024 * 1024, stats=None):
+    start = time.perf_counter()
+    paths = [os.path.join(dirName, fileName)
+             for fileName in sorted(fileNamesInDir(dirName))]
+    fileData = loadStockFiles(paths, categoryLength, workers, chunkBytes,
+                              stats)
+
+    # Later files replace companies of earlier ones, like dict.update
+    totalData = {}
+    for companies in fileData.values():
+        totalData.update(companies)
+
+    if stats is not None:
+        stats["files"] = len(paths)
+        fillStats(stats, sum(len(company) for company in totalData.values()),
+                  time.perf_counter() - start)
+
+    return totalData
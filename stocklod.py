@@ -0,0 +1,108 @@
+# Multi-resolution OHLC data for drawing zoomed out charts
+# Level k merges 2 ** k consecutive rows into one bar, keeping the first
+# open, highest high, lowest low, last close and the summed volume
+# Bars always start at a row index that is a multiple of 2 ** k, so the
+# same bars are drawn while panning
+import operator
+from array import array
+
+# One level of the pyramid, row i covers rows [i * factor, (i + 1) * factor)
+class OHLCLevel:
+    def __init__(self, factor, opens, highs, lows, closes, volumes):
+        self.factor = factor
+        self.opens = opens
+        self.highs = highs
+        self.lows = lows
+        self.closes = closes
+        self.volumes = volumes
+
+    def __len__(self):
+        return len(self.opens)
+
+    # Builds the next level by merging pairs of bars
+    def merge(self):
+        return OHLCLevel(self.factor * 2, *self.mergedColumns(0))
+
+    # Merges pairs of bars from bar 2 * start on, returns the columns
+    # (opens, highs, lows, closes, volumes) of the next level from start on
+    def mergedColumns(self, start):
+        first = 2 * start
+        # An odd bar at the end stays on its own
+        odd = (len(self) - first) % 2
+        # Copies, level 0 may be a read only memoryview of the cache
+        opens = array("d", self.opens[first::2])
+        closes = array("d", self.closes[first + 1::2])
+        highs = array("d", map(max, self.highs[first::2],
+                               self.highs[first + 1::2]))
+        lows = array("d", map(min, self.lows[first::2],
+                              self.lows[first + 1::2]))
+        volumes = array("d", map(operator.add, self.volumes[first::2],
+                                 self.volumes[first + 1::2]))
+        if odd:
+            closes.append(self.closes[-1])
+            highs.append(self.highs[-1])
+            lows.append(self.lows[-1])
+            volumes.append(self.volumes[-1])
+        return opens, highs, lows, closes, volumes
+
+    # Replaces the bars from start on with the merged bars of lower
+    def mergeTail(self, lower, start):
+        for column, tail in zip((self.opens, self.highs, self.lows,
+                                 self.closes, self.volumes),
+                                lower.mergedColumns(start)):
+            column[start:] = tail
+
+class OHLCPyramid:
+    def __init__(self, company):
+        # Level 0 is the company's own columns
+        self.levels = [OHLCLevel(1, company.opens, company.highs, company.lows,
+                                 company.closes, company.volumes)]
+        while len(self.levels[-1]) > 1:
+            self.levels.append(self.levels[-1].merge())
+
+    # Updates the pyramid after rows were appended to company, only the
+    # bars covering rows from oldLength on are merged again
+    def extend(self, company, oldLength):
+        self.levels[0] = OHLCLevel(1, company.opens, company.highs,
+                                   company.lows, company.closes,
+                                   company.volumes)
+        first = oldLength
+        idx = 0
+        while len(self.levels[idx]) > 1:
+            # The first bar of the next level that covers a changed bar
+            first //= 2
+            if idx + 1 == len(self.levels):
+                self.levels.append(self.levels[idx].merge())
+            else:
+                self.levels[idx + 1].mergeTail(self.levels[idx], first)
+            idx += 1
+
+    # Bytes of the merged levels, level 0 is the company's own columns
+    def byteSize(self):
+        return sum(5 * 8 * len(level) for level in self.levels[1:])
+
+    # Returns the level whose factor is the largest power of two <= factor
+    def level(self, factor):
+        idx = max(0, min(len(self.levels) - 1, int(factor).bit_length() - 1))
+        return self.levels[idx]
+
+    # Returns (highest high, lowest low) of rows [first, last)
+    # Walks up the levels like a segment tree, O(log n) bars are read
+    def rangeHighLow(self, first, last):
+        highest = float("-inf")
+        lowest = float("inf")
+        for level in self.levels:
+            if first >= last:
+                break
+            # Odd ends are not covered by a bar of the next level
+            if first & 1:
+                highest = max(highest, level.highs[first])
+                lowest = min(lowest, level.lows[first])
+                first += 1
+            if last & 1:
+                last -= 1
+                highest = max(highest, level.highs[last])
+                lowest = min(lowest, level.lows[last])
+            first >>= 1
+            last >>= 1
+        return highest, lowest
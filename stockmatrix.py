@@ -0,0 +1,107 @@
+# Pairwise results of a set of companies (e.g. correlations), stored as
+# the upper triangle of the symmetric matrix, diagonal included, packed
+# row by row into one array
+# Row i holds cells (i, i), (i, i + 1), ..., (i, n - 1), cells that were
+# never set are nan
+import math
+import heapq
+import itertools
+from array import array
+
+class SymmetricMatrix:
+    def __init__(self, names):
+        self.names = list(names)
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+        n = len(self.names)
+        self.values = array("d", [math.nan]) * (n * (n + 1) // 2)
+
+    # Builds a matrix from a full square matrix (list of rows) in names order
+    # Only its upper triangle is read
+    @classmethod
+    def fromMatrix(cls, names, matrix):
+        result = cls(names)
+        n = len(result)
+        for i, row in enumerate(matrix):
+            start = result.position(i, i)
+            result.values[start : start + n - i] = array("d", row[i:])
+        return result
+
+    def __len__(self):
+        return len(self.names)
+
+    # Position of cell (i, j) in values
+    def position(self, i, j):
+        if i > j:
+            i, j = j, i
+        return i * len(self.names) - i * (i - 1) // 2 + j - i
+
+    # Value of the cell of two names, None if it was never set or a name
+    # is not in the matrix
+    def get(self, name1, name2):
+        i = self.index.get(name1)
+        j = self.index.get(name2)
+        if i is None or j is None:
+            return None
+        value = self.values[self.position(i, j)]
+        return None if math.isnan(value) else value
+
+    def set(self, name1, name2, value):
+        self.values[self.position(self.index[name1], self.index[name2])] = value
+
+    # Every cell of the row (and column) of name, in names order
+    def row(self, name):
+        i = self.index[name]
+        n = len(self.names)
+        # Left of the diagonal the row is read down column i
+        row = array("d", (self.values[self.position(j, i)] for j in range(i)))
+        start = self.position(i, i)
+        row.extend(self.values[start : start + n - i])
+        return row
+
+    # The full square matrix as a list of rows
+    def toLists(self):
+        n = len(self.names)
+        rows = [[] for _ in range(n)]
+        for i, row in enumerate(rows):
+            start = self.position(i, i)
+            cells = self.values[start : start + n - i].tolist()
+            row += cells
+            # The rows below get their cells left of the diagonal from here
+            for lower, value in zip(rows[i + 1 :], cells[1:]):
+                lower.append(value)
+        return rows
+
+    # [(name1, name2, value)] of the k largest cells off the diagonal
+    def topPairs(self, k, key=None):
+        n = len(self.names)
+        if k <= 0 or n < 2:
+            return []
+        keys = orderKeys(self.values, key)
+        # Comparing the plain floats runs in C, the diagonal is at most n of
+        # them, so at least k cells off the diagonal reach threshold
+        threshold = heapq.nlargest(k + n, keys)[-1]
+
+        # Only rows that have such a cell are searched
+        candidates = []
+        for i in range(n - 1):
+            start = self.position(i, i) + 1
+            cells = keys[start : start + n - i - 1]
+            if max(cells) < threshold:
+                continue
+            for offset in itertools.compress(range(len(cells)),
+                                             map(threshold.__le__, cells)):
+                if cells[offset] > -math.inf:
+                    candidates.append((cells[offset], i, i + 1 + offset))
+
+        best = heapq.nlargest(k, candidates)
+        return [(self.names[i], self.names[j], self.values[self.position(i, j)])
+                for _, i, j in best]
+
+# Returns the values to order cells by, key(value) or the value itself
+# Unset cells come last (-inf)
+def orderKeys(values, key=None):
+    keys = array("d", map(key, values) if key else values)
+    if any(map(math.isnan, keys)):
+        keys = array("d", (-math.inf if math.isnan(value) else value
+                           for value in keys))
+    return keys
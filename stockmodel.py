@@ -0,0 +1,407 @@
+# Data model for the stock analyzer
+# Kept free of any drawing code so it can be used by worker processes
+import math
+import weakref
+import itertools
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from stocklod import OHLCPyramid
+from stockanalytics import PrefixStats
+from stockindicators import indicatorTypes
+from stockderived import derivedCache
+from stockprofile import profiler
+
+# Distinct for every Company of the process, keys its derived series
+companyIds = itertools.count()
+
+
+class Stock:
+    def __init__(self, date, open, high, low, close, adjustedClose, volume):
+        # Returns a datetime object that represents the date in year/month/day
+        self.date = datetime.strptime(date, "%Y-%m-%d")
+        self.open = float(open)
+        self.high = float(high)
+        self.low = float(low)
+        self.close = float(close)
+        self.adjustedClose = float(adjustedClose)
+        self.volume = float(volume)
+
+    # Create a read-only attribute to return POSIX timestamp
+    @property
+    def posixTime(self):
+        # Returns the posix time of the stock
+        return self.date.timestamp()
+
+    def __repr__(self):
+        return f"Stock(date={self.date}, open={self.open})"
+
+# Read-only view of a single row inside a Company's columns
+# Keeps the old company.stocks[i].close style access working
+class StockRow:
+    __slots__ = ("company", "index")
+
+    def __init__(self, company, index):
+        self.company = company
+        self.index = index
+
+    @property
+    def date(self):
+        return datetime.fromordinal(self.company.dates[self.index])
+
+    @property
+    def open(self):
+        return self.company.opens[self.index]
+
+    @property
+    def high(self):
+        return self.company.highs[self.index]
+
+    @property
+    def low(self):
+        return self.company.lows[self.index]
+
+    @property
+    def close(self):
+        return self.company.closes[self.index]
+
+    @property
+    def adjustedClose(self):
+        return self.company.adjustedCloses[self.index]
+
+    @property
+    def volume(self):
+        return self.company.volumes[self.index]
+
+    @property
+    def posixTime(self):
+        # Returns the posix time of the stock
+        return self.date.timestamp()
+
+    def __repr__(self):
+        return f"Stock(date={self.date}, open={self.open})"
+
+# List-like access to the rows of a Company, created on demand
+class StockRows:
+    def __init__(self, company):
+        self.company = company
+
+    def __len__(self):
+        return len(self.company.dates)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [StockRow(self.company, i)
+                    for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("stock index out of range")
+        return StockRow(self.company, idx)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield StockRow(self.company, i)
+
+class Company:
+    # Stocks are sorted by date
+    # Every field is stored in its own contiguous typed column
+    # (dates are day ordinals, see datetime.toordinal)
+    def __init__(self, name, ticker, stocks=()):
+        self.name = name
+        self.ticker = ticker
+
+        self.dates = array("q")
+        self.opens = array("d")
+        self.highs = array("d")
+        self.lows = array("d")
+        self.closes = array("d")
+        self.adjustedCloses = array("d")
+        self.volumes = array("d")
+
+        for stock in stocks:
+            self.appendStock(stock)
+
+        # Day indices of the dates, cached for one DateMapper (see dayIndices)
+        self.dayIndexKey = None
+        self.dayIndexArray = None
+        # Zoomed out bars, running totals and indicators are built on first
+        # use and kept in the derived cache until this company is gone
+        self.cacheId = next(companyIds)
+        weakref.finalize(self, derivedCache.dropOwner, self.cacheId)
+
+        self.stocks = StockRows(self)
+        self.verify()
+
+    # Builds a company from already converted columns (no copy is made)
+    # Columns may be arrays or memoryviews (e.g. of a memory mapped file)
+    # verify can be skipped for data that was already verified before
+    @classmethod
+    def fromColumns(cls, name, ticker, dates, opens, highs, lows, closes,
+                    adjustedCloses, volumes, verify=True):
+        company = cls(name, ticker)
+        company.dates = dates
+        company.opens = opens
+        company.highs = highs
+        company.lows = lows
+        company.closes = closes
+        company.adjustedCloses = adjustedCloses
+        company.volumes = volumes
+        if verify:
+            company.verify()
+        return company
+
+    # All columns, in the same order as the CSV categories
+    @property
+    def columns(self):
+        return (self.dates, self.opens, self.highs, self.lows, self.closes,
+                self.adjustedCloses, self.volumes)
+
+    # Appends one row to the end of every column
+    def appendRow(self, ordinal, open, high, low, close, adjustedClose, volume):
+        self.dates.append(ordinal)
+        self.opens.append(open)
+        self.highs.append(high)
+        self.lows.append(low)
+        self.closes.append(close)
+        self.adjustedCloses.append(adjustedClose)
+        self.volumes.append(volume)
+
+    # Appends a Stock (or anything shaped like one)
+    def appendStock(self, stock):
+        self.appendRow(stock.date.toordinal(), stock.open, stock.high,
+                       stock.low, stock.close, stock.adjustedClose, stock.volume)
+
+    # Appends the rows of the given columns that are newer than the last row
+    # Rows that are already there are skipped, so an update may overlap the
+    # loaded history
+    # The zoomed out bars, running totals and indicators are extended
+    # instead of rebuilt, day indices follow on their next use
+    # Returns the number of appended rows
+    def appendColumns(self, dates, opens, highs, lows, closes, adjustedCloses,
+                      volumes):
+        lastDate = self.dates[-1] if len(self) else None
+        # Sorted, the last row of a repeated date wins
+        newRows = {}
+        for idx, ordinal in enumerate(dates):
+            if lastDate is None or ordinal > lastDate:
+                newRows[ordinal] = idx
+        if not newRows:
+            return 0
+        order = [newRows[ordinal] for ordinal in sorted(newRows)]
+        newColumns = [[column[idx] for idx in order]
+                      for column in (dates, opens, highs, lows, closes,
+                                     adjustedCloses, volumes)]
+        checkPrices(newColumns[2], newColumns[3], newColumns[1], newColumns[4])
+
+        # Memoryviews of the binary cache can not grow, they are copied once
+        if not isinstance(self.dates, array):
+            (self.dates, self.opens, self.highs, self.lows, self.closes,
+             self.adjustedCloses, self.volumes) = [
+                array(typecode(column), column) for column in self.columns]
+
+        oldLength = len(self)
+        for column, values in zip(self.columns, newColumns):
+            column.extend(values)
+
+        for key, value in derivedCache.ownedItems(self.cacheId):
+            if key[0] != self.cacheId:
+                # Shared with other companies (e.g. an aligned selection), it
+                # is calculated again for the new length
+                derivedCache.discard(key)
+                continue
+            kind = key[1]
+            if kind == "pyramid":
+                value.extend(self, oldLength)
+            elif kind == "prefix stats":
+                value.extend(self)
+            else:
+                value.extend(self.closes)
+            derivedCache.resize(key)
+        return len(order)
+
+    # Verifies that the data is valid and sorted
+    def verify(self):
+        dates = self.dates
+        # Only sort when the rows are out of order
+        if any(dates[i] > dates[i + 1] for i in range(len(dates) - 1)):
+            order = sorted(range(len(dates)), key=dates.__getitem__)
+            # New arrays, memoryview columns (e.g. of a read only memory
+            # mapped file) can not be rearranged in place
+            (self.dates, self.opens, self.highs, self.lows, self.closes,
+             self.adjustedCloses, self.volumes) = [
+                array(typecode(column), [column[i] for i in order])
+                for column in self.columns]
+
+        checkPrices(self.highs, self.lows, self.opens, self.closes)
+
+    def __len__(self):
+        return len(self.dates)
+
+    # Returns the derived value (kind, *parameters) of the company from the
+    # derived cache, compute() builds it when it is not there
+    def derived(self, kind, compute, *parameters):
+        return derivedCache.get((self.cacheId, kind) + parameters, compute,
+                                self.cacheId)
+
+    # Returns the OHLCPyramid of the company
+    def pyramid(self):
+        return self.derived("pyramid", lambda: OHLCPyramid(self))
+
+    # Returns the PrefixStats of the company
+    def prefixStats(self):
+        return self.derived("prefix stats", lambda: PrefixStats(self))
+
+    # Returns (first, last + 1) row indices of the dates inside
+    # [leftOrdinal, rightOrdinal], found by bisecting the sorted dates
+    def dateRange(self, leftOrdinal, rightOrdinal):
+        return (bisect_left(self.dates, leftOrdinal),
+                bisect_right(self.dates, rightOrdinal))
+
+    # Returns the index of every date of the company for dateMapper
+    # Computed once and reused until the mapper's calendar changes
+    def dayIndices(self, dateMapper):
+        key = (dateMapper, dateMapper.version, len(self.dates))
+        profiler.countCache("day index cache", self.dayIndexKey == key)
+        if self.dayIndexKey != key:
+            previousKey = self.dayIndexKey
+            if (previousKey is not None and previousKey[:2] == key[:2]
+                and previousKey[2] < key[2]):
+                # Rows were appended, only those need an index
+                # A new array, the raster thread may read the old one
+                self.dayIndexArray = (self.dayIndexArray
+                    + dateMapper.ordinalIndices(self.dates[previousKey[2]:]))
+            else:
+                self.dayIndexArray = dateMapper.ordinalIndices(self.dates)
+            self.dayIndexKey = key
+        return self.dayIndexArray
+
+    # Return company name and stock entries
+    def __repr__(self):
+        return f"Company({repr(self.name)}, stocks=[...{len(self)} entries])"
+
+    # Returns the Indicator of the closes of the given kind and parameters
+    # (see stockindicators)
+    def indicator(self, kind, *parameters):
+        def compute():
+            indicator = indicatorTypes[kind](*parameters)
+            indicator.extend(self.closes)
+            return indicator
+        return self.derived("indicator", compute, kind, *parameters)
+
+    # Calculates moving average of company's stock prices over given time frame
+    # Days before the first full time frame are nan
+    def movingAverage(self, width):
+        # Resolution is arbitrarily decreased in order to save memory
+        if width < 2:
+            return self.closes
+        return self.indicator("sma", math.floor(width)).lines["sma"]
+
+# Returns the array typecode of a column, an array or a memoryview
+def typecode(column):
+    return getattr(column, "typecode", None) or column.format
+
+# Checks the prices of rows, raises ValueError for an impossible one
+def checkPrices(highs, lows, opens, closes):
+    for high, low, open, close in zip(highs, lows, opens, closes):
+        if high < low:
+            raise ValueError("High is less than low")
+        if min(open, close) < low:
+            raise ValueError("Open or close is less than low")
+        if max(open, close) > high:
+            raise ValueError("Open or close is greater than high")
+
+# Index of an ordinal counted in weekdays since 0001-01-01 (a Monday)
+# Weekends count as the following Monday
+def businessDayIndex(ordinal):
+    weeks, day = divmod(ordinal - 1, 7)
+    return weeks * 5 + min(day, 5)
+
+# Inverse of businessDayIndex, always returns a weekday
+def businessDayOrdinal(index):
+    weeks, day = divmod(index, 5)
+    return weeks * 7 + day + 1
+
+# Returns the sorted ordinals of every day on which any company traded
+def tradingDays(companies):
+    days = set()
+    for company in companies:
+        days.update(company.dates)
+    return array("q", sorted(days))
+
+# Maps dates to integers and integers to dates
+# Used to remove weekends from the graph
+# Both directions are computed in closed form, nothing is stored per date
+# With a trading calendar (sorted ordinals, see tradingDays) holidays are
+# removed too, dates outside of it fall back to plain weekdays
+class DateMapper:
+    def __init__(self, originDate, calendar=None):
+        self.originOrdinal = originDate.toordinal()
+        # Increased whenever indices change, so cached indices are refreshed
+        self.version = 0
+        self.setCalendar(calendar)
+
+    def setCalendar(self, calendar):
+        self.calendar = calendar if calendar else None
+        self.origin = 0
+        self.origin = self.ordinalIndex(self.originOrdinal)
+        self.version += 1
+
+    # Adds trading days (e.g. of appended rows) to the calendar
+    # Days after its end keep the index of every day of the calendar,
+    # anything else sets a new calendar
+    # Days past the old end were mapped as weekdays and may move, so the
+    # version goes up either way
+    def extendCalendar(self, ordinals):
+        calendar = self.calendar
+        if calendar is None:
+            return
+        newDays = sorted(set(ordinals).difference(calendar))
+        if not newDays:
+            return
+        if newDays[0] > calendar[-1] and self.originOrdinal <= calendar[-1]:
+            # A new array, the raster thread may read the old one
+            self.calendar = calendar + array("q", newDays)
+            self.version += 1
+        else:
+            self.setCalendar(array("q", sorted(set(calendar).union(newDays))))
+
+    # Index of a day ordinal, non trading days map to the next trading day
+    def ordinalIndex(self, ordinal):
+        calendar = self.calendar
+        if calendar is None:
+            return businessDayIndex(ordinal) - self.origin
+
+        if ordinal < calendar[0]:
+            index = businessDayIndex(ordinal) - businessDayIndex(calendar[0])
+        elif ordinal > calendar[-1]:
+            index = (len(calendar) - 1 + businessDayIndex(ordinal)
+                     - businessDayIndex(calendar[-1]))
+        else:
+            index = bisect_left(calendar, ordinal)
+        return index - self.origin
+
+    # Day ordinal of an index, inverse of ordinalIndex
+    def indexOrdinal(self, index):
+        index = math.floor(index) + self.origin
+        calendar = self.calendar
+        if calendar is None:
+            return businessDayOrdinal(index)
+
+        if index < 0:
+            return businessDayOrdinal(businessDayIndex(calendar[0]) + index)
+        if index >= len(calendar):
+            return businessDayOrdinal(businessDayIndex(calendar[-1])
+                                      + index - len(calendar) + 1)
+        return calendar[index]
+
+    # ordinalIndex for a whole (sorted) date column
+    def ordinalIndices(self, ordinals):
+        return array("q", map(self.ordinalIndex, ordinals))
+
+    def getDateIndex(self, targetDate):
+        return self.ordinalIndex(targetDate.toordinal())
+
+    def getDateFromIndex(self, targetDate):
+        return datetime.fromordinal(self.indexOrdinal(targetDate))
@@ -0,0 +1,257 @@
+# Searching the history of every company for windows shaped like a query
+# window (e.g. the selection of one company)
+# Windows are compared by the z-normalized Euclidean distance of the log
+# closes, so neither the price level nor the size of the moves counts,
+# only their shape
+# The dot products of the query with every window of a series come from
+# FFTs (MASS, Mueen's algorithm for similarity search): the series is cut
+# into blocks of blockLength days, two blocks are transformed at once as
+# the real and imaginary part of one complex series
+import math
+import cmath
+import heapq
+import operator
+import itertools
+from array import array
+
+from stockprofile import profiler
+from stockindicators import windowSums
+
+# Blocks are at least this long, shorter ones spend most of their time in
+# the Python loops of fft
+minBlockLength = 1024
+
+# Returns the twiddle factors e^(-2 pi i k / n), k < n / 2, of an fft of
+# length n
+def twiddleFactors(n):
+    return [cmath.exp(-2j * math.pi * k / n) for k in range(n // 2)]
+
+# Discrete Fourier transform of a list of complex numbers whose length is
+# a power of 2 (radix 2 Stockham FFT), factors: twiddleFactors(len(values))
+# The butterflies of a stage run as maps over slices, the first stages
+# loop over the twiddle factors and map over all sub transforms at once,
+# the later ones the other way round, so the Python loops stay short
+def fft(values, factors):
+    data = list(values)
+    n = len(data)
+    # data[k * count + j] is value k of sub transform j
+    size, count = 1, n
+    while size < count:
+        half = count // 2
+        stride = n // (2 * size)
+        low, high = [], []
+        for k in range(size):
+            base = k * count
+            even = data[base : base + half]
+            odd = list(map(factors[k * stride].__mul__,
+                           data[base + half : base + count]))
+            low += map(operator.add, even, odd)
+            high += map(operator.sub, even, odd)
+        data = low + high
+        size, count = 2 * size, half
+
+    # From here on data[j * size + k] is value k of sub transform j
+    if count > 1:
+        data = [value for j in range(count) for value in data[j::count]]
+    while count > 1:
+        half = count // 2
+        stageFactors = factors[:: n // (2 * size)]
+        merged = []
+        for j in range(half):
+            even = data[j * size : (j + 1) * size]
+            odd = list(map(operator.mul, stageFactors,
+                           data[(j + half) * size : (j + half + 1) * size]))
+            merged += map(operator.add, even, odd)
+            merged += map(operator.sub, even, odd)
+        data = merged
+        size, count = 2 * size, half
+    return data
+
+# Returns the smallest power of 2 >= n
+def nextPowerOf2(n):
+    return 1 << max(0, n - 1).bit_length()
+
+# Returns the log closes of a company shifted to a mean of 0, None if a
+# close is not positive
+def logSeries(closes):
+    if not len(closes) or min(closes) <= 0:
+        return None
+    logs = array("d", map(math.log, closes))
+    return array("d", map(operator.sub, logs,
+                          itertools.repeat(math.fsum(logs) / len(logs))))
+
+# Windows of the query's length in the history of every company (or
+# names), ranked by their distance to the query window of target
+# The query is the target's days in [leftOrdinal, rightOrdinal], windows
+# overlapping it or a better match of the same company are left out
+# Companies are searched a few FFT blocks at a time (see step) so the graph
+# stays responsive
+class PatternSearch:
+    def __init__(self, companies, target, leftOrdinal, rightOrdinal,
+                 count=10, names=None, minDays=8):
+        self.companies = companies
+        self.target = target
+        self.count = count
+        self.names = list(companies if names is None else names)
+        # Next name to search
+        self.position = 0
+        # Heap of the count best matches, the worst first:
+        # (-squared distance, name, first ordinal, last ordinal)
+        self.best = []
+
+        company = companies[target]
+        first, last = company.dateRange(leftOrdinal, rightOrdinal)
+        self.queryStart = first
+        self.length = length = last - first
+        query = logSeries(company.closes[first:last])
+        if length < minDays or query is None:
+            self.names = []
+            return
+        mean = math.fsum(query) / length
+        deviation = math.sqrt(math.fsum((value - mean) ** 2
+                                        for value in query) / length)
+        if deviation < 1e-9:
+            # A flat query has no shape to look for
+            self.names = []
+            return
+
+        self.blockLength = max(minBlockLength, nextPowerOf2(4 * length))
+        self.factors = twiddleFactors(self.blockLength)
+        # The z-normalized query sums to 0, so the mean of a window drops out
+        # of its dot product with the query
+        normalized = [complex((value - mean) / deviation) for value in query]
+        normalized += [0j] * (self.blockLength - length)
+        self.queryTransform = list(map(complex.conjugate,
+                                       fft(normalized, self.factors)))
+
+    def done(self):
+        return self.position >= len(self.names)
+
+    # Searches the next companies until they add up to blockCount FFT
+    # blocks (at least one company), returns True when all are done
+    # The work of a step follows the days searched, not the companies
+    def step(self, blockCount=64):
+        with profiler.stage("patterns"):
+            series = {}
+            blocks = 0
+            while not self.done() and blocks < blockCount:
+                name = self.names[self.position]
+                self.position += 1
+                company = self.companies[name]
+                if len(company) < self.length:
+                    continue
+                logs = logSeries(company.closes)
+                if logs is not None:
+                    series[name] = (company, logs)
+                    blocks += self.blockCount(len(logs))
+
+            if series:
+                products = self.dotProducts([logs for _, logs
+                                             in series.values()])
+                for (name, (company, logs)), dots in zip(series.items(),
+                                                         products):
+                    self.addMatches(name, company, logs, dots)
+        return self.done()
+
+    # Returns the number of blocks a series of days is cut into
+    def blockCount(self, days):
+        advance = self.blockLength - self.length + 1
+        return -(-(days - self.length + 1) // advance)
+
+    # Returns the dot products of the query with every window of every
+    # series, one array per series
+    def dotProducts(self, seriesList):
+        length, blockLength = self.length, self.blockLength
+        # Each block gives the products of the windows starting in its
+        # first advance days
+        advance = blockLength - length + 1
+        blocks = [(idx, start) for idx, logs in enumerate(seriesList)
+                  for start in range(0, len(logs) - length + 1, advance)]
+        products = [array("d") for _ in seriesList]
+
+        for pair in itertools.zip_longest(blocks[0::2], blocks[1::2]):
+            parts = []
+            for block in pair:
+                if block is None:
+                    parts.append([0.0] * blockLength)
+                    continue
+                idx, start = block
+                part = seriesList[idx][start : start + blockLength].tolist()
+                parts.append(part + [0.0] * (blockLength - len(part)))
+            spectrum = map(operator.mul, fft(map(complex, *parts),
+                                             self.factors),
+                           self.queryTransform)
+            # The inverse fft through the forward one: conj(fft(conj(x))) / n
+            result = fft(map(complex.conjugate, spectrum),
+                         self.factors)[:advance]
+            for block, sign, part in zip(pair, (1, -1), ("real", "imag")):
+                if block is None:
+                    continue
+                idx, start = block
+                windows = len(seriesList[idx]) - length + 1 - start
+                products[idx].extend(map(
+                    operator.mul, map(operator.attrgetter(part),
+                                      result[:windows]),
+                    itertools.repeat(sign / blockLength)))
+        return products
+
+    # Keeps the best windows of one company
+    def addMatches(self, name, company, logs, dots):
+        length = self.length
+        sums = windowSums(logs, length - 1, length)
+        squares = windowSums(array("d", map(operator.mul, logs, logs)),
+                             length - 1, length)
+        means = array("d", map(operator.mul, sums,
+                               itertools.repeat(1 / length)))
+        # Flat windows are at the largest distance (no correlation)
+        deviations = map(math.sqrt, map(max, map(
+            operator.sub, map(operator.mul, squares,
+                              itertools.repeat(1 / length)),
+            map(operator.mul, means, means)), itertools.repeat(1e-18)))
+        # Squared distance 2 length (1 - correlation)
+        distances = array("d", map(operator.mul, map(
+            operator.sub, itertools.repeat(1.0),
+            map(operator.truediv, dots,
+                map(operator.mul, deviations, itertools.repeat(length)))),
+            itertools.repeat(2 * length)))
+
+        if name == self.target:
+            self.exclude(distances, self.queryStart)
+        for _ in range(self.count):
+            # Both run in C, the first of equal distances is taken
+            distance = min(distances)
+            idx = distances.index(distance)
+            if distance == math.inf or (len(self.best) == self.count
+                                        and -distance <= self.best[0][0]):
+                break
+            match = (-max(0.0, distance), name, company.dates[idx],
+                     company.dates[idx + length - 1])
+            if len(self.best) < self.count:
+                heapq.heappush(self.best, match)
+            else:
+                heapq.heappushpop(self.best, match)
+            self.exclude(distances, idx)
+
+    # Leaves out the windows overlapping the window starting at idx
+    def exclude(self, distances, idx):
+        first = max(0, idx - self.length + 1)
+        last = min(len(distances), idx + self.length)
+        distances[first:last] = array("d", [math.inf]) * (last - first)
+
+    # [(name, first ordinal, last ordinal, distance)] of the best matches
+    # so far, the closest first
+    def top(self):
+        return [(name, first, last, math.sqrt(-negative))
+                for negative, name, first, last in sorted(self.best,
+                                                          reverse=True)]
+
+# Searches every company (or names) for the count windows most similar to
+# the target's days in [leftOrdinal, rightOrdinal]
+# Returns [(name, first ordinal, last ordinal, distance)]
+def findSimilarPatterns(companies, target, leftOrdinal, rightOrdinal,
+                        count=10, names=None):
+    search = PatternSearch(companies, target, leftOrdinal, rightOrdinal,
+                           count, names)
+    while not search.step():
+        pass
+    return search.top()
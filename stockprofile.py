@@ -0,0 +1,97 @@
+# Per frame timing of the drawing and evaluation stages, plus counters
+# Stages nest: a stage started inside "graph" is stored as "graph/name"
+# Everything measured between two frames (e.g. an evaluation after a mouse
+# release) belongs to the next frame
+# Does nothing unless enabled, and only records on the thread that draws
+# the frames (not e.g. on the raster thread)
+import json
+import time
+import threading
+from contextlib import nullcontext
+
+# Returned by stage() while disabled
+noStage = nullcontext()
+
+class Stage:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append(self.name)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exception):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler.stack
+        name = "/".join(stack)
+        stack.pop()
+        stages = self.profiler.stages
+        stages[name] = stages.get(name, 0.0) + elapsed
+
+class FrameProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.thread = threading.get_ident()
+        # Current frame, stage name: seconds, counter name: count
+        self.stack = []
+        self.stages = {}
+        self.counters = {}
+        self.frameStart = time.perf_counter()
+        self.frames = 0
+        # (seconds since the frame before, stages, counters) of the last
+        # finished frame
+        self.lastFrame = (0.0, {}, {})
+        # Open file every frame is written to as one json line
+        self.trace = None
+
+    def recording(self):
+        return self.enabled and threading.get_ident() == self.thread
+
+    # Times a with block
+    def stage(self, name):
+        if not self.recording():
+            return noStage
+        return Stage(self, name)
+
+    def count(self, name, amount=1):
+        if self.recording():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Counts a lookup of the cache called name
+    def countCache(self, name, hit):
+        self.count(name + (" hits" if hit else " misses"))
+
+    # Switches recording on / off, frames are drawn on the current thread
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+        self.thread = threading.get_ident()
+        self.stack.clear()
+
+    # Writes every following frame to path (json lines), None stops
+    def setTrace(self, path):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+        if path is not None:
+            self.trace = open(path, "a")
+
+    # Closes the current frame, it becomes lastFrame
+    def endFrame(self):
+        now = time.perf_counter()
+        if self.recording():
+            self.lastFrame = (now - self.frameStart, self.stages, self.counters)
+            if self.trace is not None:
+                self.trace.write(json.dumps({
+                    "frame": self.frames, "time": time.time(),
+                    "interval": self.lastFrame[0], "stages": self.stages,
+                    "counters": self.counters}) + "\n")
+            self.frames += 1
+        self.stages = {}
+        self.counters = {}
+        self.frameStart = now
+
+# Shared by the app and the modules it uses
+profiler = FrameProfiler()
@@ -0,0 +1,86 @@
+# Raster rendering of the graph's bars
+# Frames are painted into an image on a background thread, the main thread
+# only shows the last finished one, so panning and zooming stay smooth
+# however many bars there are
+# Needs PIL, rasterAvailable is False without it
+import threading
+import traceback
+from contextlib import contextmanager
+
+try:
+    from PIL import Image, ImageDraw
+    rasterAvailable = True
+except ImportError:
+    rasterAvailable = False
+
+class RasterRenderer:
+    # paint(job, draw) paints a frame with a PIL ImageDraw
+    def __init__(self, paint):
+        self.paint = paint
+        self.condition = threading.Condition()
+        # (key, size, job) waiting to be painted, only the newest is kept
+        self.pending = None
+        # Key of the frame being painted
+        self.painting = None
+        # (key, job, image) of the last finished frame
+        self.result = None
+        # Increased for every finished frame
+        self.version = 0
+        self.thread = None
+        # No frame is started while held (see paused)
+        self.held = False
+
+    # Asks for a frame of size (width, height) pixels
+    # Nothing happens if the frame of key is shown or on its way already
+    def request(self, key, size, job):
+        with self.condition:
+            if ((self.result is not None and self.result[0] == key)
+                or self.painting == key
+                or (self.pending is not None and self.pending[0] == key)):
+                return
+
+            self.pending = (key, size, job)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    # Waits for the frame being painted, no new one is started inside the
+    # with block, so the data frames are painted from can change
+    @contextmanager
+    def paused(self):
+        with self.condition:
+            self.held = True
+            while self.painting is not None:
+                self.condition.wait()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.held = False
+                self.condition.notify_all()
+
+    # Background thread, paints the pending frames one after another
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None or self.held:
+                    self.condition.wait()
+                key, size, job = self.pending
+                self.pending = None
+                self.painting = key
+
+            # Transparent, the graph's background stays visible
+            image = Image.new("RGBA", size, (0, 0, 0, 0))
+            try:
+                self.paint(job, ImageDraw.Draw(image))
+            except Exception:
+                traceback.print_exc()
+                image = None
+
+            with self.condition:
+                self.painting = None
+                if image is not None:
+                    self.result = (key, job, image)
+                    self.version += 1
+                self.condition.notify_all()
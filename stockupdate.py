@@ -0,0 +1,170 @@
+# Appending new daily bars to companies that are already loaded
+# Two sources are watched:
+# - the csv files of the data directory, rows added at their end are read
+#   from where the last read stopped (tail mode), a rewritten file (e.g. a
+#   new "Max" export) is read again as a whole
+# - per ticker update files in the "updates" folder of the data directory,
+#   e.g. a single company Yahoo Finance download saved as updates/AAPL.csv
+# Only rows newer than a company's last row are appended (see
+# Company.appendColumns), so sources may overlap the loaded history
+# Companies that are not loaded yet (a new csv file, an update file of a
+# new ticker) are added
+import os
+import csv
+
+from array import array
+
+from stockmodel import Company, typecode
+from stockloader import (fileNamesInDir, readCSVHeader, convertRows,
+                         loadStockFiles)
+
+# Bytes before the end of the last read that have to be unchanged for a
+# grown file to count as appended to
+tailCheckBytes = 256
+
+# Returns the bytes [start, end) of a file
+def readBytes(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+# Reads a single company csv file (Date, Open, ..., Volume columns)
+# Returns the Company columns
+def readUpdateFile(path, name):
+    with open(path, newline="") as f:
+        rows = csv.reader(f)
+        # Category row
+        next(rows, None)
+        return convertRows(rows, [name], 7)[name]
+
+class UpdateWatcher:
+    # The csv files of dirName are expected to be loaded already, only
+    # rows added to them after this point are read
+    def __init__(self, dirName, categoryLength=8, updateDir=None):
+        self.dirName = dirName
+        self.categoryLength = categoryLength
+        self.updateDir = updateDir or os.path.join(dirName, "updates")
+
+        # path: (company names, first data byte, bytes read, tail bytes)
+        self.files = {}
+        for fileName in fileNamesInDir(dirName):
+            self.watchFile(os.path.join(dirName, fileName))
+
+        # path: (size, mtime) of the update files read so far
+        self.updateFiles = {}
+        # name: columns of its update file, applied to every (re)loaded
+        # company (see apply)
+        self.updateColumns = {}
+        # name: cacheId of the company the update file was last applied to,
+        # an id so evicted companies can still be freed
+        self.updated = {}
+
+    # Remembers the current end of a csv file, rows after it are new
+    # A line that is still being written counts as new
+    def watchFile(self, path):
+        companies, dataStart = readCSVHeader(path)
+        size = os.path.getsize(path)
+        tail = readBytes(path, max(dataStart, size - tailCheckBytes), size)
+        if b"\n" in tail:
+            partial = len(tail) - tail.rindex(b"\n") - 1
+            size -= partial
+            tail = tail[: len(tail) - partial]
+        self.files[path] = (companies, dataStart, size, tail)
+
+    # Returns [{company name: columns}] of the rows added to the csv files
+    # since the last call
+    def readDataFiles(self):
+        updates = []
+        for fileName in fileNamesInDir(self.dirName):
+            path = os.path.join(self.dirName, fileName)
+            watched = self.files.get(path)
+            size = os.path.getsize(path)
+            if watched is not None and watched[2] == size:
+                continue
+
+            if watched is not None and size > watched[2]:
+                companies, dataStart, end, tail = watched
+                text = readBytes(path, end - len(tail), size)
+                if text.startswith(tail):
+                    text = text[len(tail):]
+                    # Only complete lines, the rest may still be written
+                    if b"\n" not in text:
+                        continue
+                    text = text[:text.rindex(b"\n") + 1]
+                    lines = text.decode("utf-8").splitlines()
+                    updates.append(convertRows(csv.reader(lines), companies,
+                                               self.categoryLength))
+                    self.files[path] = (companies, dataStart, end + len(text),
+                                        (tail + text)[-tailCheckBytes:])
+                    continue
+
+            # New or rewritten, read as a whole
+            fileData = loadStockFiles([path], self.categoryLength, workers=1)
+            updates.append({name: company.columns
+                            for name, company in fileData[path].items()})
+            self.watchFile(path)
+        return updates
+
+    # Reads the update files that are new or changed since the last call
+    def readUpdateFiles(self):
+        if not os.path.isdir(self.updateDir):
+            return
+        for fileName in fileNamesInDir(self.updateDir):
+            path = os.path.join(self.updateDir, fileName)
+            info = os.stat(path)
+            if self.updateFiles.get(path) == (info.st_size, info.st_mtime_ns):
+                continue
+            self.updateFiles[path] = (info.st_size, info.st_mtime_ns)
+
+            name = os.path.splitext(fileName)[0]
+            try:
+                self.updateColumns[name] = readUpdateFile(path, name)
+            except ValueError as error:
+                print(f"Skipping update file {path}: {error}")
+                continue
+            self.updated.pop(name, None)
+
+    # Appends everything new to the loaded companies of companies (a dict
+    # or LazyCompanies), companies that are not loaded read the new rows
+    # themselves when they are
+    # Companies companies does not have yet are added to it
+    # Returns {company name: appended rows}, all rows for added companies
+    def apply(self, companies):
+        isLoaded = getattr(companies, "isLoaded", lambda name: True)
+        addCompany = getattr(companies, "add", None) or companies.__setitem__
+        appended = {}
+
+        def append(name, columns):
+            try:
+                if name in companies:
+                    rows = companies[name].appendColumns(*columns)
+                else:
+                    # Copied, the columns of update files are kept
+                    company = Company.fromColumns(
+                        name, name, *[array(typecode(column), column)
+                                      for column in columns])
+                    rows = len(company)
+                    if rows:
+                        addCompany(name, company)
+            except ValueError as error:
+                print(f"Skipping new rows of {name}: {error}")
+                return
+            if rows:
+                appended[name] = appended.get(name, 0) + rows
+
+        for fileUpdates in self.readDataFiles():
+            for name, columns in fileUpdates.items():
+                if name not in companies or isLoaded(name):
+                    append(name, columns)
+
+        self.readUpdateFiles()
+        for name, columns in self.updateColumns.items():
+            if name in companies and (
+                    not isLoaded(name)
+                    or self.updated.get(name) == companies[name].cacheId):
+                continue
+            append(name, columns)
+            if name in companies:
+                self.updated[name] = companies[name].cacheId
+
+        return appended
@@ -0,0 +1,23 @@
+# Helpers shared by the tests
+# The synthetic market data of the benchmarks (benchmarks/synthetic.py)
+# stands in for real Yahoo Finance exports
+import os
+import sys
+
+repoRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoRoot, "benchmarks"))
+
+from synthetic import syntheticUniverse, writeSyntheticCSV
+from stockmodel import Company
+
+# Returns {name: Company} of a synthetic universe
+def syntheticCompanies(count, years, seed=0):
+    return {name: Company.fromColumns(name, name, *columns, verify=False)
+            for name, columns in syntheticUniverse(count, years,
+                                                   seed).items()}
+
+# Writes a synthetic universe as a csv file, returns the universe
+def writeUniverse(path, count=3, years=0.5, seed=0):
+    universe = syntheticUniverse(count, years, seed)
+    writeSyntheticCSV(path, universe)
+    return universe
@@ -0,0 +1,275 @@
+# Tests of the selection analytics (stockanalytics)
+import math
+import random
+import statistics
+from array import array
+
+import pytest
+
+from stockmodel import Company
+from stockanalytics import (AlignedSeries, SlidingCorrelation,
+                            evaluateCompanies, midpoint, screenCorrelations)
+from tests.helpers import syntheticCompanies
+
+# Returns a copy of company without a random tenth of its days
+def withGaps(company, seed):
+    rng = random.Random(seed)
+    keep = [idx for idx in range(len(company)) if rng.random() > 0.1]
+    return Company.fromColumns(company.name, company.ticker, *[
+        array(column.typecode, [column[idx] for idx in keep])
+        for column in company.columns], verify=False)
+
+# Counts the rebuilds, so the test knows both paths ran
+class CountingCorrelation(SlidingCorrelation):
+    rebuilds = 0
+
+    def rebuild(self, first, last):
+        self.rebuilds += 1
+        super().rebuild(first, last)
+
+def testSlidingCorrelationFollowsDraggedWindow():
+    companies = syntheticCompanies(4, 3, seed=5)
+    companies["T0001"] = withGaps(companies["T0001"], 1)
+    companies["T0003"] = withGaps(companies["T0003"], 2)
+    names = list(companies)
+    aligned = AlignedSeries.align([
+        (company.dates, array("d", map(midpoint, company.opens,
+                                       company.closes)))
+        for company in companies.values()])
+    calendar = aligned.calendar
+    sliding = CountingCorrelation(aligned)
+
+    rng = random.Random(0)
+    first, last = 100, 160
+    incremental = 0
+    for _ in range(300):
+        if rng.random() < 0.1:
+            # Far past the rebuild threshold
+            first = rng.randrange(1, len(calendar) - 40)
+            last = first + rng.randrange(2, 300)
+        else:
+            shift = rng.randint(-3, 3)
+            first += shift
+            last += shift + rng.randint(-2, 2)
+        first = max(1, min(first, len(calendar) - 3))
+        last = max(first + 1, min(last, len(calendar) - 1))
+
+        rebuilds = sliding.rebuilds
+        sliding.setWindow(first, last)
+        incremental += sliding.rebuilds == rebuilds
+
+        # The days strictly between two ordinals are the window
+        expected, _ = evaluateCompanies(companies, names, calendar[first - 1],
+                                        calendar[last])
+        for row, expectedRow in zip(sliding.correlationMatrix(), expected):
+            for value, expectedValue in zip(row, expectedRow):
+                assert abs(value - expectedValue) < 1e-7
+
+    assert incremental > 100 and sliding.rebuilds > 10
+
+# Pearson correlation of the daily close returns of two companies over the
+# days both traded in [leftOrdinal, rightOrdinal], None below minDays
+def referenceScreenCorrelation(target, company, leftOrdinal, rightOrdinal,
+                               minDays):
+    closes = {day: close for day, close in zip(target.dates, target.closes)
+              if leftOrdinal <= day <= rightOrdinal}
+    shared = [(closes[day], close)
+              for day, close in zip(company.dates, company.closes)
+              if day in closes]
+    x = [b[0] / a[0] for a, b in zip(shared, shared[1:])]
+    y = [b[1] / a[1] for a, b in zip(shared, shared[1:])]
+    if len(y) < minDays or max(y, default=0) - min(y, default=0) < 1e-9:
+        return None
+    return statistics.correlation(x, y), len(y)
+
+def testScreenMatchesPairwiseCorrelation():
+    companies = syntheticCompanies(12, 4, seed=7)
+    for idx, name in enumerate(["T0002", "T0005", "T0009"]):
+        companies[name] = withGaps(companies[name], idx)
+    flat = companies["T0004"]
+    companies["T0004"] = Company.fromColumns(
+        "T0004", "T0004", flat.dates, *[array("d", [1.0]) * len(flat)] * 6,
+        verify=False)
+    # Started trading inside the window, with enough and too few days
+    for name, days in (("LATE", 150), ("NEW", 60)):
+        company = companies["T0001"]
+        companies[name] = Company.fromColumns(
+            name, name, *[column[-days:] for column in company.columns],
+            verify=False)
+    target = companies["T0000"]
+    leftOrdinal, rightOrdinal = target.dates[-250], target.dates[-20]
+
+    # The target's returns in the window set the least shared days
+    targetDays = sum(leftOrdinal <= day <= rightOrdinal
+                     for day in target.dates)
+    minDays = max(20, int((targetDays - 1) * 0.5))
+    expected = []
+    for name, company in companies.items():
+        if name == "T0000":
+            continue
+        result = referenceScreenCorrelation(target, company, leftOrdinal,
+                                            rightOrdinal, minDays)
+        if result is not None:
+            expected.append((name,) + result)
+    expected.sort(key=lambda result: -result[1])
+    assert "LATE" in [name for name, _, _ in expected]
+    assert "NEW" not in [name for name, _, _ in expected]
+
+    top = screenCorrelations(companies, "T0000", leftOrdinal, rightOrdinal,
+                             count=len(companies))
+    assert [(name, days) for name, _, days in top] == \
+        [(name, days) for name, _, days in expected]
+    for (_, r, _), (_, reference, _) in zip(top, expected):
+        assert r == pytest.approx(reference, abs=1e-9)
+
+    strongest = screenCorrelations(companies, "T0000", leftOrdinal,
+                                   rightOrdinal, count=3, key=abs)
+    expected.sort(key=lambda result: -abs(result[1]))
+    assert [name for name, _, _ in strongest] == \
+        [name for name, _, _ in expected[:3]]
+
+# The per pair correlation of the original evaluation: 0 without shared
+# days or when a series is constant
+def referenceCorrelation(xs, ys):
+    if not xs:
+        return 0
+    mean1 = sum(xs) / len(xs)
+    mean2 = sum(ys) / len(ys)
+    numerator = sum((x - mean1) * (y - mean2) for x, y in zip(xs, ys))
+    denominator = math.sqrt(sum((x - mean1) ** 2 for x in xs)
+                            * sum((y - mean2) ** 2 for y in ys))
+    if denominator == 0:
+        return 0
+    return numerator / denominator
+
+# Midpoints of open and close on the shared days strictly inside the
+# selection, one pair of companies at a time
+def referenceMatrix(companies, names, leftOrdinal, rightOrdinal):
+    midpoints = {name: {day: (open + close) / 2 for day, open, close in
+                        zip(company.dates, company.opens, company.closes)
+                        if leftOrdinal < day < rightOrdinal}
+                 for name, company in companies.items()}
+    matrix = []
+    for name1 in names:
+        row = []
+        for name2 in names:
+            if name1 == name2:
+                row.append(1.0)
+                continue
+            shared = [day for day in midpoints[name1]
+                      if day in midpoints[name2]]
+            row.append(referenceCorrelation(
+                [midpoints[name1][day] for day in shared],
+                [midpoints[name2][day] for day in shared]))
+        matrix.append(row)
+    return matrix
+
+# A copy of company with every price set to price
+def flatCompany(company, price):
+    return Company.fromColumns(
+        company.name, company.ticker, company.dates,
+        *[array("d", [price]) * len(company)] * 5, company.volumes,
+        verify=False)
+
+# A copy of the rows of company in [first, last)
+def rowsOf(company, first, last):
+    return Company.fromColumns(
+        company.name, company.ticker,
+        *[column[first:last] for column in company.columns], verify=False)
+
+def testCorrelationMatrixMatchesPairwiseCorrelation():
+    companies = syntheticCompanies(8, 4, seed=11)
+    names = list(companies)
+    companies["T0001"] = withGaps(companies["T0001"], 3)
+    companies["T0002"] = withGaps(withGaps(companies["T0002"], 4), 5)
+    companies["T0003"] = flatCompany(companies["T0003"], 12.5)
+    reference = companies["T0000"]
+    # Trades only before, only at the end of and not at all in windows
+    companies["T0004"] = rowsOf(reference, 0, 40)
+    companies["T0005"] = rowsOf(reference, len(reference) - 30,
+                                len(reference))
+    companies["T0006"] = rowsOf(reference, 0, 0)
+
+    dates = reference.dates
+    windows = [(dates[-200], dates[-10]), (dates[0] - 30, dates[20]),
+               (dates[100], dates[103]), (dates[-1] - 10, dates[-1] + 10),
+               (dates[-1] + 5, dates[-1] + 50)]
+    for leftOrdinal, rightOrdinal in windows:
+        matrix, _ = evaluateCompanies(companies, names, leftOrdinal,
+                                      rightOrdinal)
+        expected = referenceMatrix(companies, names, leftOrdinal,
+                                   rightOrdinal)
+        for row, expectedRow in zip(matrix, expected, strict=True):
+            assert row == pytest.approx(expectedRow, abs=1e-9)
+    # Pairs without shared days and the constant series are 0
+    matrix, _ = evaluateCompanies(companies, names, *windows[0])
+    assert matrix[4][5] == matrix[0][3] == matrix[0][6] == 0.0
+
+def testConstantSeriesCorrelateWithNothing():
+    companies = syntheticCompanies(2, 2, seed=12)
+    companies["T0001"] = flatCompany(companies["T0001"], 0.1)
+    dates = companies["T0001"].dates
+    matrix, _ = evaluateCompanies(companies, list(companies), dates[0] - 1,
+                                  dates[-1] + 1)
+    assert matrix == [[1.0, 0.0], [0.0, 1.0]]
+
+# The statistics of the original evaluation, walking the rows: None (N/A)
+# without a row after the selection or with the first row more than 4
+# days after its start
+def referenceStats(company, leftOrdinal, rightOrdinal):
+    dates = list(company.dates)
+    firstIdx = next((idx for idx, day in enumerate(dates)
+                     if day >= leftOrdinal), None)
+    lastIdx = next((idx for idx, day in enumerate(dates)
+                    if day > rightOrdinal), None)
+    if (firstIdx is None or lastIdx is None
+            or dates[firstIdx] - leftOrdinal > 4 or lastIdx == firstIdx):
+        return None
+    rows = range(firstIdx, lastIdx)
+    gaps = [company.closes[idx] - company.opens[idx] for idx in rows]
+    gapMean = sum(gaps) / len(gaps)
+    return [(company.opens[lastIdx] - company.opens[firstIdx])
+            / ((lastIdx - firstIdx) * 7 / 5),
+            sum(company.volumes[idx] for idx in rows) / len(gaps),
+            math.sqrt(sum((gap - gapMean) ** 2 for gap in gaps) / len(gaps)),
+            sum(abs(gap) for gap in gaps) / len(gaps)]
+
+def testCompanyStatsMatchTheRowByRowStats():
+    companies = syntheticCompanies(4, 4, seed=13)
+    companies["T0001"] = withGaps(companies["T0001"], 6)
+    companies["T0002"] = flatCompany(companies["T0002"], 3.0)
+    company = companies["T0000"]
+    dates = company.dates
+    rng = random.Random(4)
+    windows = [sorted(rng.sample(range(dates[0] - 20, dates[-1] + 20), 2))
+               for _ in range(200)]
+    windows += [(dates[0], dates[1]), (dates[5], dates[5]),
+                (dates[-2], dates[-1]), (dates[-1], dates[-1] + 3),
+                (dates[0] - 5, dates[10]), (dates[0] - 4, dates[10])]
+    seen = set()
+    for leftOrdinal, rightOrdinal in windows:
+        _, stats = evaluateCompanies(companies, list(companies), leftOrdinal,
+                                     rightOrdinal)
+        for name, values in zip(companies, stats, strict=True):
+            expected = referenceStats(companies[name], leftOrdinal,
+                                      rightOrdinal)
+            seen.add(expected is None)
+            if expected is None:
+                assert values is None, (name, leftOrdinal, rightOrdinal)
+            else:
+                assert values == pytest.approx(expected, rel=1e-9, abs=1e-6)
+    assert seen == {True, False}
+
+def testStatsOutsideTheHistoryAreNA():
+    company = syntheticCompanies(1, 1, seed=14)["T0000"]
+    dates = company.dates
+    companies = {"A": company}
+    # Before, after and too long before the first row, no row after it,
+    # only the row after it
+    for window in [(dates[0] - 40, dates[0] - 10), (dates[-1] + 1,
+                                                    dates[-1] + 30),
+                   (dates[0] - 5, dates[3]), (dates[-5], dates[-1]),
+                   (dates[10] + 1, dates[11] - 1)]:
+        assert evaluateCompanies(companies, ["A"], *window)[1] == [None]
+    assert evaluateCompanies(companies, ["A"], dates[0] - 4,
+                             dates[3])[1] != [None]
@@ -0,0 +1,99 @@
+# Tests of the headless batch analysis (stockbatch)
+import csv
+import json
+import math
+from datetime import date
+
+import pytest
+
+import stockbatch
+from stockcache import loadCachedDirectory
+from stockanalytics import evaluateCompanies, screenCorrelations
+from tests.helpers import writeUniverse
+
+window = (date(2022, 6, 1).toordinal(), date(2023, 3, 1).toordinal())
+windowText = "2022-06-01:2023-03-01"
+
+@pytest.fixture
+def dataDir(tmp_path):
+    (tmp_path / "data").mkdir()
+    writeUniverse(tmp_path / "data" / "a.csv", count=8, years=2, seed=6)
+    return tmp_path / "data"
+
+def readCSV(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+# The count pairs with the largest absolute correlation, straight from the
+# full matrix
+def referencePairs(dataDir, count):
+    data = loadCachedDirectory(str(dataDir), workers=1)
+    names = list(data)
+    matrix, _ = evaluateCompanies(data, names, *window)
+    pairs = sorted(((abs(matrix[i][j]), i, j) for i in range(len(names))
+                    for j in range(i + 1, len(names))
+                    if not math.isnan(matrix[i][j])), reverse=True)
+    return names, matrix, [(names[i], names[j], matrix[i][j])
+                           for _, i, j in pairs[:count]]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def testCSVPairs(dataDir, tmp_path, workers):
+    out = tmp_path / "out"
+    stockbatch.main(["--data", str(dataDir), "--all", "--window", windowText,
+                     "--pairs", "5", "--out", str(out),
+                     "--workers", str(workers)])
+    names, matrix, pairs = referencePairs(dataDir, 5)
+    prefix = "2022-06-01_2023-03-01_"
+
+    rows = readCSV(out / (prefix + "pairs.csv"))
+    assert rows[0] == ["ticker1", "ticker2", "correlation"]
+    assert [(a, b, float(r)) for a, b, r in rows[1:]] == pytest.approx(pairs)
+
+    rows = readCSV(out / (prefix + "correlation.csv"))
+    assert rows[0] == [""] + names
+    for name, row, expected in zip(names, rows[1:], matrix):
+        assert row[0] == name
+        assert [float(value) for value in row[1:]] == pytest.approx(
+            expected, nan_ok=True)
+
+def testJSONPairs(dataDir, tmp_path):
+    out = tmp_path / "out"
+    stockbatch.main(["--data", str(dataDir), "--all", "--window", windowText,
+                     "--pairs", "3", "--format", "json", "--out", str(out),
+                     "--workers", "1"])
+    names, matrix, pairs = referencePairs(dataDir, 3)
+    with open(out / "evaluation.json") as f:
+        result, = json.load(f)
+    assert result["tickers"] == names
+    for row, expected in zip(result["correlation"], matrix, strict=True):
+        assert row == pytest.approx(expected, nan_ok=True)
+    assert [(*pair["tickers"], pair["correlation"])
+            for pair in result["pairs"]] == pytest.approx(pairs)
+
+def testNoPairsByDefault(dataDir, tmp_path):
+    out = tmp_path / "out"
+    stockbatch.main(["--data", str(dataDir), "--all", "--window", windowText,
+                     "--out", str(out), "--workers", "1"])
+    assert not list(out.glob("*pairs.csv"))
+
+@pytest.mark.parametrize("workers", [1, 2])
+def testScreenWindowsMatchScreenCorrelations(dataDir, tmp_path, workers):
+    out = tmp_path / "out"
+    windows = ["2022-06-01:2023-03-01", "2022-01-03:2022-09-01",
+               "2021-06-01:2022-06-01"]
+    stockbatch.main(["--data", str(dataDir), "--screen", "T0002", "--top",
+                     "4", "--format", "json", "--out", str(out),
+                     "--workers", str(workers)]
+                    + [argument for text in windows
+                       for argument in ("--window", text)])
+    data = loadCachedDirectory(str(dataDir), workers=1)
+    with open(out / "screen.json") as f:
+        results = json.load(f)
+    assert [(result["start"], result["end"]) for result in results] == \
+        [tuple(text.split(":")) for text in windows]
+    for result, text in zip(results, windows):
+        window = map(stockbatch.parseDate, text.split(":"))
+        expected = screenCorrelations(data, "T0002", *window, 4)
+        assert expected
+        assert [(top["ticker"], top["correlation"], top["days"])
+                for top in result["top"]] == pytest.approx(expected)
@@ -0,0 +1,107 @@
+# Tests of the binary cache invalidation (stockcache)
+import os
+import json
+
+import pytest
+
+from stockcache import loadCachedDirectory
+from tests.helpers import writeUniverse
+
+# Loads dirName through the cache, returns ({name: closes}, stats)
+def load(dirName):
+    stats = {}
+    data = loadCachedDirectory(str(dirName), workers=1, stats=stats)
+    return {name: list(company.closes) for name, company in data.items()}, stats
+
+def binFiles(dirName):
+    return sorted(name for name in os.listdir(dirName / ".cache")
+                  if name.endswith(".bin"))
+
+# Moves the modification time of path by seconds
+def touch(path, seconds=10):
+    info = os.stat(path)
+    os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + seconds * 10**9))
+
+# Replaces the last digit of the first close with another one, the file
+# keeps its size
+def editInPlace(path):
+    with open(path, "rb") as f:
+        lines = f.read().split(b"\n")
+    cells = lines[2].split(b",")
+    close = cells[4].decode()
+    cells[4] = (close[:-1] + ("1" if close[-1] != "1" else "2")).encode()
+    lines[2] = b",".join(cells)
+    with open(path, "wb") as f:
+        f.write(b"\n".join(lines))
+    return cells[4].decode()
+
+@pytest.fixture
+def dataDir(tmp_path):
+    writeUniverse(tmp_path / "a.csv", seed=1)
+    return tmp_path
+
+def testWarmLoadUsesTheCache(dataDir):
+    cold, coldStats = load(dataDir)
+    warm, warmStats = load(dataDir)
+    assert coldStats["parsedFiles"] == 1
+    assert warmStats["cachedFiles"] == 1 and warmStats["parsedFiles"] == 0
+    assert warm == cold
+
+def testChangedSizeIsParsed(dataDir):
+    load(dataDir)
+    writeUniverse(dataDir / "a.csv", count=2, seed=2)
+    data, stats = load(dataDir)
+    assert stats["parsedFiles"] == 1
+    assert len(data) == 2
+
+def testTouchedFileIsNotParsed(dataDir):
+    before, _ = load(dataDir)
+    touch(dataDir / "a.csv")
+    data, stats = load(dataDir)
+    assert stats["parsedFiles"] == 0
+    assert data == before
+    # The new mtime is remembered, the hash is not read again
+    with open(dataDir / ".cache" / "manifest.json") as f:
+        entry = json.load(f)["files"]["a.csv"]
+    assert entry["mtime"] == os.stat(dataDir / "a.csv").st_mtime_ns
+
+def testSameSizeNewContentIsParsed(dataDir):
+    before, _ = load(dataDir)
+    size = os.path.getsize(dataDir / "a.csv")
+    mtime = os.stat(dataDir / "a.csv").st_mtime_ns
+    price = editInPlace(dataDir / "a.csv")
+    assert os.path.getsize(dataDir / "a.csv") == size
+    os.utime(dataDir / "a.csv", ns=(mtime, mtime + 10**9))
+    data, stats = load(dataDir)
+    assert stats["parsedFiles"] == 1
+    name = next(iter(data))
+    assert data[name][0] == float(price) != before[name][0]
+
+@pytest.mark.parametrize("field, value", [("version", -1),
+                                          ("byteorder", "middle")])
+def testOtherManifestIsIgnored(dataDir, field, value):
+    load(dataDir)
+    path = dataDir / ".cache" / "manifest.json"
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest[field] = value
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+    _, stats = load(dataDir)
+    assert stats["parsedFiles"] == 1
+
+def testStaleCacheFilesAreRemoved(dataDir):
+    load(dataDir)
+    old = binFiles(dataDir)
+    writeUniverse(dataDir / "a.csv", count=2, seed=2)
+    load(dataDir)
+    new = binFiles(dataDir)
+    assert len(new) == 1 and new != old
+
+    writeUniverse(dataDir / "b.csv", count=1, seed=3)
+    load(dataDir)
+    assert len(binFiles(dataDir)) == 2
+    os.remove(dataDir / "b.csv")
+    data, _ = load(dataDir)
+    assert binFiles(dataDir) == new
+    assert len(data) == 2
@@ -0,0 +1,137 @@
+# Tests of the date to index mapping of the graph (stockmodel.DateMapper)
+import random
+from array import array
+from datetime import datetime, timedelta
+
+import pytest
+
+from stockmodel import DateMapper, tradingDays
+from tests.helpers import syntheticCompanies
+
+origin = datetime(2010, 1, 1)
+
+# The day by day mapper DateMapper replaced, each date is stored once it
+# is reached by walking from the origin
+class WalkingDateMapper:
+    def __init__(self, originDate):
+        self.datemap = {originDate: 0}
+        self.reverseMap = {0: originDate}
+        self.oldestDate = originDate
+        self.newestDate = originDate
+
+    def getDateIndex(self, targetDate):
+        if targetDate > self.newestDate:
+            prev = self.datemap[self.newestDate]
+            while self.newestDate < targetDate:
+                self.newestDate += timedelta(1)
+                while self.newestDate.weekday() >= 5:
+                    self.newestDate += timedelta(1)
+                prev += 1
+                self.datemap[self.newestDate] = prev
+                self.reverseMap[prev] = self.newestDate
+            return prev
+
+        if targetDate < self.oldestDate:
+            prev = self.datemap[self.oldestDate]
+            while self.oldestDate > targetDate:
+                self.oldestDate -= timedelta(1)
+                while self.oldestDate.weekday() >= 5:
+                    self.oldestDate -= timedelta(1)
+                prev -= 1
+                self.datemap[self.oldestDate] = prev
+                self.reverseMap[prev] = self.oldestDate
+            return prev
+
+        while targetDate not in self.datemap:
+            targetDate += timedelta(1)
+        return self.datemap[targetDate]
+
+def days(first, last):
+    return [first + timedelta(offset) for offset in range((last - first).days)]
+
+def testWeekdaysMatchTheWalkingMapper():
+    walking = WalkingDateMapper(origin)
+    # Reaching both ends first, every date in between is then stored
+    walking.getDateIndex(datetime(2006, 1, 2))
+    walking.getDateIndex(datetime(2014, 12, 31))
+    mapper = DateMapper(origin)
+    for day in days(datetime(2006, 1, 2), datetime(2014, 12, 31)):
+        index = mapper.getDateIndex(day)
+        assert index == walking.getDateIndex(day), day
+        if day.weekday() < 5:
+            assert mapper.getDateFromIndex(index) == day
+            assert walking.reverseMap[index] == day
+
+# The walking mapper mapped a weekend it reached walking back from its
+# oldest date to the Friday before, every other weekend to the Monday
+# after. DateMapper maps every weekend to the Monday after
+def testWeekendsBeforeTheOldestDateMapToMonday():
+    mapper = DateMapper(origin)
+    saturday = datetime(2009, 12, 26)
+    monday = datetime(2009, 12, 28)
+    assert WalkingDateMapper(origin).getDateIndex(saturday) == \
+        WalkingDateMapper(origin).getDateIndex(monday) - 1
+    assert mapper.getDateIndex(saturday) == mapper.getDateIndex(monday)
+    assert mapper.getDateIndex(saturday + timedelta(1)) == \
+        mapper.getDateIndex(monday)
+    assert mapper.getDateFromIndex(mapper.getDateIndex(saturday)) == monday
+    assert mapper.getDateIndex(origin) == 0
+
+@pytest.fixture
+def calendar():
+    companies = syntheticCompanies(5, 3, seed=9)
+    calendar = tradingDays(companies.values())
+    # Holidays every company skipped
+    rng = random.Random(1)
+    return array("q", [day for day in calendar if rng.random() > 0.05])
+
+def testTradingCalendarRoundTrip(calendar):
+    mapper = DateMapper(origin, calendar)
+    indices = [mapper.ordinalIndex(day) for day in calendar]
+    assert indices == list(range(indices[0], indices[0] + len(calendar)))
+    assert [mapper.indexOrdinal(index) for index in indices] == list(calendar)
+    # A fractional x maps to the day it is drawn on
+    assert [mapper.indexOrdinal(index + 0.5) for index in indices] == \
+        list(calendar)
+
+def testIndicesGrowWithTheDate(calendar):
+    mapper = DateMapper(origin, calendar)
+    ordinals = range(calendar[0] - 60, calendar[-1] + 60)
+    indices = [mapper.ordinalIndex(ordinal) for ordinal in ordinals]
+    assert all(a <= b for a, b in zip(indices, indices[1:]))
+    # Days off map to the next trading day, outside the calendar the next
+    # weekday
+    for ordinal, index in zip(ordinals, indices):
+        day = mapper.indexOrdinal(index)
+        assert day >= ordinal
+        assert mapper.ordinalIndex(day) == index
+        if calendar[0] <= ordinal <= calendar[-1]:
+            assert day in calendar
+    back = [mapper.indexOrdinal(index)
+            for index in range(indices[0] - 30, indices[-1] + 30)]
+    assert all(a < b for a, b in zip(back, back[1:]))
+
+def testExtendedCalendarKeepsKnownIndices(calendar):
+    head, tail = calendar[:-40], calendar[-40:]
+    mapper = DateMapper(origin, head)
+    before = [mapper.ordinalIndex(day) for day in head]
+    mapper.extendCalendar(tail)
+    assert [mapper.ordinalIndex(day) for day in head] == before
+    assert [mapper.indexOrdinal(mapper.ordinalIndex(day))
+            for day in calendar] == list(calendar)
+
+# Indices of days past the calendar come from weekdays until the calendar
+# reaches them, cached indices must follow
+def testExtendingTheCalendarRefreshesDayIndices(calendar):
+    companies = syntheticCompanies(1, 1, seed=3)
+    company, = companies.values()
+    head = array("q", [day for day in calendar if day < company.dates[-30]])
+    mapper = DateMapper(origin, head)
+    before = company.dayIndices(mapper)
+    assert list(before) == [mapper.ordinalIndex(day) for day in company.dates]
+    # The extension skips a weekday the company traded on
+    mapper.extendCalendar(day for day in company.dates[-30:]
+                          if day != company.dates[-20])
+    after = company.dayIndices(mapper)
+    assert list(after) == [mapper.ordinalIndex(day) for day in company.dates]
+    assert list(after) != list(before)
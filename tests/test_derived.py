@@ -0,0 +1,73 @@
+# Tests of the cache of derived series (stockderived)
+import gc
+
+from stockderived import DerivedCache, derivedCache
+from stockanalytics import AlignedSeries
+from tests.helpers import syntheticCompanies
+
+class Sized:
+    def __init__(self, size):
+        self.size = size
+
+    def byteSize(self):
+        return self.size
+
+def testEntriesOfSeveralOwnersGoWithTheFirstOne():
+    cache = DerivedCache()
+    cache.get("a", lambda: Sized(10), 1)
+    cache.get("ab", lambda: Sized(20), 1, 2)
+    cache.get("b", lambda: Sized(30), 2)
+    assert sorted(key for key, _ in cache.ownedItems(2)) == ["ab", "b"]
+
+    cache.dropOwner(1)
+    assert set(cache.entries) == {"b"}
+    assert cache.owners == {2: {"b"}}
+    assert cache.usedBytes == 30
+
+def testEvictedEntriesLeaveEveryOwner():
+    cache = DerivedCache(budget=25)
+    cache.get("ab", lambda: Sized(20), 1, 2)
+    cache.get("c", lambda: Sized(20), 3)
+    assert set(cache.entries) == {"c"}
+    assert cache.owners == {3: {"c"}}
+
+def testClearStartsTheCountersAgain():
+    cache = DerivedCache(budget=15)
+    for key in "aab":
+        cache.get(key, lambda: Sized(10))
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 1)
+    cache.clear()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"],
+            stats["entries"], stats["bytes"]) == (0, 0, 0, 0, 0)
+    assert cache.inflation == 0.0
+
+def alignedKey(companies):
+    return ("aligned",) + tuple((company.cacheId, len(company))
+                                for company in companies)
+
+def testAlignedSelectionsAreDroppedWithTheirCompanies():
+    companies = list(syntheticCompanies(3, 1, seed=5).values())
+    key = alignedKey(companies[:2])
+    derivedCache.get(key, lambda: AlignedSeries.align(
+        [(company.dates, company.closes) for company in companies[:2]]),
+        *[company.cacheId for company in companies[:2]])
+    assert key in derivedCache.entries
+
+    # Appended rows make the shared entry stale
+    other = alignedKey(companies[1:])
+    derivedCache.get(other, lambda: AlignedSeries.align(
+        [(company.dates, company.closes) for company in companies[1:]]),
+        *[company.cacheId for company in companies[1:]])
+    companies[2].movingAverage(5)
+    last = companies[2]
+    last.appendColumns(*[[value] for value in
+                         (last.dates[-1] + 1, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0)])
+    assert other not in derivedCache.entries
+    assert len(last.movingAverage(5)) == len(last)
+
+    cacheId = companies[0].cacheId
+    del companies[0]
+    gc.collect()
+    assert key not in derivedCache.entries
+    assert cacheId not in derivedCache.owners
@@ -0,0 +1,148 @@
+# Tests of the technical indicators (stockindicators) against plain
+# definitions calculated day by day
+import math
+import random
+from array import array
+
+import pytest
+
+from stockmodel import Company
+from stockindicators import indicatorTypes
+from tests.helpers import syntheticCompanies
+
+nan = math.nan
+
+def randomWalk(count, seed=0):
+    rng = random.Random(seed)
+    values, price = array("d"), 50.0
+    for _ in range(count):
+        price *= math.exp(rng.gauss(0, 0.02))
+        values.append(price)
+    return values
+
+def mean(values):
+    return math.fsum(values) / len(values)
+
+def referenceSMA(values, width):
+    return [mean(values[i - width + 1 : i + 1]) if i >= width - 1 else nan
+            for i in range(len(values))]
+
+def referenceEMA(values, width, offset=0):
+    result = [nan] * len(values)
+    seedIdx = offset + width - 1
+    if len(values) <= seedIdx:
+        return result
+    result[seedIdx] = mean(values[offset : seedIdx + 1])
+    alpha = 2 / (width + 1)
+    for i in range(seedIdx + 1, len(values)):
+        result[i] = result[i - 1] + alpha * (values[i] - result[i - 1])
+    return result
+
+def referenceWMA(values, width):
+    total = width * (width + 1) / 2
+    return [math.fsum((k + 1) * values[i - width + 1 + k]
+                      for k in range(width)) / total
+            if i >= width - 1 else nan for i in range(len(values))]
+
+def referenceBollinger(values, width, deviations):
+    middle, upper, lower = [], [], []
+    for i in range(len(values)):
+        if i < width - 1:
+            middle.append(nan), upper.append(nan), lower.append(nan)
+            continue
+        window = values[i - width + 1 : i + 1]
+        average = mean(window)
+        spread = deviations * math.sqrt(mean([(value - average) ** 2
+                                              for value in window]))
+        middle.append(average)
+        upper.append(average + spread)
+        lower.append(average - spread)
+    return {"middle": middle, "upper": upper, "lower": lower}
+
+def referenceRSI(values, width):
+    result = [nan] * len(values)
+    if len(values) <= width:
+        return result
+    changes = [values[i] - values[i - 1] for i in range(1, len(values))]
+    gain = mean([max(change, 0.0) for change in changes[:width]])
+    loss = mean([max(-change, 0.0) for change in changes[:width]])
+    for i in range(width, len(values)):
+        if i > width:
+            gain += (max(changes[i - 1], 0.0) - gain) / width
+            loss += (max(-changes[i - 1], 0.0) - loss) / width
+        result[i] = 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+    return result
+
+def referenceMACD(values, fast, slow, signal):
+    macd = list(map(lambda a, b: a - b, referenceEMA(values, fast),
+                    referenceEMA(values, slow)))
+    signals = referenceEMA(macd, signal, max(fast, slow) - 1)
+    return {"macd": macd, "signal": signals,
+            "histogram": list(map(lambda a, b: a - b, macd, signals))}
+
+# (kind, parameters, reference lines of values)
+cases = [
+    ("sma", (1,), lambda values: {"sma": list(values)}),
+    ("sma", (20,), lambda values: {"sma": referenceSMA(values, 20)}),
+    ("ema", (1,), lambda values: {"ema": list(values)}),
+    ("ema", (12,), lambda values: {"ema": referenceEMA(values, 12)}),
+    ("wma", (9,), lambda values: {"wma": referenceWMA(values, 9)}),
+    ("bollinger", (20, 2), lambda values: referenceBollinger(values, 20, 2)),
+    ("rsi", (14,), lambda values: {"rsi": referenceRSI(values, 14)}),
+    ("macd", (12, 26, 9), lambda values: referenceMACD(values, 12, 26, 9)),
+    ("macd", (26, 12, 9), lambda values: referenceMACD(values, 26, 12, 9)),
+]
+
+def assertLines(indicator, expected, tolerance=1e-9):
+    assert set(indicator.lines) == set(expected)
+    for name, line in indicator.lines.items():
+        assert len(line) == len(expected[name]), name
+        for day, (value, reference) in enumerate(zip(line, expected[name])):
+            if math.isnan(reference):
+                assert math.isnan(value), (name, day)
+            else:
+                assert value == pytest.approx(reference, rel=tolerance,
+                                              abs=tolerance), (name, day)
+
+def caseId(case):
+    return f"{case[0]}{case[1]}"
+
+@pytest.mark.parametrize("case", cases, ids=map(caseId, cases))
+@pytest.mark.parametrize("count", [0, 1, 5, 13, 14, 15, 33, 34, 300])
+def testOnePassMatchesReference(case, count):
+    kind, parameters, reference = case
+    values = randomWalk(count)
+    indicator = indicatorTypes[kind](*parameters)
+    indicator.extend(values)
+    assertLines(indicator, reference(values))
+
+@pytest.mark.parametrize("case", cases, ids=map(caseId, cases))
+def testSplitExtendMatchesOnePass(case):
+    kind, parameters, reference = case
+    values = randomWalk(400, seed=1)
+    rng = random.Random(2)
+    for _ in range(20):
+        splits = sorted(rng.sample(range(len(values) + 1), rng.randint(1, 6)))
+        indicator = indicatorTypes[kind](*parameters)
+        for split in splits + [len(values)]:
+            indicator.extend(values[:split])
+        onePass = indicatorTypes[kind](*parameters)
+        onePass.extend(values)
+        assertLines(indicator, onePass.lines, tolerance=1e-9)
+
+def testRisingPricesHaveRSIOf100():
+    indicator = indicatorTypes["rsi"](14)
+    indicator.extend(array("d", range(1, 40)))
+    assert list(indicator.lines["rsi"][14:]) == [100.0] * 25
+
+# The moving average used to start at the first close, now the days before
+# the first full window are nan and are not drawn
+def testMovingAverageStartsAtTheFirstFullWindow():
+    company = syntheticCompanies(1, 0.5)["T0000"]
+    average = company.movingAverage(10)
+    assert all(map(math.isnan, average[:9]))
+    assert average[9] == pytest.approx(mean(company.closes[:10]))
+    assert company.movingAverage(1) is company.closes
+    short = Company.fromColumns("S", "S", *[column[:5]
+                                           for column in company.columns])
+    assert all(map(math.isnan, short.movingAverage(10)))
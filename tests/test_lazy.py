@@ -0,0 +1,75 @@
+# Tests of loading companies on demand (stocklazy)
+import gc
+
+import pytest
+
+from stockcache import loadCachedDirectory
+from stockderived import derivedCache
+from stocklazy import LazyCompanies, companyBytes
+from tests.helpers import writeUniverse
+
+@pytest.fixture(params=[False, True], ids=["csv", "binary cache"])
+def dataDir(tmp_path, request):
+    writeUniverse(tmp_path / "a.csv", count=4, years=1, seed=1)
+    writeUniverse(tmp_path / "b.csv", count=6, years=1, seed=2)
+    if request.param:
+        loadCachedDirectory(str(tmp_path), workers=1)
+    return tmp_path
+
+def testLoadsLikeTheFullLoader(dataDir):
+    full = loadCachedDirectory(str(dataDir), cacheDir=str(dataDir / "x"),
+                               workers=1)
+    lazy = LazyCompanies(str(dataDir))
+    assert list(lazy) == list(full) and len(lazy) == len(full)
+    assert "T0003" in lazy and not lazy.isLoaded("T0003")
+    for name, company in full.items():
+        assert list(lazy[name].dates) == list(company.dates)
+        assert list(lazy[name].closes) == list(company.closes)
+
+def testLeastRecentlyUsedGoFirst(dataDir):
+    sizes = {name: companyBytes(company) for name, company in
+             LazyCompanies(str(dataDir)).items()}
+    names = ["T0000", "T0001", "T0002", "T0003"]
+    # Room for the first three
+    lazy = LazyCompanies(str(dataDir),
+                         memoryLimit=sum(sizes[name] for name in names[:3]))
+    for name in names[:3]:
+        lazy[name]
+    assert list(lazy.loaded) == names[:3]
+    # Used again, so T0001 is the least recently used one now
+    lazy["T0000"]
+    lazy["T0003"]
+    assert not lazy.isLoaded("T0001")
+    assert set(lazy.loaded) <= {"T0000", "T0002", "T0003"}
+    assert lazy.isLoaded("T0003")
+    assert lazy.loadedBytes == sum(sizes[name] for name in lazy.loaded)
+    assert lazy.loadedBytes <= lazy.memoryLimit
+
+def testPinnedCompaniesStay(dataDir):
+    pinned = {"T0000"}
+    lazy = LazyCompanies(str(dataDir), memoryLimit=1, pinned=pinned)
+    for name in ["T0000", "T0001", "T0002", "T0003", "T0004"]:
+        lazy[name]
+    # Over the cap, only the pinned and the most recent company are kept
+    assert list(lazy.loaded) == ["T0000", "T0004"]
+    pinned.clear()
+    lazy["T0005"]
+    assert list(lazy.loaded) == ["T0005"]
+
+def testReloadedCompaniesStartFresh(dataDir):
+    lazy = LazyCompanies(str(dataDir), memoryLimit=1)
+    company = lazy["T0001"]
+    average = list(company.movingAverage(5))
+    oldId = company.cacheId
+    assert derivedCache.ownedItems(oldId)
+    del company
+    lazy["T0002"]
+    gc.collect()
+    assert not lazy.isLoaded("T0001")
+    assert oldId not in derivedCache.owners
+
+    reloaded = lazy["T0001"]
+    assert reloaded.cacheId != oldId
+    assert not derivedCache.ownedItems(reloaded.cacheId)
+    assert list(reloaded.movingAverage(5)) == pytest.approx(average,
+                                                            nan_ok=True)
@@ -0,0 +1,89 @@
+# Tests of the bulk and parallel csv loading (stockloader) against the
+# row by row reader
+import pytest
+
+from stockloader import (readCSVrows, readCSVBulk, loadStockFiles,
+                         loadStockDirectory)
+from tests.helpers import writeUniverse
+
+# Replaces the cells of some rows of one company with "null" (days Yahoo
+# has no data for) in path, and with empty cells in referencePath
+def addNullRows(path, referencePath, companyIdx, rows, categoryLength=8):
+    with open(path, "rb") as f:
+        lines = f.read().split(b"\r\n")
+    references = list(lines)
+    offset = companyIdx * categoryLength
+    for row in rows:
+        if 2 + row >= len(lines):
+            break
+        cells = lines[2 + row].split(b",")
+        if len(cells) < offset + 7 or cells[offset + 1] == b"":
+            continue
+        references[2 + row] = b",".join(
+            cells[:offset] + [b""] * 7 + cells[offset + 7:])
+        cells[offset + 1 : offset + 7] = [b"null"] * 6
+        lines[2 + row] = b",".join(cells)
+    with open(path, "wb") as f:
+        f.write(b"\r\n".join(lines))
+    with open(referencePath, "wb") as f:
+        f.write(b"\r\n".join(references))
+
+def readReference(path):
+    with open(path, newline="") as f:
+        return readCSVrows(f, 8)
+
+def assertSameCompanies(companies, expected):
+    assert list(companies) == list(expected)
+    for name, company in companies.items():
+        assert len(company) == len(expected[name]), name
+        for column, reference in zip(company.columns,
+                                     expected[name].columns):
+            assert list(column) == list(reference), name
+
+@pytest.fixture
+def files(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    references = {}
+    for idx, count in enumerate([5, 1, 3]):
+        path = data / f"file{idx}.csv"
+        writeUniverse(path, count=count, years=1, seed=idx)
+        referencePath = tmp_path / f"reference{idx}.csv"
+        addNullRows(path, referencePath, count - 1, range(3, 100, 7))
+        assert b"null" in path.read_bytes()
+        references[str(path)] = readReference(referencePath)
+    return data, references
+
+def testBulkReaderMatchesRowReader(files):
+    _, references = files
+    for path, expected in references.items():
+        with open(path, newline="") as f:
+            stats = {}
+            assertSameCompanies(readCSVBulk(f, 8, stats), expected)
+        assert stats["rows"] == sum(map(len, expected.values()))
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("chunkBytes", [1, 97, 1000, 4 * 1024 * 1024])
+def testChunkedLoadingMatchesRowReader(files, workers, chunkBytes):
+    data, references = files
+    paths = sorted(references)
+    stats = {}
+    result = loadStockFiles(paths, 8, workers, chunkBytes, stats)
+    assert list(result) == paths
+    for path in paths:
+        assertSameCompanies(result[path], references[path])
+    assert stats["workers"] == workers
+
+def testLaterFilesReplaceCompanies(files):
+    data, references = files
+    stats = {}
+    totalData = loadStockDirectory(str(data), workers=2, chunkBytes=500,
+                                   stats=stats)
+    expected = {}
+    for path in sorted(references):
+        expected.update(references[path])
+    assert set(totalData) == set(expected)
+    for name, company in totalData.items():
+        assert list(company.dates) == list(expected[name].dates)
+    assert stats["files"] == 3
+    assert stats["rows"] == sum(map(len, expected.values()))
@@ -0,0 +1,68 @@
+# Tests of the zoomed out bars (stocklod) against aggregating the rows
+# directly
+import random
+
+import pytest
+
+from stockmodel import Company
+from stocklod import OHLCPyramid
+from tests.helpers import syntheticCompanies
+
+# The first rows of a synthetic company
+def company(rows):
+    company, = syntheticCompanies(1, 20, seed=rows).values()
+    assert len(company) >= rows
+    return Company.fromColumns(
+        "A", "A", *[column[:rows] for column in company.columns],
+        verify=False)
+
+@pytest.mark.parametrize("rows", [1, 2, 3, 8, 13, 64, 100, 1025])
+def testBarsAggregateTheirRows(rows):
+    data = company(rows)
+    pyramid = OHLCPyramid(data)
+    assert len(pyramid.levels[-1]) == 1
+    for idx, level in enumerate(pyramid.levels):
+        factor = 2 ** idx
+        assert level.factor == factor
+        assert len(level) == -(-rows // factor)
+        for bar in range(len(level)):
+            # The last bar may cover fewer rows
+            first, last = bar * factor, min(rows, (bar + 1) * factor)
+            assert level.opens[bar] == data.opens[first]
+            assert level.closes[bar] == data.closes[last - 1]
+            assert level.highs[bar] == max(data.highs[first:last])
+            assert level.lows[bar] == min(data.lows[first:last])
+            assert level.volumes[bar] == pytest.approx(
+                sum(data.volumes[first:last]))
+
+@pytest.mark.parametrize("rows", [1, 2, 7, 64, 333, 1025])
+def testRangeHighLow(rows):
+    data = company(rows)
+    pyramid = OHLCPyramid(data)
+    rng = random.Random(rows)
+    ranges = [(first, last) for first in range(min(rows, 40))
+              for last in range(first + 1, min(rows, 40) + 1)]
+    ranges += [sorted(rng.sample(range(rows + 1), 2)) for _ in range(300)
+               if rows > 1]
+    for first, last in ranges:
+        if first == last:
+            continue
+        assert pyramid.rangeHighLow(first, last) == \
+            (max(data.highs[first:last]), min(data.lows[first:last])), \
+            (first, last)
+    assert pyramid.rangeHighLow(3, 3) == (float("-inf"), float("inf"))
+
+# Every level answers a range of whole bars like the rows it covers
+def testLevelRangesMatchRowRanges():
+    data = company(500)
+    pyramid = OHLCPyramid(data)
+    rng = random.Random(0)
+    for level in pyramid.levels:
+        for _ in range(50):
+            first, last = sorted(rng.sample(range(len(level) + 1), 2)) \
+                if len(level) > 1 else (0, 1)
+            rowFirst = first * level.factor
+            rowLast = min(len(data), last * level.factor)
+            assert (max(level.highs[first:last]),
+                    min(level.lows[first:last])) == \
+                pyramid.rangeHighLow(rowFirst, rowLast)
@@ -0,0 +1,66 @@
+# Tests of the packed symmetric matrix (stockmatrix)
+import math
+import random
+
+import pytest
+
+from stockmatrix import SymmetricMatrix
+
+# A random symmetric matrix with some unset (nan) cells off the diagonal
+def randomMatrix(n, seed=0, unset=0.2):
+    rng = random.Random(seed)
+    matrix = [[1.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            value = math.nan if rng.random() < unset else rng.uniform(-1, 1)
+            matrix[i][j] = matrix[j][i] = value
+    return matrix
+
+def sameLists(rows, expected):
+    return [[repr(value) for value in row] for row in rows] == \
+        [[repr(value) for value in row] for row in expected]
+
+@pytest.mark.parametrize("n", [0, 1, 2, 7])
+def testRoundTrip(n):
+    names = [f"N{i}" for i in range(n)]
+    matrix = randomMatrix(n)
+    packed = SymmetricMatrix.fromMatrix(names, matrix)
+    assert len(packed.values) == n * (n + 1) // 2
+    assert sameLists(packed.toLists(), matrix)
+    for i, name1 in enumerate(names):
+        assert sameLists([packed.row(name1)], [matrix[i]])
+        for j, name2 in enumerate(names):
+            value = packed.get(name1, name2)
+            assert (value is None) == math.isnan(matrix[i][j])
+            if value is not None:
+                assert value == matrix[i][j]
+    assert packed.get("N0", "missing") is None
+
+def testSetIsSymmetric():
+    packed = SymmetricMatrix("abc")
+    packed.set("c", "a", 0.5)
+    assert packed.get("a", "c") == 0.5
+    assert packed.get("a", "b") is None
+
+# Every pair off the diagonal, ordered like topPairs
+def referencePairs(names, matrix, k, key):
+    pairs = [(key(matrix[i][j]), i, j) for i in range(len(names))
+             for j in range(i + 1, len(names)) if not math.isnan(matrix[i][j])]
+    pairs.sort(reverse=True)
+    return [(names[i], names[j], matrix[i][j]) for _, i, j in pairs[:k]]
+
+@pytest.mark.parametrize("key", [None, abs])
+@pytest.mark.parametrize("n, k", [(0, 3), (1, 3), (2, 1), (5, 0), (5, 100),
+                                  (30, 1), (30, 10), (60, 200)])
+def testTopPairs(n, k, key):
+    names = [f"N{i}" for i in range(n)]
+    for seed in range(3):
+        matrix = randomMatrix(n, seed)
+        packed = SymmetricMatrix.fromMatrix(names, matrix)
+        assert packed.topPairs(k, key) == referencePairs(
+            names, matrix, k, key or (lambda value: value))
+
+def testTopPairsSkipsUnsetCells():
+    packed = SymmetricMatrix.fromMatrix("ab", [[1.0, math.nan],
+                                               [math.nan, 1.0]])
+    assert packed.topPairs(5) == []
@@ -0,0 +1,36 @@
+# Tests of the Company columns (stockmodel)
+from array import array
+
+import pytest
+
+from stockmodel import Company
+
+def readOnlyColumns(columns):
+    return [memoryview(bytes(column)).cast(column.typecode)
+            for column in columns]
+
+def rowColumns(rows):
+    dates, opens, highs, lows, closes, volumes = zip(*rows)
+    return [array("q", dates), array("d", opens), array("d", highs),
+            array("d", lows), array("d", closes), array("d", closes),
+            array("d", volumes)]
+
+def testVerifySortsMemoryviewColumns():
+    columns = rowColumns([(3, 1, 2, 0.5, 1.5, 30), (1, 1, 3, 1, 2, 10),
+                          (2, 2, 2, 1, 1, 20)])
+    company = Company.fromColumns("A", "A", *readOnlyColumns(columns))
+    assert list(company.dates) == [1, 2, 3]
+    assert list(company.volumes) == [10, 20, 30]
+    assert list(company.closes) == [2, 1, 1.5]
+    assert all(isinstance(column, array) for column in company.columns)
+
+def testVerifyKeepsSortedMemoryviews():
+    columns = readOnlyColumns(rowColumns([(1, 1, 2, 1, 2, 10),
+                                          (2, 2, 2, 1, 1, 20)]))
+    company = Company.fromColumns("A", "A", *columns)
+    assert company.dates is columns[0]
+
+def testVerifyRejectsBadPrices():
+    columns = rowColumns([(1, 1, 2, 1, 3, 10)])
+    with pytest.raises(ValueError):
+        Company.fromColumns("A", "A", *readOnlyColumns(columns))
@@ -0,0 +1,138 @@
+# Tests of the pattern search (stockpattern) against a plain DFT and a
+# window by window search
+import math
+import cmath
+import random
+from array import array
+
+import pytest
+
+from stockmodel import Company
+from stockpattern import (PatternSearch, fft, findSimilarPatterns,
+                          minBlockLength, twiddleFactors)
+
+@pytest.mark.parametrize("n", [1, 2, 4, 8, 16, 64, 256, 1024])
+def testFFTMatchesDFT(n):
+    rng = random.Random(n)
+    values = [complex(rng.uniform(-1, 1), rng.uniform(-1, 1))
+              for _ in range(n)]
+    expected = [sum(value * cmath.exp(-2j * math.pi * j * k / n)
+                    for j, value in enumerate(values)) for k in range(n)]
+    result = fft(iter(values), twiddleFactors(n))
+    assert len(result) == n
+    for value, reference in zip(result, expected):
+        assert abs(value - reference) <= 1e-9 * n
+
+# A company whose closes follow a random walk, one row per day from start
+def walkCompany(name, days, seed, start=730000):
+    rng = random.Random(seed)
+    closes, price = array("d"), rng.uniform(10, 100)
+    for _ in range(days):
+        price *= math.exp(rng.gauss(0, 0.02))
+        closes.append(price)
+    dates = array("q", range(start, start + days))
+    return Company.fromColumns(name, name, dates, *[closes] * 5,
+                               array("d", [1.0]) * days, verify=False)
+
+# Squared z-normalized distances of the query to every window of closes
+def referenceDistances(query, closes):
+    length = len(query)
+    logs = [math.log(close) for close in closes]
+    distances = []
+    for start in range(len(logs) - length + 1):
+        window = logs[start : start + length]
+        mean = math.fsum(window) / length
+        deviation = math.sqrt(math.fsum((value - mean) ** 2
+                                        for value in window) / length)
+        r = sum((value - mean) / deviation * normalized
+                for value, normalized in zip(window, query)) / length
+        distances.append(2 * length * (1 - r))
+    return distances
+
+# The best windows of every company, taken greedily without overlapping
+# each other or the query, then the count best of all
+def referenceSearch(companies, target, first, last, count):
+    logs = [math.log(close) for close in companies[target].closes[first:last]]
+    length = len(logs)
+    mean = math.fsum(logs) / length
+    deviation = math.sqrt(math.fsum((value - mean) ** 2
+                                    for value in logs) / length)
+    query = [(value - mean) / deviation for value in logs]
+
+    matches = []
+    for name, company in companies.items():
+        if len(company) < length:
+            continue
+        distances = referenceDistances(query, company.closes)
+        taken = [first] if name == target else []
+        for _ in range(count):
+            free = [idx for idx in range(len(distances))
+                    if all(abs(idx - other) >= length for other in taken)]
+            if not free:
+                break
+            idx = min(free, key=distances.__getitem__)
+            taken.append(idx)
+            matches.append((math.sqrt(max(0.0, distances[idx])), name,
+                            company.dates[idx],
+                            company.dates[idx + length - 1]))
+    matches.sort()
+    return [(name, firstOrdinal, lastOrdinal, distance) for
+            distance, name, firstOrdinal, lastOrdinal in matches[:count]]
+
+def assertMatches(result, expected):
+    assert [match[:3] for match in result] == \
+        [match[:3] for match in expected]
+    for match, reference in zip(result, expected):
+        assert match[3] == pytest.approx(reference[3], abs=1e-6)
+
+# Query length 50: blocks of 1024 days advance by 975 windows
+@pytest.mark.parametrize("days", [
+    120,    # shorter than one block
+    1024,   # one full block
+    1500,   # two blocks, not a multiple of the advance
+    2000,   # three blocks, the last FFT is half padding
+    2924,   # exactly three advances of windows
+])
+def testSearchOfOneCompanyMatchesReference(days):
+    companies = {"A": walkCompany("A", days, seed=days)}
+    start = companies["A"].dates[30]
+    result = findSimilarPatterns(companies, "A", start, start + 49, count=4)
+    search = PatternSearch(companies, "A", start, start + 49)
+    assert search.blockLength == minBlockLength
+    assert search.blockCount(days) == -(-(days - 49) // 975)
+    assertMatches(result, referenceSearch(companies, "A", 30, 80, 4))
+
+@pytest.mark.parametrize("blockCount", [1, 2, 5, 64])
+def testSearchOfManyCompaniesMatchesReference(blockCount):
+    companies = {f"C{idx}": walkCompany(f"C{idx}", days, seed=idx)
+                 for idx, days in enumerate([300, 2000, 30, 1100, 777, 4000,
+                                             51, 60])}
+    start = companies["C1"].dates[500]
+    search = PatternSearch(companies, "C1", start, start + 59, count=6)
+    steps = 0
+    while not search.step(blockCount):
+        steps += 1
+    if blockCount == 1:
+        # One company per step, the two shorter than the query are skipped
+        assert steps + 1 == len(companies) - 2
+    assertMatches(search.top(),
+                  referenceSearch(companies, "C1", 500, 560, 6))
+
+def testLongQueryUsesLongerBlocks():
+    companies = {"A": walkCompany("A", 3000, seed=1),
+                 "B": walkCompany("B", 2500, seed=2)}
+    start = companies["A"].dates[100]
+    search = PatternSearch(companies, "A", start, start + 299, count=3)
+    assert search.blockLength == 2048
+    while not search.step():
+        pass
+    assertMatches(search.top(),
+                  referenceSearch(companies, "A", 100, 400, 3))
+
+def testFlatOrShortQueryFindsNothing():
+    flat = walkCompany("F", 200, seed=1)
+    flat.closes = array("d", [5.0]) * 200
+    companies = {"F": flat, "A": walkCompany("A", 500, seed=2)}
+    start = flat.dates[10]
+    assert findSimilarPatterns(companies, "F", start, start + 40) == []
+    assert findSimilarPatterns(companies, "A", start, start + 3) == []
@@ -0,0 +1,193 @@
+# Tests of appending new rows while running (stockupdate,
+# Company.appendColumns)
+import gc
+import os
+import math
+import weakref
+from array import array
+
+import pytest
+
+from stockmodel import Company
+from stockcache import loadCachedDirectory
+from stocklazy import LazyCompanies
+from stockupdate import UpdateWatcher
+from tests.helpers import syntheticUniverse, writeSyntheticCSV
+
+# Both nan or within a relative tolerance
+def close(a, b, tolerance=1e-9):
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return abs(a - b) <= tolerance * max(1.0, abs(a), abs(b))
+
+def sameValues(values, expected):
+    return (len(values) == len(expected)
+            and all(map(close, values, expected)))
+
+def columnsOf(company, first=0, last=None):
+    return [array(column.typecode, column[first:last])
+            for column in company.columns]
+
+# Writes the first rows of a synthetic universe to path, returns a function
+# appending the other rows to the end of the file
+def splitCSV(path, rows, count=2, years=1, seed=0):
+    writeSyntheticCSV(path, syntheticUniverse(count, years, seed))
+    with open(path, "rb") as f:
+        lines = f.read().split(b"\r\n")
+    with open(path, "wb") as f:
+        f.write(b"\r\n".join(lines[: 2 + rows]) + b"\r\n")
+
+    def appendRest():
+        with open(path, "ab") as f:
+            f.write(b"\r\n".join(lines[2 + rows :]))
+    return appendRest
+
+indicatorSpecs = [("sma", 20), ("ema", 12), ("wma", 9), ("bollinger", 20, 2),
+                  ("rsi", 14), ("macd", 12, 26, 9)]
+
+@pytest.fixture
+def company():
+    columns = syntheticUniverse(1, 4, seed=3)["T0000"]
+    return Company.fromColumns("A", "A", *columns, verify=False)
+
+@pytest.mark.parametrize("split", [1, 2, 7, 130, 257])
+def testAppendedDerivedSeriesMatchARebuild(company, split):
+    grown = Company.fromColumns("A", "A", *columnsOf(company, 0, split))
+    pyramid, stats = grown.pyramid(), grown.prefixStats()
+    indicators = [grown.indicator(*spec) for spec in indicatorSpecs]
+    # Overlapping rows are skipped
+    assert grown.appendColumns(*columnsOf(company, split - 1)) == \
+        len(company) - split
+
+    full = Company.fromColumns("B", "B", *columnsOf(company))
+    assert grown.pyramid() is pyramid
+    for level, expected in zip(pyramid.levels, full.pyramid().levels,
+                               strict=True):
+        for name in ("opens", "highs", "lows", "closes", "volumes"):
+            assert sameValues(getattr(level, name), getattr(expected, name))
+    expectedStats = full.prefixStats()
+    for name in ("volumes", "gaps", "squaredGaps", "absoluteGaps"):
+        assert sameValues(getattr(stats, name), getattr(expectedStats, name))
+    for spec, indicator in zip(indicatorSpecs, indicators):
+        assert grown.indicator(*spec) is indicator
+        expected = full.indicator(*spec)
+        for name, line in indicator.lines.items():
+            assert sameValues(line, expected.lines[name])
+
+def testMemoryviewColumnsAreCopiedOnTheFirstAppend(company):
+    views = [memoryview(bytes(column)).cast(column.typecode)
+             for column in columnsOf(company, 0, 100)]
+    grown = Company.fromColumns("A", "A", *views, verify=False)
+    grown.appendColumns(*columnsOf(company, 100, 101))
+    assert all(isinstance(column, array) for column in grown.columns)
+    assert list(grown.dates) == list(company.dates[:101])
+    # The mapped data is left alone
+    assert len(views[0]) == 100
+
+def testTailedRowsAreAppended(tmp_path):
+    appendRest = splitCSV(tmp_path / "a.csv", 100)
+    data = loadCachedDirectory(str(tmp_path), workers=1)
+    watcher = UpdateWatcher(str(tmp_path))
+    appendRest()
+    appended = watcher.apply(data)
+
+    fresh = loadCachedDirectory(str(tmp_path), cacheDir=str(tmp_path / "x"),
+                                workers=1)
+    assert appended == {name: len(fresh[name]) - 100 for name in fresh}
+    for name, company in fresh.items():
+        assert list(data[name].dates) == list(company.dates)
+        assert list(data[name].closes) == list(company.closes)
+
+# The app starts watching before it loads, rows written in between are
+# read by both and appended once
+def testRowsAddedWhileLoadingAreNotLost(tmp_path):
+    appendRest = splitCSV(tmp_path / "a.csv", 100)
+    watcher = UpdateWatcher(str(tmp_path))
+    appendRest()
+    data = loadCachedDirectory(str(tmp_path), workers=1)
+    lengths = {name: len(company) for name, company in data.items()}
+    assert watcher.apply(data) == {}
+    assert {name: len(company) for name, company in data.items()} == lengths
+
+def testHalfWrittenLinesAreReadOnceComplete(tmp_path):
+    path = tmp_path / "a.csv"
+    appendRest = splitCSV(path, 100)
+    with open(path, "rb") as f:
+        complete = f.read()
+    lines = complete.split(b"\r\n")
+    # The last row is still being written
+    with open(path, "wb") as f:
+        f.write(b"\r\n".join(lines[:-2]) + b"\r\n" + lines[-2][:7])
+    watcher = UpdateWatcher(str(tmp_path))
+    data = loadCachedDirectory(str(tmp_path), workers=1)
+    with open(path, "wb") as f:
+        f.write(complete)
+    appendRest()
+
+    appended = watcher.apply(data)
+    fresh = loadCachedDirectory(str(tmp_path), cacheDir=str(tmp_path / "x"),
+                                workers=1)
+    assert appended
+    for name, company in fresh.items():
+        assert list(data[name].dates) == list(company.dates)
+
+@pytest.mark.parametrize("lazy", [False, True])
+def testCompaniesOfNewFilesAreAdded(tmp_path, lazy):
+    writeSyntheticCSV(tmp_path / "a.csv", syntheticUniverse(1, 0.5, seed=1))
+    if lazy:
+        data = LazyCompanies(str(tmp_path))
+    else:
+        data = loadCachedDirectory(str(tmp_path), workers=1)
+    watcher = UpdateWatcher(str(tmp_path))
+
+    universe = syntheticUniverse(2, 0.5, seed=2)
+    universe = {"NEW" + name: columns for name, columns in universe.items()}
+    writeSyntheticCSV(tmp_path / "b.csv", universe)
+    appended = watcher.apply(data)
+    assert appended == {name: len(columns[0])
+                        for name, columns in universe.items()}
+    assert set(data) == {"T0000"} | set(universe)
+    assert list(data["NEWT0001"].dates) == list(universe["NEWT0001"][0])
+    assert watcher.apply(data) == {}
+
+# Writes the columns of one company as an update file
+def writeUpdateFile(path, columns):
+    writeSyntheticCSV(path, {"X": columns})
+    # The update layout has the category row only
+    with open(path, "rb") as f:
+        lines = f.read().split(b"\r\n")
+    with open(path, "wb") as f:
+        f.write(b"\r\n".join(lines[1:]))
+
+def testUpdateFilesOfNewTickersAreAdded(tmp_path):
+    writeSyntheticCSV(tmp_path / "a.csv", syntheticUniverse(1, 0.5, seed=1))
+    data = loadCachedDirectory(str(tmp_path), workers=1)
+    watcher = UpdateWatcher(str(tmp_path))
+    os.makedirs(tmp_path / "updates")
+
+    columns = syntheticUniverse(1, 0.5, seed=4)["T0000"]
+    writeUpdateFile(tmp_path / "updates" / "NEW.csv",
+                    [column[:50] for column in columns])
+    assert watcher.apply(data) == {"NEW": 50}
+    assert watcher.apply(data) == {}
+
+    writeUpdateFile(tmp_path / "updates" / "NEW.csv",
+                    [column[40:] for column in columns])
+    assert watcher.apply(data) == {"NEW": len(columns[0]) - 50}
+    assert list(data["NEW"].dates) == list(columns[0])
+
+def testWatcherDoesNotKeepCompaniesAlive(tmp_path):
+    columns = syntheticUniverse(1, 1, seed=1)["T0000"]
+    writeSyntheticCSV(tmp_path / "a.csv",
+                      {"T0000": [column[:50] for column in columns]})
+    data = loadCachedDirectory(str(tmp_path), workers=1)
+    watcher = UpdateWatcher(str(tmp_path))
+    os.makedirs(tmp_path / "updates")
+    writeUpdateFile(tmp_path / "updates" / "T0000.csv", columns)
+    assert watcher.apply(data) == {"T0000": len(columns[0]) - 50}
+    assert all(isinstance(cacheId, int)
+               for cacheId in watcher.updated.values())
+
+    company = weakref.ref(data.pop("T0000"))
+    gc.collect()
+    assert company() is None